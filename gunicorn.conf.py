@@ -0,0 +1,60 @@
+"""
+Gunicorn configuration for serving CarbonConnect in production:
+
+    gunicorn -c gunicorn.conf.py src.wsgi:app
+
+Every setting can be overridden with an environment variable (shown next to it).
+"""
+import multiprocessing
+import os
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+def _env_bool(name, default):
+    return os.environ.get(name, str(default)).lower() in ("1", "true", "yes", "on")
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5000")
+
+# Pre-fork worker processes, each serving `threads` requests concurrently (gthread worker).
+# WeasyPrint/PBKDF2 are CPU-bound, so scale workers with cores and keep threads for I/O waits.
+workers = _env_int("WEB_CONCURRENCY", min(multiprocessing.cpu_count() * 2 + 1, 8))
+threads = _env_int("GUNICORN_THREADS", 4)
+worker_class = "gthread"
+
+# Import the app once in the master so workers fork with the code already loaded
+preload_app = _env_bool("GUNICORN_PRELOAD", True)
+
+keepalive = _env_int("GUNICORN_KEEPALIVE", 5) # Seconds to hold idle keep-alive connections
+timeout = _env_int("GUNICORN_TIMEOUT", 60)
+graceful_timeout = _env_int("GUNICORN_GRACEFUL_TIMEOUT", 30)
+
+# Recycle workers periodically to bound memory growth; jitter avoids all workers restarting together
+max_requests = _env_int("GUNICORN_MAX_REQUESTS", 1000)
+max_requests_jitter = _env_int("GUNICORN_MAX_REQUESTS_JITTER", 100)
+
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.environ.get("GUNICORN_LOG_LEVEL", "info")
+
+def post_fork(server, worker):
+    # With preload_app the SQLAlchemy engines were created in the master. Database connections must
+    # not be shared across processes, so each worker drops inherited pooled connections and opens its own.
+    from src.wsgi import app
+    from src.services.database_service import database_engines
+    for engine in database_engines(app):
+        engine.dispose(close=False)
+
+def worker_exit(server, worker):
+    # Let in-flight certificate jobs finish before the worker goes away (max_requests recycling,
+    # reloads, shutdown); anything cut off is requeued by JOB_STALE_AFTER_SECONDS on the next start.
+    from src.wsgi import app
+    job_worker = app.extensions.get("job_worker")
+    if job_worker is not None:
+        job_worker.stop(timeout=graceful_timeout)
+    render_pool = app.extensions.get("certificate_render_pool")
+    if render_pool is not None:
+        render_pool.shutdown(wait=True)
+    password_hasher = app.extensions.get("password_hasher")
+    if password_hasher is not None:
+        password_hasher.shutdown()
@@ -0,0 +1,141 @@
+"""
+Benchmark for the composite indexes declared in src/models/models.py.
+
+Seeds a throwaway SQLite database with a large number of credits and orders, then runs the
+application's hot query shapes twice: once with only the primary keys / unique constraints and
+once with the model indexes. For each query it prints the EXPLAIN QUERY PLAN output and the
+median latency.
+
+Usage:
+    python scripts/bench_indexes.py [--credits 200000] [--orders 200000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, PROJECT_ROOT)
+
+from flask import Flask
+from sqlalchemy import select, func
+from src.models.models import db, User, UserRole, CarbonCredit, CreditStatus, Order, OrderStatus
+
+PROJECT_TYPES = ["Solar", "Wind Power", "Forestry Carbon Sink", "Methane Capture", "Energy Efficiency", "Other"]
+
+def create_bench_app(db_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    return app
+
+def seed(num_users, num_credits, num_orders):
+    rng = random.Random(42)
+    start = datetime(2023, 1, 1)
+    users = [{
+        "username": f"user{i}", "email": f"user{i}@bench.local", "password_hash": "x",
+        "role": UserRole.SELLER if i % 2 == 0 else UserRole.BUYER, "is_active": True,
+        "created_at": start + timedelta(minutes=i),
+    } for i in range(1, num_users + 1)]
+    db.session.execute(User.__table__.insert(), users)
+
+    statuses = [CreditStatus.APPROVED] * 6 + [CreditStatus.PENDING_APPROVAL, CreditStatus.SOLD, CreditStatus.REJECTED]
+    credits = [{
+        "seller_id": rng.randrange(2, num_users + 1, 2), "title": f"Bench credit {i}", "description": "Benchmark listing",
+        "quantity": float(rng.randint(1, 10000)), "price_per_unit": round(rng.uniform(1, 100), 2), "unit": "ton CO2e",
+        "source_project_type": rng.choice(PROJECT_TYPES), "source_project_location": "Somewhere",
+        "status": rng.choice(statuses), "submitted_at": start + timedelta(seconds=i * 30),
+    } for i in range(num_credits)]
+    db.session.execute(CarbonCredit.__table__.insert(), credits)
+
+    order_statuses = list(OrderStatus)
+    orders = []
+    for i in range(num_orders):
+        credit_index = rng.randrange(num_credits)
+        orders.append({
+            "buyer_id": rng.randrange(1, num_users + 1, 2), "credit_id": credit_index + 1,
+            "seller_id": credits[credit_index]["seller_id"], "quantity_ordered": 1.0,
+            "price_per_unit_at_order": 10.0, "total_price": 10.0, "status": rng.choice(order_statuses),
+            "order_date": start + timedelta(seconds=i * 45),
+        })
+    db.session.execute(Order.__table__.insert(), orders)
+    db.session.commit()
+
+def hot_queries():
+    """The query shapes issued by the marketplace, dashboards and admin listings."""
+    approved = CreditStatus.APPROVED
+    return {
+        "marketplace latest": select(CarbonCredit).where(CarbonCredit.status == approved)
+            .order_by(CarbonCredit.submitted_at.desc(), CarbonCredit.id.desc()).limit(10),
+        "marketplace price asc": select(CarbonCredit).where(CarbonCredit.status == approved)
+            .order_by(CarbonCredit.price_per_unit.asc(), CarbonCredit.id.asc()).limit(10),
+        "marketplace type filter": select(CarbonCredit).where(CarbonCredit.status == approved, CarbonCredit.source_project_type == "Solar")
+            .order_by(CarbonCredit.submitted_at.desc()).limit(10),
+        "admin pending count": select(func.count()).select_from(CarbonCredit).where(CarbonCredit.status == CreditStatus.PENDING_APPROVAL),
+        "seller credits": select(CarbonCredit).where(CarbonCredit.seller_id == 2).order_by(CarbonCredit.submitted_at.desc()),
+        "seller orders": select(Order).where(Order.seller_id == 2).order_by(Order.order_date.desc()),
+        "seller pending orders": select(func.count()).select_from(Order).where(Order.seller_id == 2, Order.status == OrderStatus.PENDING_SELLER_ACTION),
+        "buyer orders": select(Order).where(Order.buyer_id == 1).order_by(Order.order_date.desc()),
+        "admin orders": select(Order).order_by(Order.order_date.desc(), Order.id.desc()).limit(10),
+    }
+
+def model_indexes():
+    return [index for table in db.metadata.sorted_tables for index in table.indexes]
+
+def run_queries(label, repeat):
+    print(f"\n=== {label} ===")
+    results = {}
+    with db.engine.connect() as connection:
+        for name, statement in hot_queries().items():
+            sql = str(statement.compile(dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}))
+            plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                connection.exec_driver_sql(sql).fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = statistics.median(timings)
+            print(f"{name:<26} {results[name]:9.3f} ms   plan: {' | '.join(row[-1] for row in plan)}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--credits", type=int, default=200000)
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp(suffix=".db", prefix="bench_indexes_")
+    os.close(db_fd)
+    app = create_bench_app(db_path)
+    try:
+        with app.app_context():
+            db.create_all()
+            for index in model_indexes():
+                index.drop(bind=db.engine)
+            print(f"Seeding {args.users} users, {args.credits} credits, {args.orders} orders into {db_path} ...")
+            seed(args.users, args.credits, args.orders)
+
+            before = run_queries("Without model indexes", args.repeat)
+
+            for index in model_indexes():
+                index.create(bind=db.engine)
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql("ANALYZE")
+            after = run_queries("With model indexes", args.repeat)
+
+            print("\n=== Speedup ===")
+            for name in before:
+                print(f"{name:<26} {before[name]:9.3f} ms -> {after[name]:9.3f} ms  ({before[name] / max(after[name], 1e-6):7.1f}x)")
+            db.session.remove()
+    finally:
+        os.unlink(db_path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Benchmark: logins per second at several concurrency levels, hashing on the request threads
+(check_password_hash inline, as before) versus the bounded PasswordHasher pool. For the pool it
+also reports how many logins were turned away with a 503 because the pool and queue were full.
+
+Each simulated client thread logs in repeatedly for --seconds; a login is one password check with
+the configured work factor.
+
+Usage:
+    python scripts/bench_password_hashing.py [--concurrency 1 4 16 64] [--seconds 5] [--method pbkdf2:sha256]
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, PROJECT_ROOT)
+
+from flask import Flask
+from werkzeug.security import generate_password_hash, check_password_hash
+from src.services.password_service import PasswordHasherBusy, get_password_hasher, verify_password
+
+def create_bench_app(method, workers, max_pending):
+    app = Flask(__name__)
+    app.config["PASSWORD_HASH_METHOD"] = method
+    app.config["PASSWORD_HASH_WORKERS"] = workers
+    app.config["PASSWORD_HASH_MAX_PENDING"] = max_pending
+    return app
+
+def run_clients(concurrency, seconds, login):
+    """
+    Runs `concurrency` threads calling login() until the deadline; rejected clients back off briefly
+    as they would after a 503. Returns (elapsed, ok, rejected, latencies).
+    """
+    started_at = time.perf_counter()
+    deadline = started_at + seconds
+    lock = threading.Lock()
+    totals = {"ok": 0, "rejected": 0}
+    latencies = []
+
+    def client():
+        ok = rejected = 0
+        own_latencies = []
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            if login():
+                ok += 1
+                own_latencies.append((time.perf_counter() - started) * 1000)
+            else:
+                rejected += 1
+                time.sleep(0.05)
+        with lock:
+            totals["ok"] += ok
+            totals["rejected"] += rejected
+            latencies.extend(own_latencies)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started_at, totals["ok"], totals["rejected"], latencies
+
+def report(label, concurrency, elapsed, ok, rejected, latencies):
+    p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) >= 20 else (max(latencies) if latencies else 0)
+    print(f"{label:<7} c={concurrency:<4} {ok / elapsed:8.1f} logins/sec   rejected(503) {rejected / elapsed:8.1f}/sec   "
+          f"p95 {p95:8.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--method", default="pbkdf2:sha256")
+    parser.add_argument("--workers", type=int, default=0, help="Pool size (0 = CPU count)")
+    parser.add_argument("--max-pending", type=int, default=8)
+    args = parser.parse_args()
+
+    password_hash = generate_password_hash("BenchPassword123!", method=args.method)
+    app = create_bench_app(args.method, args.workers, args.max_pending)
+    with app.app_context():
+        hasher = get_password_hasher()
+    print(f"Method {args.method}; pool of {hasher.max_workers} worker(s), queue limit {hasher.max_pending}")
+
+    def inline_login():
+        return check_password_hash(password_hash, "BenchPassword123!")
+
+    def pooled_login():
+        with app.app_context():
+            try:
+                return verify_password(password_hash, "BenchPassword123!")
+            except PasswordHasherBusy:
+                return False
+
+    for concurrency in args.concurrency:
+        report("inline", concurrency, *run_clients(concurrency, args.seconds, inline_login))
+        report("pool", concurrency, *run_clients(concurrency, args.seconds, pooled_login))
+    hasher.shutdown()
+
+if __name__ == "__main__":
+    main()
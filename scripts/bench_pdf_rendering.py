@@ -0,0 +1,87 @@
+"""
+Benchmark: per-certificate PDF render latency, rebuilding WeasyPrint state for every certificate
+(the template's CSS and @font-face fonts parsed on each render) versus the shared CertificateRenderer
+(stylesheet and FontConfiguration parsed once and reused).
+
+Usage:
+    python scripts/bench_pdf_rendering.py [--count 50]
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, PROJECT_ROOT)
+
+from flask import Flask, render_template
+from weasyprint import HTML
+from src.services.pdf_service import CertificateRenderer, CERTIFICATE_STYLESHEET
+
+def create_bench_app():
+    return Flask(__name__, root_path=os.path.join(PROJECT_ROOT, "src"))
+
+def certificate_html(i):
+    buyer = SimpleNamespace(company_name=f"Buyer Co {i}", username=f"buyer{i}", email=f"buyer{i}@bench.local")
+    seller = SimpleNamespace(company_name=f"Seller Co {i}", username=f"seller{i}", email=f"seller{i}@bench.local")
+    credit = SimpleNamespace(title=f"Bench credit {i}", description="Benchmark listing", unit="ton CO2e",
+                             source_project_type="Solar", source_project_location="Somewhere")
+    now = datetime.utcnow()
+    order = SimpleNamespace(id=i, quantity_ordered=10.0, price_per_unit_at_order=12.5, total_price=125.0,
+                            order_date=now, seller_action_date=now, completion_date=None)
+    return render_template("certificates/pdf_template.html", order=order, buyer=buyer, seller=seller,
+                           credit=credit, generation_time=now.strftime("%Y-%m-%d %H:%M:%S"))
+
+def run_fresh(app, documents, output_dir):
+    """Previous behaviour: the stylesheet is inlined in the template and parsed with fresh font state per render."""
+    stylesheet_path = os.path.join(app.root_path, CERTIFICATE_STYLESHEET)
+    with open(stylesheet_path, encoding="utf-8") as f:
+        inline_style = f"<style>{f.read()}</style>"
+    timings = []
+    for i, document in enumerate(documents):
+        started = time.perf_counter()
+        html = HTML(string=document.replace("</head>", inline_style + "</head>", 1), base_url=app.root_path)
+        html.write_pdf(os.path.join(output_dir, f"fresh_{i}.pdf"))
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+def run_renderer(app, documents, output_dir):
+    renderer = CertificateRenderer(base_url=app.root_path,
+                                   stylesheet_path=os.path.join(app.root_path, CERTIFICATE_STYLESHEET))
+    timings = [renderer.render(document, os.path.join(output_dir, f"renderer_{i}.pdf")) * 1000
+               for i, document in enumerate(documents)]
+    return timings, renderer.metrics()
+
+def report(label, timings):
+    # The first render pays the one-off stylesheet/font cost; report it separately from the steady state
+    steady = timings[1:] or timings
+    print(f"{label:<10} first {timings[0]:8.1f} ms   median {statistics.median(steady):8.1f} ms   "
+          f"mean {statistics.mean(steady):8.1f} ms/certificate")
+    return statistics.median(steady)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=50, help="Number of certificates to render per mode")
+    args = parser.parse_args()
+
+    app = create_bench_app()
+    output_dir = tempfile.mkdtemp(prefix="bench_pdf_rendering_")
+    try:
+        with app.app_context():
+            documents = [certificate_html(i) for i in range(args.count)]
+        print(f"Rendering {args.count} certificates per mode")
+        fresh = report("fresh", run_fresh(app, documents, output_dir))
+        timings, metrics = run_renderer(app, documents, output_dir)
+        shared = report("renderer", timings)
+        print(f"Renderer metrics: {metrics}")
+        print(f"Speedup: {fresh / shared:.1f}x")
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmark for the seller dashboard.
+
+Seeds a throwaway SQLite database with one large seller (50,000 received orders by default), then
+compares the previous dashboard data loading (every credit and order loaded with .all(), stats
+computed with Python sum() loops) against SQL GROUP BY stats plus one keyset page per table.
+Reports median latency and peak Python memory for each.
+
+Usage:
+    python scripts/bench_seller_dashboard.py [--orders 50000] [--credits 5000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, PROJECT_ROOT)
+
+from flask import Flask
+from sqlalchemy.orm import joinedload
+from src.models.models import db, User, UserRole, CarbonCredit, CreditStatus, Order, OrderStatus
+from src.services.pagination_service import keyset_paginate
+from src.routes.seller import seller_stats, DASHBOARD_PER_PAGE
+
+SELLER_ID = 1
+
+def create_bench_app(db_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    return app
+
+def seed(num_credits, num_orders, num_buyers=500):
+    rng = random.Random(42)
+    start = datetime(2023, 1, 1)
+    users = [{"username": "bigseller", "email": "bigseller@bench.local", "password_hash": "x",
+              "role": UserRole.SELLER, "is_active": True, "created_at": start}]
+    users += [{"username": f"buyer{i}", "email": f"buyer{i}@bench.local", "password_hash": "x",
+               "role": UserRole.BUYER, "is_active": True, "created_at": start} for i in range(num_buyers)]
+    db.session.execute(User.__table__.insert(), users)
+
+    credit_statuses = list(CreditStatus)
+    db.session.execute(CarbonCredit.__table__.insert(), [{
+        "seller_id": SELLER_ID, "title": f"Bench credit {i}", "description": "Benchmark listing",
+        "quantity": float(rng.randint(1, 10000)), "price_per_unit": round(rng.uniform(1, 100), 2), "unit": "ton CO2e",
+        "status": rng.choice(credit_statuses), "submitted_at": start + timedelta(minutes=i),
+    } for i in range(num_credits)])
+
+    order_statuses = list(OrderStatus)
+    db.session.execute(Order.__table__.insert(), [{
+        "buyer_id": rng.randint(2, num_buyers + 1), "seller_id": SELLER_ID, "credit_id": rng.randint(1, num_credits),
+        "quantity_ordered": 1.0, "price_per_unit_at_order": 10.0, "total_price": 10.0,
+        "status": rng.choice(order_statuses), "order_date": start + timedelta(seconds=i * 45),
+    } for i in range(num_orders)])
+    db.session.commit()
+
+def load_all_dashboard():
+    """The previous seller.dashboard data loading."""
+    listed_credits = CarbonCredit.query.filter_by(seller_id=SELLER_ID).order_by(CarbonCredit.submitted_at.desc()).all()
+    received_orders = Order.query.options(joinedload(Order.buyer), joinedload(Order.carbon_credit)) \
+        .filter_by(seller_id=SELLER_ID).order_by(Order.order_date.desc()).all()
+    return {
+        "total_listed": len(listed_credits),
+        "pending_approval": sum(1 for lc in listed_credits if lc.status == CreditStatus.PENDING_APPROVAL),
+        "approved_active": sum(1 for lc in listed_credits if lc.status == CreditStatus.APPROVED),
+        "sold": sum(1 for lc in listed_credits if lc.status == CreditStatus.SOLD),
+        "total_orders": len(received_orders),
+        "pending_action_orders": sum(1 for ro in received_orders if ro.status == OrderStatus.PENDING_SELLER_ACTION),
+        "confirmed_orders": sum(1 for ro in received_orders if ro.status == OrderStatus.CONFIRMED_BY_SELLER or ro.status == OrderStatus.COMPLETED)
+    }
+
+def paginated_dashboard():
+    """The current seller.dashboard data loading: SQL stats and the first page of each table."""
+    keyset_paginate(CarbonCredit.query.filter_by(seller_id=SELLER_ID), CarbonCredit.submitted_at, CarbonCredit.id,
+                    sort_key="submitted_at", per_page=DASHBOARD_PER_PAGE)
+    keyset_paginate(Order.query.options(joinedload(Order.buyer), joinedload(Order.carbon_credit)).filter_by(seller_id=SELLER_ID),
+                    Order.order_date, Order.id, sort_key="order_date", per_page=DASHBOARD_PER_PAGE)
+    return seller_stats(SELLER_ID)
+
+def measure(label, fn, repeat):
+    timings, peaks = [], []
+    for _ in range(repeat):
+        db.session.expunge_all()
+        tracemalloc.start()
+        started = time.perf_counter()
+        stats = fn()
+        timings.append((time.perf_counter() - started) * 1000)
+        peaks.append(tracemalloc.get_traced_memory()[1] / (1024 * 1024))
+        tracemalloc.stop()
+    print(f"{label:<12} median {statistics.median(timings):9.1f} ms   peak memory {max(peaks):8.1f} MB")
+    return statistics.median(timings), stats
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--credits", type=int, default=5000)
+    parser.add_argument("--orders", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp(suffix=".db", prefix="bench_seller_dashboard_")
+    os.close(db_fd)
+    app = create_bench_app(db_path)
+    try:
+        with app.app_context():
+            db.create_all()
+            print(f"Seeding one seller with {args.credits} credits and {args.orders} received orders into {db_path} ...")
+            seed(args.credits, args.orders)
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql("ANALYZE")
+
+            before, old_stats = measure("load all", load_all_dashboard, args.repeat)
+            after, new_stats = measure("paginated", paginated_dashboard, args.repeat)
+            assert old_stats == new_stats, (old_stats, new_stats)
+            print(f"Speedup: {before / max(after, 1e-6):.1f}x (stats identical: {new_stats})")
+            db.session.remove()
+    finally:
+        os.unlink(db_path)
+
+if __name__ == "__main__":
+    main()
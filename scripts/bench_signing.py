@@ -0,0 +1,79 @@
+"""
+Benchmark: certificate signatures per second, OpenSSL CLI (one process per signature)
+versus the in-process cryptography signer (key and certificate cached once per process),
+versus batch signing (one signature over the Merkle root of the whole batch + per-certificate proofs).
+
+Usage:
+    python scripts/bench_signing.py [--count 200] [--size-kb 60]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, PROJECT_ROOT)
+
+from flask import Flask
+from src.services.signing_service import sign_pdf_document, sign_pdf_batch
+
+def create_bench_app(upload_folder):
+    # root_path points at src/ so the service finds src/certs
+    app = Flask(__name__, root_path=os.path.join(PROJECT_ROOT, "src"))
+    app.config["UPLOAD_FOLDER"] = upload_folder
+    return app
+
+def run(app, backend, filenames):
+    app.config["SIGNING_BACKEND"] = backend
+    started = time.perf_counter()
+    with app.app_context():
+        for filename in filenames:
+            if sign_pdf_document(filename) is None:
+                raise RuntimeError(f"Signing failed with backend {backend}")
+    elapsed = time.perf_counter() - started
+    return len(filenames) / elapsed, elapsed * 1000 / len(filenames)
+
+def run_batch(app, filenames):
+    app.config["SIGNING_BACKEND"] = "inprocess"
+    started = time.perf_counter()
+    with app.app_context():
+        if sign_pdf_batch(filenames) is None:
+            raise RuntimeError("Batch signing failed")
+    elapsed = time.perf_counter() - started
+    return len(filenames) / elapsed, elapsed * 1000 / len(filenames)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=200, help="Number of certificates to sign per backend")
+    parser.add_argument("--size-kb", type=int, default=60, help="Size of each dummy PDF")
+    args = parser.parse_args()
+
+    upload_folder = tempfile.mkdtemp(prefix="bench_signing_")
+    try:
+        os.makedirs(os.path.join(upload_folder, "certificates", "signed"))
+        filenames = []
+        for i in range(args.count):
+            filename = f"bench_certificate_{i}.pdf"
+            with open(os.path.join(upload_folder, "certificates", filename), "wb") as f:
+                f.write(b"%PDF-1.4\n" + os.urandom(args.size_kb * 1024))
+            filenames.append(filename)
+
+        app = create_bench_app(upload_folder)
+        print(f"Signing {args.count} x {args.size_kb} KB certificates per backend")
+        results = {}
+        for backend in ("openssl", "inprocess"):
+            results[backend] = run(app, backend, filenames)
+            rate, latency = results[backend]
+            print(f"{backend:<10} {rate:8.1f} signatures/sec  {latency:7.2f} ms/signature")
+        results["batch"] = run_batch(app, filenames)
+        rate, latency = results["batch"]
+        print(f"{'batch':<10} {rate:8.1f} certificates/sec {latency:7.2f} ms/certificate (1 root signature)")
+        print(f"Speedup in-process vs openssl: {results['inprocess'][0] / results['openssl'][0]:.1f}x, "
+              f"batch vs openssl: {results['batch'][0] / results['openssl'][0]:.1f}x")
+    finally:
+        shutil.rmtree(upload_folder, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
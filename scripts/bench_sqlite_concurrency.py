@@ -0,0 +1,139 @@
+"""
+Benchmark: concurrent marketplace reads and order writes against SQLite, with the driver defaults
+(rollback journal, synchronous=FULL, pysqlite's 5 s lock wait, default pool) versus the tuning
+applied by src/services/database_service.py (WAL, synchronous=NORMAL, busy_timeout, larger page
+cache, sized pool).
+
+Reader threads run the marketplace listing query; writer threads insert an order and decrement the
+credit's quantity in one transaction, like a purchase. Reports reads/sec, writes/sec, p95 read
+latency and "database is locked" errors.
+
+Usage:
+    python scripts/bench_sqlite_concurrency.py [--readers 8] [--writers 2] [--seconds 10] [--credits 20000]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, PROJECT_ROOT)
+
+from flask import Flask
+from sqlalchemy import select, update
+from sqlalchemy.exc import OperationalError
+from src.models.models import db, User, UserRole, CarbonCredit, CreditStatus, Order, OrderStatus
+from src.services.database_service import init_database, DEFAULT_SQLITE_PRAGMAS
+
+def create_bench_app(db_path, tuned, pool_size):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{db_path}"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    if tuned:
+        app.config["SQLITE_PRAGMAS"] = dict(DEFAULT_SQLITE_PRAGMAS)
+        app.config["SQLALCHEMY_POOL_SIZE"] = pool_size
+        init_database(app)
+    else:
+        db.init_app(app)
+    return app
+
+def seed(num_credits):
+    rng = random.Random(42)
+    db.session.execute(User.__table__.insert(), [
+        {"username": "seller", "email": "seller@bench.local", "password_hash": "x", "role": UserRole.SELLER, "is_active": True},
+        {"username": "buyer", "email": "buyer@bench.local", "password_hash": "x", "role": UserRole.BUYER, "is_active": True},
+    ])
+    db.session.execute(CarbonCredit.__table__.insert(), [{
+        "seller_id": 1, "title": f"Bench credit {i}", "description": "Benchmark listing",
+        "quantity": 1000000.0, "price_per_unit": round(rng.uniform(1, 100), 2), "unit": "ton CO2e",
+        "source_project_type": "Solar", "source_project_location": "Somewhere",
+        "status": CreditStatus.APPROVED, "submitted_at": datetime(2024, 1, 1),
+    } for i in range(num_credits)])
+    db.session.commit()
+
+def run(app, readers, writers, seconds, num_credits):
+    deadline = time.perf_counter() + seconds
+    lock = threading.Lock()
+    totals = {"reads": 0, "writes": 0, "locked": 0}
+    read_latencies = []
+
+    def reader():
+        reads, locked, latencies = 0, 0, []
+        query = (select(CarbonCredit.id, CarbonCredit.title, CarbonCredit.price_per_unit)
+                 .where(CarbonCredit.status == CreditStatus.APPROVED)
+                 .order_by(CarbonCredit.submitted_at.desc(), CarbonCredit.id.desc()).limit(20))
+        with app.app_context():
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                try:
+                    with db.engine.connect() as connection:
+                        connection.execute(query).all()
+                    reads += 1
+                    latencies.append((time.perf_counter() - started) * 1000)
+                except OperationalError:
+                    locked += 1
+        with lock:
+            totals["reads"] += reads
+            totals["locked"] += locked
+            read_latencies.extend(latencies)
+
+    def writer(seed_value):
+        rng = random.Random(seed_value)
+        writes, locked = 0, 0
+        with app.app_context():
+            while time.perf_counter() < deadline:
+                credit_id = rng.randint(1, num_credits)
+                try:
+                    with db.engine.begin() as connection:
+                        connection.execute(Order.__table__.insert(), {
+                            "buyer_id": 2, "credit_id": credit_id, "seller_id": 1, "quantity_ordered": 1.0,
+                            "price_per_unit_at_order": 10.0, "total_price": 10.0, "status": OrderStatus.PENDING_SELLER_ACTION, "order_date": datetime.utcnow(),
+                        })
+                        connection.execute(update(CarbonCredit).where(CarbonCredit.id == credit_id)
+                                           .values(quantity=CarbonCredit.quantity - 1))
+                    writes += 1
+                except OperationalError:
+                    locked += 1
+        with lock:
+            totals["writes"] += writes
+            totals["locked"] += locked
+
+    threads = [threading.Thread(target=reader) for _ in range(readers)]
+    threads += [threading.Thread(target=writer, args=(n,)) for n in range(writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, totals, read_latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--credits", type=int, default=20000)
+    args = parser.parse_args()
+
+    for label, tuned in (("default", False), ("tuned", True)):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            app = create_bench_app(os.path.join(tmp_dir, "bench.db"), tuned, args.readers + args.writers)
+            with app.app_context():
+                db.create_all()
+                seed(args.credits)
+                journal_mode = db.session.connection().exec_driver_sql("PRAGMA journal_mode").scalar()
+                db.session.remove()
+            elapsed, totals, latencies = run(app, args.readers, args.writers, args.seconds, args.credits)
+            p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) >= 20 else (max(latencies) if latencies else 0)
+            print(f"{label:<8} journal={journal_mode:<7} reads {totals['reads'] / elapsed:8.1f}/sec   "
+                  f"writes {totals['writes'] / elapsed:7.1f}/sec   p95 read {p95:7.1f} ms   locked errors {totals['locked']}")
+            with app.app_context():
+                db.engine.dispose()
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,9 @@ PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 sys.path.insert(0, PROJECT_ROOT)
 
 from flask import Flask
-from src.models.models import db, User, UserRole, CarbonCredit, CreditStatus, Order, UploadedFile
+from sqlalchemy import inspect, select, insert, Table, MetaData
+from src.models.models import db, User, UserRole, CarbonCredit, CreditStatus, Order, StoredFile, UploadedFile
+from src.services.upload_store_service import CREDIT_UPLOADS, storage_path
 
 # --- Configuration ---
 DATABASE_DIR = os.path.join(PROJECT_ROOT, "src", "database")
@@ -38,10 +40,83 @@ def initialize_database(app):
         db.create_all()
         print(f"Database tables created at {DATABASE_PATH}")
 
+        # create_all() only creates columns and indexes together with new tables, so add any missing ones to existing tables
+        add_missing_columns()
+        split_upload_records()
+        create_missing_indexes()
+
         # Seed initial data
         seed_data()
         print("Initial data seeded.")
 
+def add_missing_columns():
+    """
+    Adds model columns that are missing from existing tables (simple forward-only schema upgrade).
+    Columns must be nullable or have a server default, which fills in the existing rows.
+    """
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    with db.engine.begin() as connection:
+        for table in db.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns or (not column.nullable and column.server_default is None):
+                    continue
+                column_type = column.type.compile(dialect=connection.dialect)
+                definition = f"{column.name} {column_type}"
+                if column.server_default is not None:
+                    definition += f" DEFAULT {column.server_default.arg}" + ("" if column.nullable else " NOT NULL")
+                connection.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {definition}")
+                print(f"Added column {table.name}.{column.name}")
+
+def split_upload_records():
+    """
+    Moves databases that kept one uploaded_files row per stored file (unique saved_filename, with its
+    ref_count) to one stored_files row per file plus one uploaded_files row per credit using it.
+    """
+    inspector = inspect(db.engine)
+    constraints = inspector.get_unique_constraints(UploadedFile.__tablename__)
+    unique_names = any(constraint["column_names"] == ["saved_filename"] for constraint in constraints)
+    # Only tables written by the per-file layout have content_hash; older ones hold no upload records
+    recorded = "content_hash" in {column["name"] for column in inspector.get_columns(UploadedFile.__tablename__)}
+    if not (unique_names or recorded):
+        return
+    with db.engine.begin() as connection:
+        # Read through the reflected table: the old one has columns the model no longer declares
+        old_table = Table(UploadedFile.__tablename__, MetaData(), autoload_with=connection)
+        old_rows = {row.saved_filename: row for row in connection.execute(select(old_table))} if recorded else {}
+        UploadedFile.__table__.drop(connection)
+        UploadedFile.__table__.create(connection)
+        credits = connection.execute(select(CarbonCredit.__table__.c.id, CarbonCredit.__table__.c.seller_id,
+                                            *(CarbonCredit.__table__.c[attribute] for attribute in CREDIT_UPLOADS))).all()
+        stored_file_ids = {}
+        for credit in credits:
+            for attribute, subfolder in CREDIT_UPLOADS.items():
+                filename = credit._mapping[attribute]
+                old_row = old_rows.get(storage_path(subfolder, filename)) if filename else None
+                if old_row is None: # Legacy flat name, never recorded
+                    continue
+                if old_row.saved_filename not in stored_file_ids:
+                    stored_file_ids[old_row.saved_filename] = connection.execute(insert(StoredFile.__table__).values(
+                        storage_path=old_row.saved_filename, content_hash=old_row.content_hash, size_bytes=old_row.size_bytes,
+                        ref_count=0, created_at=old_row.upload_date).returning(StoredFile.__table__.c.id)).scalar_one()
+                stored_file_id = stored_file_ids[old_row.saved_filename]
+                connection.execute(insert(UploadedFile.__table__).values(
+                    uploader_id=credit.seller_id, original_filename=old_row.original_filename, saved_filename=filename,
+                    file_type=old_row.file_type, related_entity_id=credit.id, upload_date=old_row.upload_date,
+                    stored_file_id=stored_file_id))
+                connection.execute(StoredFile.__table__.update().where(StoredFile.__table__.c.id == stored_file_id)
+                                   .values(ref_count=StoredFile.__table__.c.ref_count + 1))
+    print(f"Split {len(old_rows)} upload record(s) into stored files and {UploadedFile.query.count()} per-upload record(s)")
+
+def create_missing_indexes():
+    """Creates any model-declared index that does not exist yet (e.g. on databases created by older versions)."""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
 def seed_data():
     """Seeds the database with initial necessary data."""
     # 1. Admin User
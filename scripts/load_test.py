@@ -0,0 +1,134 @@
+"""
+Load test: requests/sec and latency for the Flask development server (`flask run`, as the
+Dockerfile used to run) versus gunicorn with gunicorn.conf.py, or against any running server.
+
+Each client thread keeps one HTTP/1.1 keep-alive connection and cycles through the paths for
+--seconds. The database must be initialised first (`flask init-db`).
+
+Usage:
+    python scripts/load_test.py --compare [--concurrency 32] [--seconds 15]
+    python scripts/load_test.py --url http://localhost:5000 [--paths / /marketplace]
+"""
+import argparse
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from collections import Counter
+from urllib.parse import urlsplit
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+DEFAULT_PATHS = ["/", "/marketplace", "/marketplace?sort_by=price_asc", "/api/health"]
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def wait_until_up(base_url, process, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            with urllib.request.urlopen(base_url + "/api/health", timeout=2):
+                return
+        except OSError:
+            time.sleep(0.3)
+    raise RuntimeError(f"Server at {base_url} did not start within {timeout}s")
+
+def start_server(kind, port):
+    env = dict(os.environ, JOB_WORKER_MODE=os.environ.get("JOB_WORKER_MODE", "external"))
+    if kind == "dev":
+        command = [sys.executable, "-m", "flask", "--app", "src.wsgi", "run", "--host", "127.0.0.1", "--port", str(port), "--no-reload"]
+    else:
+        command = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}",
+                   "--access-logfile", "/dev/null", "src.wsgi:app"]
+    return subprocess.Popen(command, cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def run_load(base_url, paths, concurrency, seconds):
+    parts = urlsplit(base_url)
+    deadline = time.perf_counter() + seconds
+    lock = threading.Lock()
+    statuses = Counter()
+    latencies = []
+
+    def client(offset):
+        connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+        own_statuses, own_latencies = Counter(), []
+        i = offset
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                connection.request("GET", path)
+                response = connection.getresponse()
+                response.read()
+                own_statuses[response.status] += 1
+                own_latencies.append((time.perf_counter() - started) * 1000)
+                if response.getheader("Connection", "").lower() == "close":
+                    connection.close()
+            except (OSError, http.client.HTTPException):
+                own_statuses["error"] += 1
+                connection.close()
+        connection.close()
+        with lock:
+            statuses.update(own_statuses)
+            latencies.extend(own_latencies)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return elapsed, statuses, latencies
+
+def report(label, elapsed, statuses, latencies):
+    total = sum(statuses.values())
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) >= 100 else None
+    p50 = statistics.median(latencies) if latencies else 0
+    p99 = quantiles[98] if quantiles else (max(latencies) if latencies else 0)
+    print(f"{label:<10} {total / elapsed:9.1f} req/s   p50 {p50:7.1f} ms   p99 {p99:8.1f} ms   statuses {dict(statuses)}")
+    return total / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL of an already running server")
+    parser.add_argument("--compare", action="store_true", help="Start the dev server and gunicorn in turn and compare them")
+    parser.add_argument("--paths", nargs="+", default=DEFAULT_PATHS)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=15)
+    args = parser.parse_args()
+
+    if args.url:
+        report(args.url, *run_load(args.url.rstrip("/"), args.paths, args.concurrency, args.seconds))
+        return
+    if not args.compare:
+        parser.error("pass --url or --compare")
+
+    results = {}
+    for kind in ("dev", "gunicorn"):
+        port = free_port()
+        process = start_server(kind, port)
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            wait_until_up(base_url, process)
+            run_load(base_url, args.paths, min(args.concurrency, 4), 1) # Warm-up
+            results[kind] = report(kind, *run_load(base_url, args.paths, args.concurrency, args.seconds))
+        finally:
+            process.terminate()
+            process.wait(timeout=60)
+    print(f"gunicorn vs dev server: {results['gunicorn'] / results['dev']:.1f}x requests/sec "
+          f"at concurrency {args.concurrency}")
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,11 @@
 import os
 import enum # Import the standard Python enum module
 from flask_sqlalchemy import SQLAlchemy
+from src.models.session import RoutingSession
 from datetime import datetime
 
 # Initialize SQLAlchemy. This will be configured in main.py
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 # Corrected Enum definitions: Inherit from Python's enum.Enum
 class UserRole(enum.Enum):
@@ -27,6 +28,17 @@ class OrderStatus(enum.Enum):
     COMPLETED = "completed" # After seller confirmation, order is considered completed for PDF generation
     CANCELLED_BY_BUYER = "cancelled_by_buyer"
 
+class CertificateStatus(enum.Enum):
+    PENDING = "pending" # Queued for background generation and signing
+    READY = "ready"
+    FAILED = "failed"
+
+class JobStatus(enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
 class User(db.Model):
     __tablename__ = "users"
     id = db.Column(db.Integer, primary_key=True)
@@ -40,6 +52,10 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index("ix_users_created_at", "created_at"), # Admin user listing
+    )
+
     # Relationships
     credits_listed = db.relationship("CarbonCredit", backref="seller", lazy=True, foreign_keys="CarbonCredit.seller_id")
     orders_placed = db.relationship("Order", backref="buyer", lazy=True, foreign_keys="Order.buyer_id")
@@ -55,6 +71,7 @@ class CarbonCredit(db.Model):
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=False)
     quantity = db.Column(db.Float, nullable=False)  # Total available quantity
+    reserved_quantity = db.Column(db.Float, nullable=False, default=0, server_default="0") # Held by pending orders (see inventory_service)
     price_per_unit = db.Column(db.Float, nullable=False)
     unit = db.Column(db.String(20), default="ton CO2e", nullable=False)
     source_project_type = db.Column(db.String(100), nullable=True)
@@ -70,10 +87,26 @@ class CarbonCredit(db.Model):
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Composite indexes matching the hot query shapes: the marketplace always filters on status
+    # and sorts/filters on one more column; seller dashboards filter on seller_id.
+    __table_args__ = (
+        db.Index("ix_carbon_credits_status_submitted_at", "status", "submitted_at"),
+        db.Index("ix_carbon_credits_status_price_per_unit", "status", "price_per_unit"),
+        db.Index("ix_carbon_credits_status_quantity", "status", "quantity"),
+        db.Index("ix_carbon_credits_status_type_submitted_at", "status", "source_project_type", "submitted_at"),
+        db.Index("ix_carbon_credits_seller_id_submitted_at", "seller_id", "submitted_at"),
+        db.Index("ix_carbon_credits_seller_id_status", "seller_id", "status"),
+    )
+
     # Relationships
     orders = db.relationship("Order", backref="carbon_credit", lazy=True)
     reviewer = db.relationship("User", foreign_keys=[admin_id_reviewer])
 
+    @property
+    def available_quantity(self):
+        """Quantity that new orders can still reserve."""
+        return self.quantity - (self.reserved_quantity or 0)
+
     def __repr__(self):
         return f"<CarbonCredit {self.title} ({self.status.value if isinstance(self.status, enum.Enum) else self.status})>"
 
@@ -94,22 +127,130 @@ class Order(db.Model):
     seller_remarks = db.Column(db.Text, nullable=True)
     pdf_certificate_filename = db.Column(db.String(256), nullable=True) # Filename of the generated PDF
     signed_pdf_certificate_filename = db.Column(db.String(256), nullable=True) # Filename of the signed PDF
+    certificate_proof_filename = db.Column(db.String(256), nullable=True) # Merkle inclusion proof of a batch-signed PDF (certificates/signed)
+    certificate_batch_filename = db.Column(db.String(256), nullable=True) # Signed root manifest of that batch (certificates/signed/batches)
+    certificate_status = db.Column(db.Enum(CertificateStatus, name="certificate_status_enum"), nullable=True) # Set once certificate generation is requested
+    # Stock held for this pending order until it is confirmed, cancelled, rejected or the hold expires
+    reserved_quantity = db.Column(db.Float, nullable=False, default=0, server_default="0")
+    reservation_expires_at = db.Column(db.DateTime, nullable=True) # NULL once the hold is released
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Dashboards list a buyer's/seller's orders newest first; seller stats count by status.
+    __table_args__ = (
+        db.Index("ix_orders_buyer_id_order_date", "buyer_id", "order_date"),
+        db.Index("ix_orders_seller_id_order_date", "seller_id", "order_date"),
+        db.Index("ix_orders_seller_id_status", "seller_id", "status"),
+        db.Index("ix_orders_credit_id", "credit_id"),
+        db.Index("ix_orders_order_date", "order_date"), # Admin order listing
+        db.Index("ix_orders_reservation_expires_at", "reservation_expires_at"), # Expired-reservation sweeper
+    )
+
+    @property
+    def has_signed_certificate(self):
+        """Whether the certificate is signed, on its own (.p7m) or as part of a signed batch (proof + manifest)."""
+        return bool(self.signed_pdf_certificate_filename or self.certificate_proof_filename)
+
     def __repr__(self):
         return f"<Order {self.id} by Buyer {self.buyer_id} for Credit {self.credit_id} ({self.status.value if isinstance(self.status, enum.Enum) else self.status})>"
 
+class BackgroundJob(db.Model):
+    """Durable queue entry for work done outside the request (e.g. certificate generation and signing)."""
+    __tablename__ = "background_jobs"
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False) # e.g., 'issue_certificate'
+    related_entity_id = db.Column(db.Integer, nullable=True) # e.g., order_id
+    status = db.Column(db.Enum(JobStatus, name="job_status_enum"), nullable=False, default=JobStatus.QUEUED)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    last_error = db.Column(db.Text, nullable=True)
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow) # Earliest time the job may (re)run
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Workers poll for the oldest runnable queued job
+    __table_args__ = (
+        db.Index("ix_background_jobs_status_run_after", "status", "run_after"),
+        db.Index("ix_background_jobs_job_type_related_entity_id", "job_type", "related_entity_id"),
+    )
+
+    def __repr__(self):
+        return f"<BackgroundJob {self.id} {self.job_type}({self.related_entity_id}) ({self.status.value if isinstance(self.status, enum.Enum) else self.status})>"
+
+class DashboardCounter(db.Model):
+    """Running totals for the admin dashboard, kept up to date by src/services/counter_service.py."""
+    __tablename__ = "dashboard_counters"
+    name = db.Column(db.String(64), primary_key=True) # e.g. "users", "orders", "credits.APPROVED"
+    value = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<DashboardCounter {self.name}={self.value}>"
+
+class MarketplaceFacet(db.Model):
+    """Number of approved credits per marketplace filter value, kept up to date by src/services/facet_service.py."""
+    __tablename__ = "marketplace_facets"
+    facet = db.Column(db.String(32), primary_key=True) # "project_type", "location", "price" (bucket) or "total"
+    value = db.Column(db.String(100), primary_key=True) # e.g. "Solar", "Kenya", "10" (bucket lower bound); "" for the total
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<MarketplaceFacet {self.facet}:{self.value}={self.count}>"
+
+class IdempotencyKey(db.Model):
+    """Outcome of a POST sent with an idempotency key, replayed to retries (see src/services/idempotency_service.py)."""
+    __tablename__ = "idempotency_keys"
+    user_id = db.Column(db.Integer, primary_key=True) # Keys are scoped to the user who sent them
+    key = db.Column(db.String(64), primary_key=True)
+    request_hash = db.Column(db.String(64), nullable=False) # SHA-256 of method, path and form; a reused key must match
+    status_code = db.Column(db.Integer, nullable=True) # NULL while the first request is still running
+    location = db.Column(db.String(512), nullable=True) # Redirect target
+    flashes = db.Column(db.Text, nullable=True) # JSON list of [category, message] flashed by the first request
+    response_body = db.Column(db.Text, nullable=True) # Only kept for non-redirect responses
+    committed_at = db.Column(db.DateTime, nullable=True) # Set in the same transaction as the first request's own work
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+    # TTL cleanup deletes by expiry
+    __table_args__ = (
+        db.Index("ix_idempotency_keys_expires_at", "expires_at"),
+    )
+
+    def __repr__(self):
+        return f"<IdempotencyKey {self.user_id}:{self.key} ({self.status_code or 'in progress'})>"
+
+class StoredFile(db.Model):
+    """A file in the content-addressed upload store, shared by every upload of the same content (see upload_store_service)."""
+    __tablename__ = "stored_files"
+    id = db.Column(db.Integer, primary_key=True)
+    storage_path = db.Column(db.String(256), unique=True, nullable=False) # Path under UPLOAD_FOLDER
+    content_hash = db.Column(db.String(64), nullable=False) # SHA-256 of the content
+    size_bytes = db.Column(db.Integer, nullable=False)
+    ref_count = db.Column(db.Integer, nullable=False, default=0, server_default="0") # UploadedFile rows using the file
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<StoredFile {self.storage_path} ({self.ref_count} references)>"
+
 class UploadedFile(db.Model):
     __tablename__ = "uploaded_files"
     id = db.Column(db.Integer, primary_key=True)
     uploader_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     original_filename = db.Column(db.String(256), nullable=False)
-    saved_filename = db.Column(db.String(256), unique=True, nullable=False) # UUID based filename on disk
+    saved_filename = db.Column(db.String(256), nullable=False) # Name kept on the record (<hash>.<ext>, see upload_store_service)
     file_type = db.Column(db.String(50), nullable=True) # e.g., 'credit_image', 'verification_doc', 'order_pdf'
     related_entity_id = db.Column(db.Integer, nullable=True) # e.g., credit_id or order_id
     upload_date = db.Column(db.DateTime, default=datetime.utcnow)
+    stored_file_id = db.Column(db.Integer, db.ForeignKey("stored_files.id"), nullable=True) # The stored content
 
     uploader = db.relationship("User", backref="uploaded_files", lazy=True)
+    stored_file = db.relationship("StoredFile", backref="uploads", lazy=True)
+
+    # Releasing a record's file looks its upload up by the record
+    __table_args__ = (
+        db.Index("ix_uploaded_files_related_entity_id", "related_entity_id"),
+    )
 
     def __repr__(self):
         return f"<UploadedFile {self.original_filename} by User {self.uploader_id}>"
@@ -0,0 +1,59 @@
+import time
+from flask import g, session as flask_session, has_request_context, current_app
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql.expression import UpdateBase, TextClause
+
+# Read/write splitting. When a replica engine is configured (DATABASE_REPLICA_URL), queries made
+# while a view decorated with database_service.read_replica is running go to it; everything else,
+# every flush, every INSERT/UPDATE/DELETE and every bare session.connection() goes to the primary
+# (the default bind). After a session writes, it stays on the primary for the rest of the request,
+# and the user's cookie session is pinned to the primary for DATABASE_REPLICA_STICKY_SECONDS so they
+# read their own writes despite replica lag.
+
+REPLICA_ENGINE_KEY = "database_replica" # app.extensions key of the replica engine
+READ_REPLICA_FLAG = "db_use_read_replica" # Set on flask.g by the read_replica decorator
+PRIMARY_UNTIL_KEY = "db_primary_until" # Cookie-session timestamp for read-your-writes stickiness
+
+def _is_write(clause):
+    # Raw text() statements may write, so they are kept on the primary
+    return isinstance(clause, (UpdateBase, TextClause))
+
+def _replica_allowed():
+    if not has_request_context() or not g.get(READ_REPLICA_FLAG):
+        return False
+    return flask_session.get(PRIMARY_UNTIL_KEY, 0) <= time.time()
+
+class RoutingSession(Session):
+    """Flask-SQLAlchemy session that sends reads in read-only views to the replica engine."""
+
+    def __init__(self, db, **kwargs):
+        super().__init__(db, **kwargs)
+        self._wrote_primary = False
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if bind is not None:
+            return engine
+        replica = current_app.extensions.get(REPLICA_ENGINE_KEY)
+        if replica is None or engine is not self._db.engines.get(None):
+            return engine # No replica configured, or a model with its own bind key
+        # A bare session.connection() carries no statement to judge; its callers use it to write
+        # (counter and facet adjustments, rebuilds), so it always gets the primary
+        if self._flushing or _is_write(clause) or (mapper is None and clause is None):
+            self._wrote_primary = True
+            return engine
+        if self._wrote_primary or not _replica_allowed():
+            return engine
+        return replica
+
+@event.listens_for(RoutingSession, "after_commit")
+def _pin_to_primary(session):
+    if session._wrote_primary:
+        session._wrote_primary = False
+        if has_request_context() and REPLICA_ENGINE_KEY in current_app.extensions:
+            flask_session[PRIMARY_UNTIL_KEY] = time.time() + current_app.config.get("DATABASE_REPLICA_STICKY_SECONDS", 5)
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _forget_writes(session):
+    session._wrote_primary = False
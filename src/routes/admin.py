@@ -2,14 +2,23 @@ import os
 import sys
 from flask import Blueprint, render_template, session, redirect, url_for, flash, request
 from functools import wraps
+from sqlalchemy.orm import joinedload
 
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
 sys.path.insert(0, PROJECT_ROOT)
 
 from src.models.models import db, User, UserRole, CarbonCredit, CreditStatus, Order
+from src.services.pagination_service import keyset_paginate, keyset_mode_requested
+from src.services.counter_service import get_dashboard_counts
+from src.services.marketplace_cache_service import marketplace_cache_stats
+from src.services.moderation_service import moderate_credits, MODERATION_ACTIONS, MAX_BULK_MODERATION
+from src.services.identity_service import current_identity, invalidate_identity
+from src.services.database_service import read_replica
 
 admin_bp = Blueprint("admin", __name__, template_folder="../templates/admin", url_prefix="/admin")
 
+APPROVAL_QUEUE_PER_PAGE = 25
+
 # --- Decorators for Access Control ---
 def admin_required(f):
     @wraps(f)
@@ -17,29 +26,36 @@ def admin_required(f):
         if "user_id" not in session or session.get("role") != UserRole.ADMIN.value:
             flash("You do not have permission to access this page.", "danger")
             return redirect(url_for("auth.login"))
+        identity = current_identity()
+        if not identity or not identity.is_active:
+            flash("Your account is inactive. Please contact support.", "danger")
+            session.clear()
+            return redirect(url_for("auth.login"))
         return f(*args, **kwargs)
     return decorated_function
 
 # --- Admin Routes ---
 @admin_bp.route("/dashboard")
+@read_replica
 @admin_required
 def dashboard():
-    pending_credits = CarbonCredit.query.filter_by(status=CreditStatus.PENDING_APPROVAL).count()
-    approved_credits = CarbonCredit.query.filter_by(status=CreditStatus.APPROVED).count()
-    total_users = User.query.count()
-    total_orders = Order.query.count()
+    # Maintained incrementally in dashboard_counters: one small read instead of four COUNT(*) scans
+    counts = get_dashboard_counts()
     return render_template("admin_dashboard.html", 
                            title="Admin Dashboard", 
-                           pending_credits=pending_credits,
-                           approved_credits=approved_credits,
-                           total_users=total_users,
-                           total_orders=total_orders)
+                           marketplace_cache=marketplace_cache_stats(),
+                           **counts)
 
 @admin_bp.route("/users")
+@read_replica
 @admin_required
 def manage_users():
     page = request.args.get("page", 1, type=int)
-    users_pagination = User.query.order_by(User.created_at.desc()).paginate(page=page, per_page=10, error_out=False)
+    if keyset_mode_requested():
+        users_pagination = keyset_paginate(User.query, User.created_at, User.id, sort_key="created_at",
+                                           cursor=request.args.get("cursor"), per_page=10)
+    else:
+        users_pagination = User.query.order_by(User.created_at.desc()).paginate(page=page, per_page=10, error_out=False)
     return render_template("manage_users.html", title="Manage Users", users_pagination=users_pagination)
 
 @admin_bp.route("/user/<int:user_id>/toggle_active", methods=["POST"])
@@ -51,16 +67,63 @@ def toggle_user_active(user_id):
     else:
         user.is_active = not user.is_active
         db.session.commit()
+        invalidate_identity(user.id)
         # Corrected f-string syntax below
         status_text = 'active' if user.is_active else 'inactive'
         flash(f"User {user.username} status changed to {status_text}.", "success")
     return redirect(url_for("admin.manage_users"))
 
 @admin_bp.route("/credits_approval")
+@read_replica
 @admin_required
 def credits_for_approval():
-    pending_credits = CarbonCredit.query.filter_by(status=CreditStatus.PENDING_APPROVAL).order_by(CarbonCredit.submitted_at.asc()).all()
-    return render_template("credits_approval.html", title="Approve Carbon Credits", credits=pending_credits)
+    # Oldest submissions first, one page at a time; keyset pages stay stable while credits leave the queue
+    page = request.args.get("page", 1, type=int)
+    query = CarbonCredit.query.options(joinedload(CarbonCredit.seller)).filter_by(status=CreditStatus.PENDING_APPROVAL)
+    if keyset_mode_requested():
+        # Keyset pages skip COUNT(*), so the queue size comes from the dashboard counters
+        pending_total = get_dashboard_counts()["pending_credits"]
+        credits_pagination = keyset_paginate(query, CarbonCredit.submitted_at, CarbonCredit.id, sort_key="submitted_at",
+                                             descending=False, cursor=request.args.get("cursor"), per_page=APPROVAL_QUEUE_PER_PAGE)
+    else:
+        credits_pagination = query.order_by(CarbonCredit.submitted_at.asc(), CarbonCredit.id.asc()) \
+            .paginate(page=page, per_page=APPROVAL_QUEUE_PER_PAGE, error_out=False)
+        pending_total = credits_pagination.total
+    return render_template("credits_approval.html", title="Approve Carbon Credits", credits_pagination=credits_pagination,
+                           pending_total=pending_total, max_bulk=MAX_BULK_MODERATION)
+
+@admin_bp.route("/credits/moderate", methods=["POST"])
+@admin_required
+def moderate_credits_bulk():
+    new_status = MODERATION_ACTIONS.get(request.form.get("action"))
+    admin_remarks = (request.form.get("admin_remarks") or "").strip()
+    credit_ids = request.form.getlist("credit_ids", type=int)
+    # Return to the queue page the admin was on (only ever a queue URL, never an arbitrary target)
+    queue_url = url_for("admin.credits_for_approval")
+    next_url = request.form.get("next", "")
+    back = redirect(next_url if next_url.startswith(queue_url) else queue_url)
+    if new_status is None:
+        flash("Unknown moderation action.", "danger")
+        return back
+    if not credit_ids:
+        flash("Select at least one credit.", "warning")
+        return back
+    if len(credit_ids) > MAX_BULK_MODERATION:
+        flash(f"At most {MAX_BULK_MODERATION} credits can be moderated at once.", "danger")
+        return back
+    if new_status == CreditStatus.REJECTED and not admin_remarks:
+        flash("Rejection remarks are required.", "danger")
+        return back
+
+    changed = moderate_credits(credit_ids, new_status, session["user_id"], admin_remarks or "Approved by admin.")
+    db.session.commit()
+    verb = "approved" if new_status == CreditStatus.APPROVED else "rejected"
+    skipped = len(set(credit_ids)) - changed
+    message = f"{changed} credit(s) {verb}."
+    if skipped:
+        message += f" {skipped} selected credit(s) were no longer pending approval and were left unchanged."
+    flash(message, "success" if changed else "warning")
+    return back
 
 @admin_bp.route("/credit/<int:credit_id>/approve", methods=["POST"])
 @admin_required
@@ -99,10 +162,17 @@ def reject_credit(credit_id):
     return redirect(url_for("admin.credits_for_approval"))
 
 @admin_bp.route("/orders")
+@read_replica
 @admin_required
 def view_all_orders():
     page = request.args.get("page", 1, type=int)
-    orders_pagination = Order.query.order_by(Order.order_date.desc()).paginate(page=page, per_page=10, error_out=False)
+    # The listing shows buyer, seller and credit for every row; load them in the same query
+    orders_query = Order.query.options(joinedload(Order.buyer), joinedload(Order.seller_user), joinedload(Order.carbon_credit))
+    if keyset_mode_requested():
+        orders_pagination = keyset_paginate(orders_query, Order.order_date, Order.id, sort_key="order_date",
+                                            cursor=request.args.get("cursor"), per_page=10)
+    else:
+        orders_pagination = orders_query.order_by(Order.order_date.desc()).paginate(page=page, per_page=10, error_out=False)
     return render_template("view_orders_admin.html", title="All Orders", orders_pagination=orders_pagination)
 
 
@@ -1,16 +1,21 @@
 import os
 import sys
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
-from werkzeug.security import generate_password_hash, check_password_hash
 
 # Add project root to Python path
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
 sys.path.insert(0, PROJECT_ROOT)
 
 from src.models.models import db, User, UserRole
+from src.services.password_service import hash_password, verify_password, needs_rehash, PasswordHasherBusy
 
 auth_bp = Blueprint("auth", __name__, template_folder="../templates/auth")
 
+def _hashing_busy(template, **context):
+    # Fail fast while the password hashing pool is saturated rather than tying up the request thread
+    flash("The service is busy right now. Please try again in a moment.", "warning")
+    return render_template(template, **context), 503, {"Retry-After": "1"}
+
 @auth_bp.route("/register", methods=["GET", "POST"])
 def register():
     if request.method == "POST":
@@ -43,7 +48,10 @@ def register():
             flash("Invalid role selected.", "danger")
             return redirect(url_for("auth.register"))
 
-        hashed_password = generate_password_hash(password, method="pbkdf2:sha256")
+        try:
+            hashed_password = hash_password(password)
+        except PasswordHasherBusy:
+            return _hashing_busy("register.html", title="Register", selected_role=role_str)
         
         new_user = User(
             username=username,
@@ -79,7 +87,19 @@ def login():
 
         user = User.query.filter_by(username=username).first()
 
-        if user and check_password_hash(user.password_hash, password):
+        password_ok = False
+        try:
+            password_ok = user is not None and verify_password(user.password_hash, password)
+            if password_ok and needs_rehash(user.password_hash):
+                # The configured work factor changed since this hash was made; upgrade it transparently
+                user.password_hash = hash_password(password)
+                db.session.commit()
+        except PasswordHasherBusy:
+            if not password_ok:
+                return _hashing_busy("login.html", title="Login")
+            # Only the rehash was refused; it will happen on a later login
+
+        if password_ok:
             session["user_id"] = user.id
             session["username"] = user.username
             session["role"] = user.role.value # Store role value (string)
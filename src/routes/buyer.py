@@ -2,11 +2,16 @@ import os
 import sys
 from flask import Blueprint, render_template, session, redirect, url_for, flash, request
 from functools import wraps
+from sqlalchemy.orm import joinedload
 
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
 sys.path.insert(0, PROJECT_ROOT)
 
 from src.models.models import db, User, UserRole, CarbonCredit, CreditStatus, Order, OrderStatus
+from src.services.identity_service import current_identity
+from src.services.inventory_service import reserve_stock, reservation_expiry, close_pending_order, OrderAlreadyProcessed
+from src.services.idempotency_service import idempotent
+from src.services.database_service import read_replica
 
 buyer_bp = Blueprint("buyer", __name__, template_folder="../templates/buyer", url_prefix="/buyer")
 
@@ -17,8 +22,8 @@ def buyer_required(f):
         if "user_id" not in session or session.get("role") != UserRole.BUYER.value:
             flash("You must be logged in as a buyer to access this page.", "danger")
             return redirect(url_for("auth.login"))
-        user = User.query.get(session["user_id"])
-        if not user or not user.is_active:
+        identity = current_identity()
+        if not identity or not identity.is_active:
             flash("Your account is inactive. Please contact support.", "danger")
             session.clear()
             return redirect(url_for("auth.login"))
@@ -27,14 +32,17 @@ def buyer_required(f):
 
 # --- Buyer Routes ---
 @buyer_bp.route("/dashboard")
+@read_replica
 @buyer_required
 def dashboard():
     buyer_id = session["user_id"]
-    orders_placed = Order.query.filter_by(buyer_id=buyer_id).order_by(Order.order_date.desc()).all()
+    orders_placed = Order.query.options(joinedload(Order.carbon_credit)) \
+        .filter_by(buyer_id=buyer_id).order_by(Order.order_date.desc()).all()
     return render_template("buyer_dashboard.html", title="Buyer Dashboard", orders_placed=orders_placed)
 
 @buyer_bp.route("/order/create/<int:credit_id>", methods=["POST"])
 @buyer_required
+@idempotent
 def create_order(credit_id):
     credit = CarbonCredit.query.get_or_404(credit_id)
     if credit.status != CreditStatus.APPROVED:
@@ -57,12 +65,14 @@ def create_order(credit_id):
         flash("Quantity must be a positive value.", "danger")
         return redirect(url_for("credit_detail", credit_id=credit.id))
 
-    if quantity_ordered > credit.quantity:
-        flash(f"Requested quantity ({quantity_ordered}) exceeds available stock ({credit.quantity}).", "warning")
-        return redirect(url_for("credit_detail", credit_id=credit.id))
-
     total_price = quantity_ordered * credit.price_per_unit
 
+    # Hold the quantity until the seller acts (or the reservation expires), so a listing cannot
+    # collect more pending orders than it can fill
+    if not reserve_stock(credit.id, quantity_ordered):
+        flash(f"Requested quantity ({quantity_ordered}) exceeds available stock ({credit.available_quantity}).", "warning")
+        return redirect(url_for("credit_detail", credit_id=credit.id))
+
     new_order = Order(
         buyer_id=session["user_id"],
         credit_id=credit.id,
@@ -71,7 +81,9 @@ def create_order(credit_id):
         price_per_unit_at_order=credit.price_per_unit,
         total_price=total_price,
         status=OrderStatus.PENDING_SELLER_ACTION,
-        buyer_remarks=buyer_remarks
+        buyer_remarks=buyer_remarks,
+        reserved_quantity=quantity_ordered,
+        reservation_expires_at=reservation_expiry()
     )
 
     try:
@@ -104,9 +116,14 @@ def cancel_order(order_id):
 
     # Only allow cancellation if seller hasn't acted yet
     if order.status == OrderStatus.PENDING_SELLER_ACTION:
-        order.status = OrderStatus.CANCELLED_BY_BUYER
-        order.completion_date = db.func.now() # Use completion_date for cancellation time as well
-        db.session.commit()
+        try:
+            # Conditional on the order still being pending, so it cannot undo a concurrent confirmation
+            close_pending_order(order, OrderStatus.CANCELLED_BY_BUYER,
+                                completion_date=db.func.now()) # Use completion_date for cancellation time as well
+            db.session.commit()
+        except OrderAlreadyProcessed:
+            flash("This order can no longer be cancelled as the seller has already processed it or it is completed.", "warning")
+            return redirect(url_for("buyer.dashboard"))
         flash(f"Order #{order.id} has been cancelled.", "success")
     else:
         flash("This order can no longer be cancelled as the seller has already processed it or it is completed.", "warning")
@@ -1,17 +1,23 @@
 import os
 import sys
-import uuid
 import datetime # Added for strptime
 from flask import Blueprint, render_template, session, redirect, url_for, flash, request, current_app
-from werkzeug.utils import secure_filename
 from functools import wraps
+from sqlalchemy import select, func
+from sqlalchemy.orm import joinedload
 
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
 sys.path.insert(0, PROJECT_ROOT)
 
 from src.models.models import db, User, UserRole, CarbonCredit, CreditStatus, Order, OrderStatus, UploadedFile
-from src.services.pdf_service import generate_certificate_pdf
-from src.services.signing_service import sign_pdf_document
+from src.services.identity_service import current_identity
+from src.services.database_service import read_replica
+from src.services.certificate_service import request_certificate
+from src.services.job_service import dispatch_jobs
+from src.services.inventory_service import confirm_order_stock, close_pending_order, OrderAlreadyProcessed, InsufficientStock, CreditUnavailable
+from src.services.idempotency_service import idempotent
+from src.services.pagination_service import keyset_paginate, keyset_mode_requested, cursor_url_args
+from src.services.upload_store_service import store_upload
 
 seller_bp = Blueprint("seller", __name__, template_folder="../templates/seller", url_prefix="/seller")
 
@@ -22,8 +28,8 @@ def seller_required(f):
         if "user_id" not in session or session.get("role") != UserRole.SELLER.value:
             flash("You must be logged in as a seller to access this page.", "danger")
             return redirect(url_for("auth.login"))
-        user = User.query.get(session["user_id"])
-        if not user or not user.is_active:
+        identity = current_identity()
+        if not identity or not identity.is_active:
             flash("Your account is inactive. Please contact support.", "danger")
             session.clear()
             return redirect(url_for("auth.login"))
@@ -34,29 +40,65 @@ def allowed_file(filename):
     return "." in filename and \
            filename.rsplit(".", 1)[1].lower() in current_app.config["ALLOWED_EXTENSIONS"]
 
+DASHBOARD_PER_PAGE = 10
+
+def seller_stats(seller_id):
+    """Dashboard counters for a seller: one GROUP BY status query per table instead of loading every row."""
+    credit_counts = dict(db.session.execute(
+        select(CarbonCredit.status, func.count()).where(CarbonCredit.seller_id == seller_id).group_by(CarbonCredit.status)
+    ).all())
+    order_counts = dict(db.session.execute(
+        select(Order.status, func.count()).where(Order.seller_id == seller_id).group_by(Order.status)
+    ).all())
+    return {
+        "total_listed": sum(credit_counts.values()),
+        "pending_approval": credit_counts.get(CreditStatus.PENDING_APPROVAL, 0),
+        "approved_active": credit_counts.get(CreditStatus.APPROVED, 0),
+        "sold": credit_counts.get(CreditStatus.SOLD, 0),
+        "total_orders": sum(order_counts.values()),
+        "pending_action_orders": order_counts.get(OrderStatus.PENDING_SELLER_ACTION, 0),
+        "confirmed_orders": order_counts.get(OrderStatus.CONFIRMED_BY_SELLER, 0) + order_counts.get(OrderStatus.COMPLETED, 0)
+    }
+
+def _paginate_dashboard_table(query, sort_column, id_column, sort_key, prefix):
+    # Each table has its own cursor/page argument so paging one leaves the other where it was
+    cursor_arg, page_arg = f"{prefix}_cursor", f"{prefix}_page"
+    if keyset_mode_requested(cursor_arg, page_arg):
+        return keyset_paginate(query, sort_column, id_column, sort_key=sort_key,
+                               cursor=request.args.get(cursor_arg), per_page=DASHBOARD_PER_PAGE)
+    return query.order_by(sort_column.desc(), id_column.desc()) \
+        .paginate(page=request.args.get(page_arg, 1, type=int), per_page=DASHBOARD_PER_PAGE, error_out=False)
+
+def dashboard_page_url(prefix, pagination, direction):
+    """Link to the previous/next page of one dashboard table, keeping the other table's position."""
+    args = cursor_url_args(request.args, f"{prefix}_cursor", f"{prefix}_page")
+    if getattr(pagination, "is_keyset", False):
+        args[f"{prefix}_cursor"] = pagination.next_cursor if direction == "next" else pagination.prev_cursor
+    else:
+        args[f"{prefix}_page"] = pagination.next_num if direction == "next" else pagination.prev_num
+    return url_for("seller.dashboard", **args)
+
 # --- Seller Routes ---
 @seller_bp.route("/dashboard")
+@read_replica
 @seller_required
 def dashboard():
     seller_id = session["user_id"]
-    listed_credits = CarbonCredit.query.filter_by(seller_id=seller_id).order_by(CarbonCredit.submitted_at.desc()).all()
-    received_orders = Order.query.filter_by(seller_id=seller_id).order_by(Order.order_date.desc()).all()
-    
-    stats = {
-        "total_listed": len(listed_credits),
-        "pending_approval": sum(1 for lc in listed_credits if lc.status == CreditStatus.PENDING_APPROVAL),
-        "approved_active": sum(1 for lc in listed_credits if lc.status == CreditStatus.APPROVED),
-        "sold": sum(1 for lc in listed_credits if lc.status == CreditStatus.SOLD),
-        "total_orders": len(received_orders),
-        "pending_action_orders": sum(1 for ro in received_orders if ro.status == OrderStatus.PENDING_SELLER_ACTION),
-        "confirmed_orders": sum(1 for ro in received_orders if ro.status == OrderStatus.CONFIRMED_BY_SELLER or ro.status == OrderStatus.COMPLETED)
-    }
+    credits_pagination = _paginate_dashboard_table(
+        CarbonCredit.query.filter_by(seller_id=seller_id),
+        CarbonCredit.submitted_at, CarbonCredit.id, "submitted_at", "credits")
+    orders_pagination = _paginate_dashboard_table(
+        Order.query.options(joinedload(Order.buyer), joinedload(Order.carbon_credit)).filter_by(seller_id=seller_id),
+        Order.order_date, Order.id, "order_date", "orders")
 
     return render_template("seller_dashboard.html", 
                            title="Seller Dashboard", 
-                           listed_credits=listed_credits, 
-                           received_orders=received_orders,
-                           stats=stats)
+                           listed_credits=credits_pagination.items, 
+                           received_orders=orders_pagination.items,
+                           credits_pagination=credits_pagination,
+                           orders_pagination=orders_pagination,
+                           dashboard_page_url=dashboard_page_url,
+                           stats=seller_stats(seller_id))
 
 @seller_bp.route("/credits/list", methods=["GET", "POST"])
 @seller_required
@@ -83,27 +125,13 @@ def list_credit():
             flash("Quantity and price must be positive values.", "danger")
             return redirect(url_for("seller.list_credit"))
 
-        image_filename_saved = None
-        if image_file and image_file.filename != "" and allowed_file(image_file.filename):
-            filename = secure_filename(image_file.filename)
-            ext = filename.rsplit(".", 1)[1].lower()
-            image_filename_saved = f"credit_img_{uuid.uuid4().hex}.{ext}"
-            image_path = os.path.join(current_app.config["UPLOAD_FOLDER"], "credits", image_filename_saved)
-            os.makedirs(os.path.dirname(image_path), exist_ok=True) # Ensure directory exists
-            image_file.save(image_path)
-        elif image_file and image_file.filename != "":
+        has_image = bool(image_file and image_file.filename != "")
+        if has_image and not allowed_file(image_file.filename):
             flash("Invalid image file type.", "danger")
             return redirect(url_for("seller.list_credit"))
 
-        verification_filename_saved = None
-        if verification_file and verification_file.filename != "" and allowed_file(verification_file.filename):
-            filename = secure_filename(verification_file.filename)
-            ext = filename.rsplit(".", 1)[1].lower()
-            verification_filename_saved = f"credit_verif_{uuid.uuid4().hex}.{ext}"
-            verification_path = os.path.join(current_app.config["UPLOAD_FOLDER"], "verifications", verification_filename_saved)
-            os.makedirs(os.path.dirname(verification_path), exist_ok=True) # Ensure directory exists
-            verification_file.save(verification_path)
-        elif verification_file and verification_file.filename != "":
+        has_verification = bool(verification_file and verification_file.filename != "")
+        if has_verification and not allowed_file(verification_file.filename):
             flash("Invalid verification document file type.", "danger")
             return redirect(url_for("seller.list_credit"))
 
@@ -123,6 +151,18 @@ def list_credit():
                 flash("Invalid end date format. Please use YYYY-MM-DD.", "danger")
                 return redirect(url_for("seller.list_credit"))
 
+        # Files are stored only once the form is valid; each is stored once per distinct content,
+        # and the uploads are recorded with the credit
+        uploads = []
+        image_filename_saved = None
+        if has_image:
+            uploads.append(store_upload(image_file, "credits", "credit_image", session["user_id"]))
+            image_filename_saved = uploads[-1].saved_filename
+        verification_filename_saved = None
+        if has_verification:
+            uploads.append(store_upload(verification_file, "verifications", "verification_doc", session["user_id"]))
+            verification_filename_saved = uploads[-1].saved_filename
+
         new_credit = CarbonCredit(
             seller_id=session["user_id"],
             title=title,
@@ -141,6 +181,9 @@ def list_credit():
         
         try:
             db.session.add(new_credit)
+            db.session.flush() # Assigns the credit's id
+            for upload in uploads:
+                upload.related_entity_id = new_credit.id
             db.session.commit()
             flash("New carbon credit listed successfully! It is now pending admin approval.", "success")
             return redirect(url_for("seller.dashboard"))
@@ -148,17 +191,15 @@ def list_credit():
             db.session.rollback()
             current_app.logger.error(f"Error listing credit: {str(e)}")
             flash(f"Error listing credit: {str(e)}", "danger")
-            # Clean up uploaded files if saving to DB failed
-            if image_filename_saved and os.path.exists(os.path.join(current_app.config["UPLOAD_FOLDER"], "credits", image_filename_saved)):
-                os.remove(os.path.join(current_app.config["UPLOAD_FOLDER"], "credits", image_filename_saved))
-            if verification_filename_saved and os.path.exists(os.path.join(current_app.config["UPLOAD_FOLDER"], "verifications", verification_filename_saved)):
-                os.remove(os.path.join(current_app.config["UPLOAD_FOLDER"], "verifications", verification_filename_saved))
+            # The rollback dropped the uploads' references; sweep_unreferenced_uploads removes any
+            # stored file left unused (another listing may be committing a reference to it right now)
             return redirect(url_for("seller.list_credit"))
 
     return render_template("list_credit.html", title="List New Carbon Credit")
 
 @seller_bp.route("/orders/<int:order_id>/confirm", methods=["POST"])
 @seller_required
+@idempotent
 def confirm_order(order_id):
     order = Order.query.get_or_404(order_id)
     if order.seller_id != session["user_id"]:
@@ -166,56 +207,32 @@ def confirm_order(order_id):
         return redirect(url_for("seller.dashboard"))
     
     if order.status == OrderStatus.PENDING_SELLER_ACTION:
-        credit = CarbonCredit.query.get(order.credit_id)
-        if credit and credit.status == CreditStatus.APPROVED and credit.quantity >= order.quantity_ordered:
-            generated_pdf_filename = None
-            signed_pdf_filename = None
-            try:
-                generated_pdf_filename = generate_certificate_pdf(order.id)
-                if not generated_pdf_filename:
-                    flash("Failed to generate PDF certificate for the order.", "danger")
-                    return redirect(url_for("seller.dashboard"))
-                
-                order.pdf_certificate_filename = generated_pdf_filename
-                current_app.logger.info(f"Generated PDF {generated_pdf_filename} for order {order.id}")
-
-                signed_pdf_filename = sign_pdf_document(generated_pdf_filename)
-                if not signed_pdf_filename:
-                    flash("Failed to sign the PDF certificate.", "danger")
-                    return redirect(url_for("seller.dashboard"))
-                
-                order.signed_pdf_certificate_filename = signed_pdf_filename
-                current_app.logger.info(f"Signed PDF {signed_pdf_filename} for order {order.id}")
-
-                credit.quantity -= order.quantity_ordered
-                if credit.quantity == 0:
-                    credit.status = CreditStatus.SOLD
-                
-                order.status = OrderStatus.COMPLETED
-                order.seller_action_date = datetime.datetime.utcnow() # Use Python datetime
-                order.completion_date = datetime.datetime.utcnow() # Use Python datetime
-                
-                db.session.commit()
-                flash(f"Order #{order.id} has been confirmed and certificate generated & signed.", "success")
-            
-            except Exception as e:
-                db.session.rollback()
-                current_app.logger.error(f"Error during order confirmation for order {order.id}: {str(e)}")
-                flash(f"An unexpected error occurred while confirming the order: {str(e)}", "danger")
-                if generated_pdf_filename and os.path.exists(os.path.join(current_app.config["UPLOAD_FOLDER"], "certificates", generated_pdf_filename)):
-                    if not signed_pdf_filename:
-                        os.remove(os.path.join(current_app.config["UPLOAD_FOLDER"], "certificates", generated_pdf_filename))
-                if signed_pdf_filename and os.path.exists(os.path.join(current_app.config["UPLOAD_FOLDER"], "certificates", "signed", signed_pdf_filename)):
-                     os.remove(os.path.join(current_app.config["UPLOAD_FOLDER"], "certificates", "signed", signed_pdf_filename))
-                order.pdf_certificate_filename = None
-                order.signed_pdf_certificate_filename = None
-
-        elif credit and credit.quantity < order.quantity_ordered:
+        try:
+            # Claims the order and takes its stock with conditional UPDATEs, so concurrent
+            # confirmations against the same credit cannot oversell it
+            confirm_order_stock(order)
+            # Certificate generation and signing run in the background job worker;
+            # the job commits together with the stock change and marks the order COMPLETED when done.
+            request_certificate(order)
+            db.session.commit()
+        except OrderAlreadyProcessed:
+            flash("This order is not pending your action or has already been processed.", "warning")
+            return redirect(url_for("seller.dashboard"))
+        except InsufficientStock:
+            credit = db.session.get(CarbonCredit, order.credit_id)
             flash(f"Not enough quantity available for credit \"{credit.title}\". Order cannot be confirmed.", "warning")
-        elif not credit or credit.status != CreditStatus.APPROVED:
+            return redirect(url_for("seller.dashboard"))
+        except CreditUnavailable:
             flash(f"The credit associated with this order is no longer available or approved.", "warning")
-        else:
-            flash("Could not confirm order due to an issue with the credit.", "danger")
+            return redirect(url_for("seller.dashboard"))
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error during order confirmation for order {order.id}: {str(e)}")
+            flash(f"An unexpected error occurred while confirming the order: {str(e)}", "danger")
+            return redirect(url_for("seller.dashboard"))
+
+        dispatch_jobs()
+        flash(f"Order #{order.id} has been confirmed. The certificate is being generated and signed.", "success")
     else:
         flash("This order is not pending your action or has already been processed.", "warning")
     return redirect(url_for("seller.dashboard"))
@@ -230,10 +247,14 @@ def reject_order(order_id):
         return redirect(url_for("seller.dashboard"))
 
     if order.status == OrderStatus.PENDING_SELLER_ACTION:
-        order.status = OrderStatus.REJECTED_BY_SELLER
-        order.seller_action_date = datetime.datetime.utcnow() # Use Python datetime
-        order.seller_remarks = seller_remarks
-        db.session.commit()
+        try:
+            # Conditional on the order still being pending, so it cannot undo a concurrent confirmation
+            close_pending_order(order, OrderStatus.REJECTED_BY_SELLER,
+                                seller_action_date=datetime.datetime.utcnow(), seller_remarks=seller_remarks)
+            db.session.commit()
+        except OrderAlreadyProcessed:
+            flash("This order is not pending your action or has already been processed.", "warning")
+            return redirect(url_for("seller.dashboard"))
         flash(f"Order #{order.id} has been rejected.", "success")
     else:
         flash("This order is not pending your action or has already been processed.", "warning")
@@ -0,0 +1,159 @@
+import os
+import time
+from datetime import datetime
+from flask import current_app
+from sqlalchemy.orm import joinedload
+
+from src.models.models import db, Order, OrderStatus, CertificateStatus
+from src.services.pdf_service import generate_certificate_pdf, certificate_data, certificate_pdf_filename, create_render_pool, render_certificates
+from src.services.signing_service import sign_pdf_document, sign_pdf_batch
+from src.services.job_service import register_job_handler, enqueue_job
+
+CERTIFICATE_JOB = "issue_certificate"
+
+class CertificateError(Exception):
+    """Raised when a certificate could not be generated or signed (the job will be retried)."""
+
+def request_certificate(order):
+    """
+    Marks the order's certificate as pending and queues its generation and signing.
+    Must be called inside the transaction that confirms the order; the caller commits and then calls dispatch_jobs().
+    """
+    order.certificate_status = CertificateStatus.PENDING
+    return enqueue_job(CERTIFICATE_JOB, order.id, max_attempts=current_app.config.get("CERTIFICATE_JOB_MAX_ATTEMPTS", 3))
+
+def issue_certificate(order_id):
+    """
+    Generates and signs the PDF certificate for a confirmed order, then marks the order completed.
+    Idempotent: an order that already has a signed certificate is left untouched.
+    """
+    order = db.session.get(Order, order_id)
+    if order is None:
+        raise CertificateError(f"Order {order_id} not found.")
+    if order.certificate_status == CertificateStatus.READY and order.has_signed_certificate:
+        return order.signed_pdf_certificate_filename or order.certificate_proof_filename
+
+    generated_pdf_filename = generate_certificate_pdf(order.id)
+    if not generated_pdf_filename:
+        raise CertificateError(f"Failed to generate PDF certificate for order {order.id}.")
+    current_app.logger.info(f"Generated PDF {generated_pdf_filename} for order {order.id}")
+
+    signed_pdf_filename = sign_pdf_document(generated_pdf_filename)
+    if not signed_pdf_filename:
+        _remove_upload("certificates", generated_pdf_filename)
+        raise CertificateError(f"Failed to sign the PDF certificate for order {order.id}.")
+    current_app.logger.info(f"Signed PDF {signed_pdf_filename} for order {order.id}")
+
+    try:
+        order.pdf_certificate_filename = generated_pdf_filename
+        order.signed_pdf_certificate_filename = signed_pdf_filename
+        order.certificate_status = CertificateStatus.READY
+        order.status = OrderStatus.COMPLETED
+        order.completion_date = datetime.utcnow()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        _remove_upload("certificates", generated_pdf_filename)
+        _remove_upload(os.path.join("certificates", "signed"), signed_pdf_filename)
+        raise
+    return signed_pdf_filename
+
+def mark_certificate_failed(order_id, error):
+    """Called once the certificate job has exhausted its retries."""
+    order = db.session.get(Order, order_id)
+    if order is not None:
+        order.certificate_status = CertificateStatus.FAILED
+        db.session.commit()
+
+def regenerate_certificates(order_ids, processes=None):
+    """
+    Re-renders and re-signs the certificates of confirmed/completed orders, rendering on a pool of
+    `processes` worker processes (default PDF_RENDER_PROCESSES or the CPU count).
+    The rendered certificates are signed as one batch (sign_pdf_batch: a single signature over their
+    Merkle root), and each order records its inclusion proof and the batch manifest instead of a .p7m.
+    Orders whose certificate had failed are completed, as issue_certificate would have done.
+    Returns a summary dict with counts, the batch id, failures ({order_id: reason}) and throughput.
+    """
+    started = time.perf_counter()
+    summary = {"requested": len(order_ids), "rendered": 0, "signed": 0, "batch_id": None, "failures": {}}
+    orders = (Order.query
+              .options(joinedload(Order.buyer), joinedload(Order.seller_user), joinedload(Order.carbon_credit))
+              .filter(Order.id.in_(order_ids))
+              .all())
+    found = {order.id: order for order in orders}
+    for order_id in order_ids:
+        order = found.get(order_id)
+        if order is None:
+            summary["failures"][order_id] = "order not found"
+        elif order.status not in (OrderStatus.CONFIRMED_BY_SELLER, OrderStatus.COMPLETED):
+            summary["failures"][order_id] = f"order is {order.status.value}"
+            del found[order_id]
+
+    certificates_folder = os.path.join(current_app.config["UPLOAD_FOLDER"], "certificates")
+    generation_time = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
+    filenames = {order_id: certificate_pdf_filename(order_id) for order_id in found}
+    jobs = [(certificate_data(order, order.buyer, order.seller_user, order.carbon_credit, generation_time),
+             os.path.join(certificates_folder, filenames[order_id]))
+            for order_id, order in found.items()]
+
+    render_started = time.perf_counter()
+    if jobs:
+        with create_render_pool(current_app._get_current_object(), processes) as pool:
+            results = render_certificates(jobs, pool)
+    else:
+        results = {}
+    summary["render_seconds"] = time.perf_counter() - render_started
+
+    rendered = {}
+    for order_id, order in found.items():
+        result = results[os.path.join(certificates_folder, filenames[order_id])]
+        if isinstance(result, Exception):
+            summary["failures"][order_id] = f"render failed: {result}"
+            continue
+        rendered[order_id] = order
+    summary["rendered"] = len(rendered)
+
+    batch = sign_pdf_batch([filenames[order_id] for order_id in rendered]) if rendered else None
+    if rendered and not batch:
+        for order_id in rendered:
+            _remove_upload("certificates", filenames[order_id])
+            summary["failures"][order_id] = "signing failed"
+        rendered = {}
+
+    replaced_files = []
+    for order_id, order in rendered.items():
+        replaced_files.append((order.pdf_certificate_filename, order.signed_pdf_certificate_filename, order.certificate_proof_filename))
+        order.pdf_certificate_filename = filenames[order_id]
+        order.signed_pdf_certificate_filename = None
+        order.certificate_proof_filename = batch["proofs"][filenames[order_id]]
+        order.certificate_batch_filename = batch["signature_filename"]
+        order.certificate_status = CertificateStatus.READY
+        if order.status != OrderStatus.COMPLETED:
+            order.status = OrderStatus.COMPLETED
+            order.completion_date = datetime.utcnow()
+    summary["signed"] = len(rendered)
+    summary["batch_id"] = batch["batch_id"] if rendered else None
+    db.session.commit()
+
+    # Batch manifests are shared by every order of their batch and are kept
+    for old_pdf_filename, old_signed_filename, old_proof_filename in replaced_files:
+        if old_pdf_filename:
+            _remove_upload("certificates", old_pdf_filename)
+        if old_signed_filename:
+            _remove_upload(os.path.join("certificates", "signed"), old_signed_filename)
+        if old_proof_filename:
+            _remove_upload(os.path.join("certificates", "signed"), old_proof_filename)
+
+    summary["elapsed_seconds"] = time.perf_counter() - started
+    summary["certificates_per_second"] = summary["signed"] / summary["elapsed_seconds"] if summary["elapsed_seconds"] else 0.0
+    return summary
+
+def _remove_upload(subfolder, filename):
+    path = os.path.join(current_app.config["UPLOAD_FOLDER"], subfolder, filename)
+    if os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError as oe:
+            current_app.logger.error(f"Error removing certificate file {path}: {str(oe)}")
+
+register_job_handler(CERTIFICATE_JOB, issue_certificate, on_failure=mark_certificate_failed)
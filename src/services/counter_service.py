@@ -0,0 +1,162 @@
+import random
+from datetime import datetime
+from collections import Counter
+from sqlalchemy import event, select, update, insert, delete, func, literal, null, type_coerce, String
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+
+from src.models.models import db, User, UserRole, CarbonCredit, CreditStatus, Order, DashboardCounter
+
+# Admin dashboard totals are read from the dashboard_counters table instead of COUNT(*) scans.
+# A before_flush listener adjusts the counters in the same transaction as every ORM insert/delete of
+# users, credits and orders and every credit status change. Code that changes these tables with bulk
+# Core statements must call adjust_counters() itself; rebuild_counters() recomputes everything.
+#
+# The same table holds the marketplace generation: a number bumped in the transaction of every
+# change that can alter a marketplace listing (a credit approved, rejected, delisted, sold, an
+# approved credit edited, or a seller renamed). Cached marketplace pages and their ETags are only
+# valid for the generation they were computed in. It is not a total, so rebuilds leave it alone.
+
+USERS = "users"
+ORDERS = "orders"
+MARKETPLACE_GENERATION = "marketplace.generation"
+
+def credit_counter(status):
+    return f"credits.{status.name}"
+
+def _credit_status(credit):
+    # A new credit's status may still be unset when it relies on the column default
+    return credit.status or CarbonCredit.__table__.c.status.default.arg
+
+def _counter_deltas(session):
+    deltas = Counter()
+    listings_changed = False
+    for obj in session.new:
+        if isinstance(obj, User):
+            deltas[USERS] += 1
+        elif isinstance(obj, Order):
+            deltas[ORDERS] += 1
+        elif isinstance(obj, CarbonCredit):
+            deltas[credit_counter(_credit_status(obj))] += 1
+            listings_changed |= _credit_status(obj) == CreditStatus.APPROVED
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            deltas[USERS] -= 1
+        elif isinstance(obj, Order):
+            deltas[ORDERS] -= 1
+        elif isinstance(obj, CarbonCredit):
+            history = get_history(obj, "status")
+            status = (history.deleted or history.unchanged or [obj.status])[0]
+            deltas[credit_counter(status)] -= 1
+            listings_changed |= status == CreditStatus.APPROVED
+    for obj in session.dirty:
+        if isinstance(obj, CarbonCredit) and obj not in session.deleted:
+            history = get_history(obj, "status")
+            if history.added and history.deleted and history.added[0] != history.deleted[0]:
+                deltas[credit_counter(history.deleted[0])] -= 1
+                deltas[credit_counter(history.added[0])] += 1
+                listings_changed |= CreditStatus.APPROVED in (history.added[0], history.deleted[0])
+            elif obj.status == CreditStatus.APPROVED and session.is_modified(obj, include_collections=False):
+                listings_changed = True # An approved credit's price, quantity or text changed
+        elif isinstance(obj, User) and obj.role == UserRole.SELLER and obj not in session.deleted:
+            # Listings show the seller's company or user name
+            listings_changed |= any(get_history(obj, name).has_changes() for name in ("company_name", "username"))
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if listings_changed:
+        deltas[MARKETPLACE_GENERATION] = 1
+    return deltas
+
+def adjust_counters(connection, deltas):
+    """Applies {counter name: delta} atomically (value = value + delta) on the given connection."""
+    now = datetime.utcnow()
+    for name, delta in deltas.items():
+        connection.execute(
+            update(DashboardCounter.__table__)
+            .where(DashboardCounter.__table__.c.name == name)
+            .values(value=DashboardCounter.__table__.c.value + delta, updated_at=now)
+        )
+
+@event.listens_for(CarbonCredit.status, "set", active_history=True)
+def _load_previous_status(credit, value, oldvalue, initiator):
+    # active_history makes SQLAlchemy load the old status of an expired credit before it is
+    # overwritten, so the flush listener can always see which counter to decrement
+    pass
+
+@event.listens_for(Session, "before_flush")
+def _update_counters_on_flush(session, flush_context, instances):
+    deltas = _counter_deltas(session)
+    if deltas:
+        # Core statements on the session's connection: same transaction, no recursive flush
+        adjust_counters(session.connection(), deltas)
+
+def _create_generation(target, connection, **kw):
+    connection.execute(insert(DashboardCounter.__table__), _generation_row())
+
+def _generation_row():
+    # A random start, so a recreated table never repeats a generation some process has cached pages for
+    return {"name": MARKETPLACE_GENERATION, "value": random.getrandbits(30), "updated_at": datetime.utcnow()}
+
+event.listen(DashboardCounter.__table__, "after_create", _create_generation)
+
+def get_marketplace_version():
+    """(generation, time of the last bump) of the marketplace, or None if this database has no generation yet."""
+    return db.session.execute(
+        select(DashboardCounter.value, DashboardCounter.updated_at).where(DashboardCounter.name == MARKETPLACE_GENERATION)
+    ).first()
+
+def get_marketplace_generation():
+    """The current marketplace generation, or None if this database has none yet (then nothing may be cached)."""
+    version = get_marketplace_version()
+    return version.value if version else None
+
+def count_totals():
+    """Recomputes every counter with one grouped aggregate query. Returns {name: value}."""
+    # Raw status names (the Enum column stores member names), so the union's columns line up
+    status = type_coerce(CarbonCredit.__table__.c.status, String)
+    credit_counts = select(literal("credits"), status, func.count()).group_by(status)
+    user_count = select(literal(USERS), null(), func.count()).select_from(User.__table__)
+    order_count = select(literal(ORDERS), null(), func.count()).select_from(Order.__table__)
+    totals = {credit_counter(status): 0 for status in CreditStatus}
+    totals.update({USERS: 0, ORDERS: 0})
+    for kind, credit_status, value in db.session.execute(credit_counts.union_all(user_count, order_count)):
+        totals[f"credits.{credit_status}" if kind == "credits" else kind] = value
+    return totals
+
+def rebuild_counters():
+    """Replaces the stored counters with freshly aggregated totals."""
+    totals = count_totals()
+    try:
+        table = DashboardCounter.__table__
+        previous = dict(db.session.execute(delete(table).returning(table.c.name, table.c.value)).all())
+        now = datetime.utcnow()
+        rows = [{"name": name, "value": value, "updated_at": now} for name, value in totals.items()]
+        # The generation carries over (databases created before the marketplace cache get one here)
+        generation = _generation_row()
+        if previous.get(MARKETPLACE_GENERATION) is not None:
+            generation["value"] = previous[MARKETPLACE_GENERATION]
+        rows.append(generation)
+        db.session.execute(insert(table), rows)
+        db.session.commit()
+    except IntegrityError:
+        # Another request rebuilt them concurrently; its values are just as fresh
+        db.session.rollback()
+    return totals
+
+def get_counters():
+    """Returns {name: value}, building the counters on first use."""
+    counters = dict(db.session.execute(
+        select(DashboardCounter.name, DashboardCounter.value).where(DashboardCounter.name != MARKETPLACE_GENERATION)
+    ).all())
+    if not counters:
+        counters = rebuild_counters()
+    return counters
+
+def get_dashboard_counts():
+    counters = get_counters()
+    return {
+        "pending_credits": counters.get(credit_counter(CreditStatus.PENDING_APPROVAL), 0),
+        "approved_credits": counters.get(credit_counter(CreditStatus.APPROVED), 0),
+        "total_users": counters.get(USERS, 0),
+        "total_orders": counters.get(ORDERS, 0),
+    }
@@ -0,0 +1,120 @@
+from functools import wraps
+from flask import g
+from sqlalchemy import event, create_engine
+from sqlalchemy.engine import make_url
+
+from src.models.models import db
+from src.models.session import REPLICA_ENGINE_KEY, READ_REPLICA_FLAG
+
+# SQLite tuning. WAL lets marketplace/dashboard readers keep reading while an order confirmation
+# or approval is writing (the default rollback journal blocks them). synchronous=NORMAL is safe
+# with WAL (a power loss can drop the last commits but never corrupts the file). busy_timeout
+# makes a second writer wait for the lock instead of failing with "database is locked".
+DEFAULT_SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,          # milliseconds
+    "cache_size": -64000,          # negative = KiB, i.e. 64 MB page cache per connection
+    "mmap_size": 268435456,        # 256 MB memory-mapped reads
+    "temp_store": "MEMORY",
+}
+
+def normalize_database_url(url):
+    """Accepts the postgres:// scheme many hosting providers hand out, which SQLAlchemy 2 rejects."""
+    if url.startswith("postgres://"):
+        return "postgresql://" + url[len("postgres://"):]
+    return url
+
+def _is_sqlite_file(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:")
+
+def _is_in_memory_sqlite(uri):
+    url = make_url(uri)
+    return url.get_backend_name() == "sqlite" and not _is_sqlite_file(uri)
+
+def _pool_options(app):
+    # One pooled connection per request thread plus a little overflow for job and hashing threads
+    pool_size = app.config.get("SQLALCHEMY_POOL_SIZE", 10)
+    return {
+        "pool_size": pool_size,
+        "max_overflow": app.config.get("SQLALCHEMY_MAX_OVERFLOW", pool_size),
+        "pool_timeout": app.config.get("SQLALCHEMY_POOL_TIMEOUT", 30),
+    }
+
+def sqlite_engine_options(app):
+    """Pool settings for a file-backed SQLite engine shared by multi-threaded workers."""
+    options = _pool_options(app)
+    options["connect_args"] = {
+        # Connections move between request/job threads through the pool
+        "check_same_thread": False,
+        # Seconds pysqlite waits for a lock; kept in line with the busy_timeout pragma
+        "timeout": app.config.get("SQLITE_PRAGMAS", DEFAULT_SQLITE_PRAGMAS).get("busy_timeout", 5000) / 1000,
+    }
+    return options
+
+def engine_options(app, uri):
+    """Engine options for uri: SQLite file tuning, a checked pool for server databases, nothing for :memory:."""
+    if _is_sqlite_file(uri):
+        return sqlite_engine_options(app)
+    if _is_in_memory_sqlite(uri):
+        return {}
+    options = _pool_options(app)
+    # Server connections can be dropped by failovers or idle timeouts while sitting in the pool
+    options["pool_pre_ping"] = True
+    options["pool_recycle"] = app.config.get("SQLALCHEMY_POOL_RECYCLE", 1800)
+    return options
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """Runs PRAGMA statements on every new DB-API connection the engine opens."""
+    @event.listens_for(engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+def init_database(app):
+    """
+    Initialises Flask-SQLAlchemy for app: pool settings for the primary database and the optional
+    DATABASE_REPLICA_URL engine, and PRAGMA tuning for SQLite databases. The replica is kept out
+    of SQLALCHEMY_BINDS: it holds the same tables as the primary, so create_all/drop_all must not
+    target it, and only RoutingSession chooses it.
+    """
+    uri = app.config["SQLALCHEMY_DATABASE_URI"] = normalize_database_url(app.config["SQLALCHEMY_DATABASE_URI"])
+    options = engine_options(app, uri)
+    options.update(app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+    db.init_app(app)
+    replica_url = app.config.get("DATABASE_REPLICA_URL")
+    if replica_url:
+        replica_url = normalize_database_url(replica_url)
+        app.extensions[REPLICA_ENGINE_KEY] = create_engine(replica_url, **engine_options(app, replica_url))
+    pragmas = app.config.get("SQLITE_PRAGMAS", DEFAULT_SQLITE_PRAGMAS)
+    for engine in database_engines(app):
+        if engine.dialect.name == "sqlite" and pragmas:
+            apply_sqlite_pragmas(engine, pragmas)
+
+def database_engines(app):
+    """Every engine the app uses: the Flask-SQLAlchemy binds plus the replica, if configured."""
+    with app.app_context():
+        engines = list(db.engines.values())
+    if REPLICA_ENGINE_KEY in app.extensions:
+        engines.append(app.extensions[REPLICA_ENGINE_KEY])
+    return engines
+
+def read_replica(f):
+    """
+    Marks a read-only view: its queries may be served by the replica bind (see RoutingSession).
+    Without DATABASE_REPLICA_URL, or right after the user wrote something, they use the primary.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        setattr(g, READ_REPLICA_FLAG, True)
+        try:
+            return f(*args, **kwargs)
+        finally:
+            g.pop(READ_REPLICA_FLAG, None)
+    return decorated_function
@@ -0,0 +1,198 @@
+from bisect import bisect_right
+from collections import Counter
+from sqlalchemy import event, select, update, insert, delete, func, literal, case
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+
+from src.models.models import db, CarbonCredit, CreditStatus, MarketplaceFacet
+
+# Counts shown next to the marketplace filters (approved credits per project type and location,
+# and a price histogram) live in the marketplace_facets table, one row per (facet, value), so a
+# marketplace request reads them with one small query instead of a GROUP BY scan per facet.
+# A before_flush listener moves a credit's contributions in the same transaction as every ORM
+# change that lists it, unlists it or changes a faceted column of a listed credit; code that does
+# so with Core statements must call adjust_facets() itself. rebuild_facets() recomputes everything.
+
+PROJECT_TYPE = "project_type"
+LOCATION = "location"
+PRICE = "price"
+TOTAL = "total" # Single row (value "") counting every approved credit; its presence means the facets are built
+
+# Lower bounds of the price histogram buckets; the last bucket is open-ended
+PRICE_BUCKET_BOUNDS = (0, 5, 10, 25, 50, 100, 250)
+
+FACETED_ATTRIBUTES = ("status", "source_project_type", "source_project_location", "price_per_unit")
+
+def price_bucket(price):
+    """Lower bound of the histogram bucket a price falls into."""
+    return PRICE_BUCKET_BOUNDS[max(bisect_right(PRICE_BUCKET_BOUNDS, price) - 1, 0)]
+
+def facet_keys(project_type, location, price):
+    """The (facet, value) rows an approved credit with these column values is counted in."""
+    keys = [(TOTAL, "")]
+    if project_type:
+        keys.append((PROJECT_TYPE, project_type))
+    if location:
+        keys.append((LOCATION, location))
+    if price is not None:
+        keys.append((PRICE, str(price_bucket(price))))
+    return keys
+
+def _upsert_statement(connection):
+    # Rows for values seen for the first time are created by the same statement that counts them
+    if connection.dialect.name == "postgresql":
+        return postgresql.insert(MarketplaceFacet.__table__)
+    if connection.dialect.name == "sqlite":
+        return sqlite.insert(MarketplaceFacet.__table__)
+    return None
+
+def adjust_facets(connection, deltas):
+    """Applies {(facet, value): delta} atomically (count = count + delta) on the given connection."""
+    table = MarketplaceFacet.__table__
+    upsert = _upsert_statement(connection)
+    for (facet, value), delta in deltas.items():
+        if facet == TOTAL or upsert is None:
+            # The total row is only ever created by a rebuild, so unbuilt facets stay detectably unbuilt
+            changed = connection.execute(
+                update(table).where(table.c.facet == facet, table.c.value == value).values(count=table.c.count + delta)
+            ).rowcount
+            if changed or facet == TOTAL:
+                continue
+            connection.execute(insert(table).values(facet=facet, value=value, count=delta))
+        else:
+            connection.execute(
+                upsert.values(facet=facet, value=value, count=delta)
+                .on_conflict_do_update(index_elements=[table.c.facet, table.c.value], set_={"count": table.c.count + delta})
+            )
+
+def credit_facet_deltas(rows, sign):
+    """{(facet, value): delta} for adding (sign=1) or removing (sign=-1) approved credits given as
+    (source_project_type, source_project_location, price_per_unit) rows, e.g. from UPDATE ... RETURNING."""
+    deltas = Counter()
+    for project_type, location, price in rows:
+        for key in facet_keys(project_type, location, price):
+            deltas[key] += sign
+    return deltas
+
+def _committed_value(credit, attribute):
+    # The value before this flush; active_history (below) guarantees it was loaded before being overwritten
+    history = get_history(credit, attribute)
+    if history.deleted:
+        return history.deleted[0]
+    if history.added:
+        return None
+    return history.unchanged[0] if history.unchanged else getattr(credit, attribute)
+
+def _listed_keys(values):
+    status, project_type, location, price = values
+    return facet_keys(project_type, location, price) if status == CreditStatus.APPROVED else []
+
+def _facet_deltas(session):
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, CarbonCredit):
+            status = obj.status or CarbonCredit.__table__.c.status.default.arg
+            for key in _listed_keys((status, obj.source_project_type, obj.source_project_location, obj.price_per_unit)):
+                deltas[key] += 1
+    for obj in session.deleted:
+        if isinstance(obj, CarbonCredit):
+            for key in _listed_keys([_committed_value(obj, attribute) for attribute in FACETED_ATTRIBUTES]):
+                deltas[key] -= 1
+    for obj in session.dirty:
+        if isinstance(obj, CarbonCredit) and obj not in session.deleted:
+            if not any(get_history(obj, attribute).has_changes() for attribute in FACETED_ATTRIBUTES):
+                continue
+            for key in _listed_keys([_committed_value(obj, attribute) for attribute in FACETED_ATTRIBUTES]):
+                deltas[key] -= 1
+            for key in _listed_keys([getattr(obj, attribute) for attribute in FACETED_ATTRIBUTES]):
+                deltas[key] += 1
+    return {key: delta for key, delta in deltas.items() if delta}
+
+def _load_previous_value(credit, value, oldvalue, initiator):
+    pass
+
+# active_history makes SQLAlchemy load an expired credit's old values before they are overwritten,
+# so the flush listener can always take back what the credit contributed
+for _attribute in FACETED_ATTRIBUTES:
+    event.listen(getattr(CarbonCredit, _attribute), "set", _load_previous_value, active_history=True)
+
+@event.listens_for(Session, "before_flush")
+def _update_facets_on_flush(session, flush_context, instances):
+    deltas = _facet_deltas(session)
+    if deltas:
+        adjust_facets(session.connection(), deltas)
+
+def _bucket_expression():
+    price = CarbonCredit.__table__.c.price_per_unit
+    return case(*[(price >= bound, literal(str(bound))) for bound in reversed(PRICE_BUCKET_BOUNDS[1:])],
+                else_=literal(str(PRICE_BUCKET_BOUNDS[0])))
+
+def count_facets(connection=None):
+    """Recomputes every facet with one aggregate query over approved credits. Returns {(facet, value): count}."""
+    table = CarbonCredit.__table__
+    approved = table.c.status == CreditStatus.APPROVED
+    bucket = _bucket_expression()
+    by_type = select(literal(PROJECT_TYPE), table.c.source_project_type, func.count()) \
+        .where(approved, table.c.source_project_type.is_not(None), table.c.source_project_type != "") \
+        .group_by(table.c.source_project_type)
+    by_location = select(literal(LOCATION), table.c.source_project_location, func.count()) \
+        .where(approved, table.c.source_project_location.is_not(None), table.c.source_project_location != "") \
+        .group_by(table.c.source_project_location)
+    by_price = select(literal(PRICE), bucket, func.count()).where(approved).group_by(bucket)
+    total = select(literal(TOTAL), literal(""), func.count()).where(approved)
+    counts = {(facet, value): count for facet, value, count in
+              (connection or db.session).execute(by_type.union_all(by_location, by_price, total))}
+    counts.setdefault((TOTAL, ""), 0)
+    return counts
+
+def _store_facets(connection, counts):
+    table = MarketplaceFacet.__table__
+    connection.execute(delete(table))
+    connection.execute(insert(table), [{"facet": facet, "value": value, "count": count}
+                                       for (facet, value), count in counts.items()])
+
+def rebuild_facets():
+    """Replaces the stored facets with freshly aggregated counts."""
+    counts = count_facets()
+    try:
+        _store_facets(db.session.connection(), counts)
+        db.session.commit()
+    except IntegrityError:
+        # Another request rebuilt them concurrently; its counts are just as fresh
+        db.session.rollback()
+    return counts
+
+@event.listens_for(db.metadata, "after_create")
+def _build_facets_on_create(target, connection, tables=(), **kw):
+    # A new facets table starts out consistent with whatever credits already exist
+    if MarketplaceFacet.__table__ in tables:
+        _store_facets(connection, count_facets(connection))
+
+def get_marketplace_facets():
+    """
+    Facet counts for the marketplace sidebar, building them on first use:
+    {"total": n, "project_type": [(value, count), ...], "location": [...], "price": [{"min", "max", "count"}, ...]}.
+    Value lists are sorted by count, most common first; the price histogram lists every bucket.
+    """
+    # Zero counts are kept (and dropped below): the total row must be seen even when nothing is listed
+    rows = db.session.execute(
+        select(MarketplaceFacet.facet, MarketplaceFacet.value, MarketplaceFacet.count)
+    ).all()
+    counts = {(facet, value): count for facet, value, count in rows}
+    if (TOTAL, "") not in counts:
+        counts = rebuild_facets()
+
+    def values(facet):
+        return sorted(((value, count) for (name, value), count in counts.items() if name == facet and count > 0),
+                      key=lambda item: (-item[1], item[0]))
+
+    upper_bounds = PRICE_BUCKET_BOUNDS[1:] + (None,)
+    return {
+        "total": counts.get((TOTAL, ""), 0),
+        PROJECT_TYPE: values(PROJECT_TYPE),
+        LOCATION: values(LOCATION),
+        PRICE: [{"min": low, "max": high, "count": counts.get((PRICE, str(low)), 0)}
+                for low, high in zip(PRICE_BUCKET_BOUNDS, upper_bounds)],
+    }
@@ -0,0 +1,109 @@
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from collections import OrderedDict
+from urllib.parse import quote
+from flask import current_app, request, abort
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+
+from src.services.upload_store_service import content_name_digest, storage_path
+
+# Delivery of uploaded files (credit images, verification documents, certificates).
+# FILE_DELIVERY_MODE picks who streams the bytes:
+#   "direct"      - the worker streams the file itself, with Range (206) and conditional (304) support
+#   "x-sendfile"  - Apache mod_xsendfile / lighttpd: the worker answers with an X-Sendfile header
+#                   naming the file and the front server sends it (including ranges)
+#   "x-accel"     - nginx: the worker answers with X-Accel-Redirect to an internal location
+#                   (FILE_ACCEL_REDIRECT_PREFIX) that maps onto UPLOAD_FOLDER
+# In every mode the ETag is the SHA-256 of the file's content (so it is identical across workers
+# and survives copies between servers) and revalidations are answered with 304 by the worker.
+# Files whose name carries a full UUID or their content hash (see upload_store_service) are never
+# rewritten, so they are cacheable for a year.
+
+DELIVERY_MODES = ("direct", "x-sendfile", "x-accel")
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+PUBLIC_SUBFOLDERS = ("credits",) # Listing images; documents and certificates stay out of shared caches
+_UUID_NAME = re.compile(r"(?<![0-9a-f])[0-9a-f]{32}(?![0-9a-f])")
+_HASH_CHUNK_SIZE = 1024 * 1024
+_DIGEST_CACHE_MAX_ENTRIES = 4096
+
+_digest_cache = OrderedDict() # (path, mtime_ns, size) -> hex digest, least recently used first
+_digest_cache_lock = threading.Lock()
+
+def content_digest(path):
+    """SHA-256 of the file at path, computed once per process for each version (mtime, size) of the file."""
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _digest_cache_lock:
+        digest = _digest_cache.get(key)
+        if digest is not None:
+            _digest_cache.move_to_end(key)
+            return digest
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as stored_file:
+        for chunk in iter(lambda: stored_file.read(_HASH_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    digest = sha256.hexdigest()
+    with _digest_cache_lock:
+        _digest_cache[key] = digest
+        while len(_digest_cache) > _DIGEST_CACHE_MAX_ENTRIES:
+            _digest_cache.popitem(last=False)
+    return digest
+
+def is_immutable_name(filename):
+    """Whether filename embeds a full UUID (uuid4().hex) or is content-addressed, i.e. is never reused for different content."""
+    return content_name_digest(filename) is not None or _UUID_NAME.search(filename.lower()) is not None
+
+def _set_cache_headers(response, subfolder, filename):
+    shared = subfolder in PUBLIC_SUBFOLDERS
+    response.cache_control.no_cache = None
+    response.cache_control.public = True if shared else None
+    response.cache_control.private = None if shared else True
+    if is_immutable_name(filename):
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.max_age = None
+        response.cache_control.no_cache = True # Revalidate with the ETag
+    response.expires = None
+
+def _offloaded_response(path, relative_path, mode):
+    response = current_app.response_class(mimetype=mimetypes.guess_type(path)[0] or "application/octet-stream")
+    if mode == "x-sendfile":
+        response.headers["X-Sendfile"] = path
+    else:
+        prefix = current_app.config.get("FILE_ACCEL_REDIRECT_PREFIX", "/protected-uploads/").rstrip("/")
+        response.headers["X-Accel-Redirect"] = quote(f"{prefix}/{relative_path}")
+    response.headers["Accept-Ranges"] = "bytes"
+    return response
+
+def send_upload(subfolder, filename):
+    """Response delivering UPLOAD_FOLDER/subfolder/filename according to FILE_DELIVERY_MODE; 404 if missing."""
+    upload_folder = current_app.config["UPLOAD_FOLDER"]
+    path = safe_join(upload_folder, subfolder, filename) # Rejects names escaping the subfolder
+    relative_path = storage_path(subfolder, filename)
+    if path is not None:
+        path = os.path.join(upload_folder, relative_path)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    etag = content_name_digest(filename) or content_digest(path)
+    mode = current_app.config.get("FILE_DELIVERY_MODE", "direct")
+    if mode not in DELIVERY_MODES:
+        raise ValueError(f"Unknown FILE_DELIVERY_MODE {mode!r}; expected one of {', '.join(DELIVERY_MODES)}.")
+
+    if mode == "direct":
+        response = send_file(path, request.environ, etag=etag, conditional=True,
+                             use_x_sendfile=False, response_class=current_app.response_class)
+    elif request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+    else:
+        # The front server streams the bytes and handles Range itself
+        response = _offloaded_response(path, relative_path, mode)
+        response.set_etag(etag)
+        response.last_modified = os.path.getmtime(path)
+    _set_cache_headers(response, subfolder, filename)
+    return response
@@ -0,0 +1,76 @@
+import hashlib
+import os
+from datetime import timezone
+from flask import current_app, request, session, make_response
+
+from src.services.identity_service import current_identity
+
+# Conditional GET for pages whose content is fully determined by a few database values (a credit's
+# updated_at, the marketplace generation) plus who is looking. The view computes a strong ETag from
+# those values before rendering; when the client (or a reverse proxy) revalidates that version with
+# If-None-Match, it gets 304 Not Modified and the template is never rendered. Anonymous pages are marked public so
+# a proxy can store them; pages for logged-in users are private to their browser.
+
+TEMPLATES_FINGERPRINT_KEY = "templates_fingerprint" # app.extensions key
+
+def _templates_fingerprint():
+    # Part of every ETag, so a deploy that changes a template never gets a stale page revalidated
+    app = current_app._get_current_object()
+    fingerprint = app.extensions.get(TEMPLATES_FINGERPRINT_KEY)
+    if fingerprint is None:
+        digest = hashlib.sha256()
+        template_root = os.path.join(app.root_path, app.template_folder)
+        for directory, subdirectories, filenames in sorted(os.walk(template_root)):
+            subdirectories.sort()
+            for filename in sorted(filenames):
+                path = os.path.join(directory, filename)
+                digest.update(os.path.relpath(path, template_root).encode("utf-8"))
+                with open(path, "rb") as template_file:
+                    digest.update(template_file.read())
+        fingerprint = app.extensions.setdefault(TEMPLATES_FINGERPRINT_KEY, digest.hexdigest()[:16])
+    return fingerprint
+
+def page_etag(*parts):
+    """A strong ETag for a page built from parts (database versions), specific to the current viewer and templates."""
+    identity = current_identity()
+    viewer = (identity.id, identity.role.value) if identity else None
+    payload = repr((_templates_fingerprint(), viewer) + parts)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+def _cache_control(public):
+    if not public:
+        return "private, no-cache"
+    shared_max_age = current_app.config.get("HTTP_CACHE_SHARED_MAX_AGE", 0)
+    if shared_max_age > 0:
+        # Browsers revalidate every time; a proxy may answer from its copy for shared_max_age seconds
+        return f"public, max-age=0, s-maxage={shared_max_age}"
+    return "public, no-cache"
+
+def _client_has(etag):
+    # Only the strong ETag decides: If-Modified-Since has one-second resolution (a change in the same
+    # second would look unchanged) and cannot tell viewers or template versions apart
+    return bool(request.if_none_match) and request.if_none_match.contains(etag)
+
+def conditional_page(etag, last_modified, render):
+    """
+    Answers a GET with 304 Not Modified when the client already holds the version identified by etag
+    (see page_etag); otherwise returns render()'s response. Either way the ETag, Cache-Control and,
+    for information, Last-Modified (last_modified, a naive UTC datetime) are set.
+    Pass etag=None for pages that must always be rendered afresh.
+    """
+    if etag is None or session.get("_flashes"):
+        # Pending flash messages are shown (and consumed) by this render, so it is never reused
+        response = make_response(render())
+        response.headers["Cache-Control"] = "private, no-cache"
+        return response
+
+    anonymous = current_identity() is None
+    if _client_has(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = make_response(render())
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified.replace(tzinfo=timezone.utc)
+    response.headers["Cache-Control"] = _cache_control(public=anonymous)
+    return response
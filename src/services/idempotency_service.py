@@ -0,0 +1,167 @@
+import hashlib
+import json
+import uuid
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import request, session, flash, current_app, make_response, redirect
+from sqlalchemy import delete, insert, update, event
+from sqlalchemy.exc import IntegrityError
+
+from src.models.models import db, IdempotencyKey
+from src.services.job_service import register_periodic_task
+
+# Retried POSTs (double clicks, flaky mobile connections, client retries) must not create a second
+# order or re-run a confirmation. A view decorated with @idempotent that receives an
+# Idempotency-Key header (or idempotency_key form field) records its outcome - status, redirect
+# target and flashed messages - under (user, key). A repeat of the same key gets that outcome
+# replayed without running the view again; a repeat that arrives while the first request is still
+# running gets 409. Keys expire after IDEMPOTENCY_KEY_TTL_SECONDS and are purged by the job workers.
+#
+# The claim is marked committed in the same transaction as the view's own work (a before_commit
+# hook), and that commit fails if the claim is no longer this request's. An unfinished claim is never
+# taken over before it expires: a request whose process died, or that is still running, keeps
+# answering retries with 409 rather than risk running the view (and creating an order) twice.
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_FORM_FIELD = "idempotency_key"
+MAX_KEY_LENGTH = 64
+
+def new_idempotency_key():
+    """A fresh key for a form to submit (exposed to templates)."""
+    return uuid.uuid4().hex
+
+def _request_key():
+    key = request.headers.get(IDEMPOTENCY_HEADER) or request.form.get(IDEMPOTENCY_FORM_FIELD)
+    return key.strip() if key else None
+
+def _request_hash():
+    form = sorted((name, value) for name, value in request.form.items(multi=True) if name != IDEMPOTENCY_FORM_FIELD)
+    payload = json.dumps([request.method, request.path, form])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _replay(record):
+    for category, message in json.loads(record.flashes or "[]"):
+        flash(message, category)
+    if record.location:
+        response = redirect(record.location, code=record.status_code)
+    else:
+        response = make_response(record.response_body or "", record.status_code)
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+def _conflict(message, status_code):
+    response = make_response(message, status_code)
+    if status_code == 409:
+        response.headers["Retry-After"] = "1"
+    return response
+
+class IdempotencyClaimLost(Exception):
+    """The request's claim on its key expired and was purged or taken over while the view ran."""
+
+def _claim(user_id, key, request_hash):
+    """
+    Inserts the in-progress row. Returns (None, created_at) when this request claimed the key,
+    else (existing record, None).
+    """
+    while True:
+        now = datetime.utcnow()
+        ttl = timedelta(seconds=current_app.config.get("IDEMPOTENCY_KEY_TTL_SECONDS", 86400))
+        try:
+            # Core insert: the identity map may still hold an earlier instance of this key
+            db.session.execute(insert(IdempotencyKey).values(user_id=user_id, key=key, request_hash=request_hash,
+                                                             created_at=now, expires_at=now + ttl))
+            db.session.commit()
+            return None, now
+        except IntegrityError:
+            db.session.rollback()
+        record = db.session.get(IdempotencyKey, (user_id, key), populate_existing=True)
+        if record is None:
+            continue # Purged in the meantime
+        if record.expires_at > now:
+            return record, None
+        # Take over an expired key; of several retries racing for it, only one delete matches
+        # and the others see its new claim
+        db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key,
+                                                        IdempotencyKey.created_at == record.created_at))
+        db.session.commit()
+
+def _this_claim(user_id, key, created_at):
+    return (IdempotencyKey.user_id == user_id, IdempotencyKey.key == key, IdempotencyKey.created_at == created_at)
+
+def _mark_committed_on_commit(db_session, user_id, key, created_at):
+    def mark_committed(committing_session):
+        marked = committing_session.execute(
+            update(IdempotencyKey).where(*_this_claim(user_id, key, created_at)).values(committed_at=datetime.utcnow())
+        ).rowcount
+        if marked != 1:
+            raise IdempotencyClaimLost(f"Idempotency key {key!r} is no longer claimed by this request.")
+    event.listen(db_session, "before_commit", mark_committed)
+    return mark_committed
+
+def idempotent(f):
+    """
+    Makes a POST view safe to retry with an idempotency key. Apply below the login/role decorator,
+    since keys are scoped to session["user_id"]. Requests without a key run normally.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        key = _request_key()
+        user_id = session.get("user_id")
+        if not key or user_id is None:
+            return f(*args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return _conflict(f"Idempotency key must be at most {MAX_KEY_LENGTH} characters.", 400)
+
+        request_hash = _request_hash()
+        record, created_at = _claim(user_id, key, request_hash)
+        if record is not None:
+            if record.status_code is None:
+                return _conflict("A request with this idempotency key is still being processed.", 409)
+            if record.request_hash != request_hash:
+                return _conflict("Idempotency key was already used for a different request.", 422)
+            return _replay(record)
+
+        flashes_before = len(session.get("_flashes", []))
+        db_session = db.session()
+        mark_committed = _mark_committed_on_commit(db_session, user_id, key, created_at)
+        try:
+            try:
+                response = make_response(f(*args, **kwargs))
+            finally:
+                event.remove(db_session, "before_commit", mark_committed)
+        except Exception:
+            db.session.rollback()
+            _release(user_id, key, created_at)
+            raise
+        db.session.rollback() # Anything the view left uncommitted is not part of its outcome
+        if response.status_code >= 500 and _release(user_id, key, created_at):
+            return response # Nothing was committed: let the client retry the failure for real
+        location = response.headers.get("Location")
+        db.session.execute(
+            update(IdempotencyKey).where(*_this_claim(user_id, key, created_at)).values(
+                status_code=response.status_code,
+                location=location,
+                flashes=json.dumps(session.get("_flashes", [])[flashes_before:]),
+                response_body=None if location else response.get_data(as_text=True),
+            )
+        )
+        db.session.commit()
+        return response
+    return decorated_function
+
+def _release(user_id, key, created_at):
+    # Only a claim whose view committed nothing may be retried; returns whether it was released
+    released = db.session.execute(delete(IdempotencyKey).where(*_this_claim(user_id, key, created_at),
+                                                               IdempotencyKey.committed_at.is_(None))).rowcount
+    db.session.commit()
+    return released == 1
+
+def purge_expired_idempotency_keys(now=None):
+    """Deletes expired keys. Returns the number deleted."""
+    deleted = db.session.execute(
+        delete(IdempotencyKey).where(IdempotencyKey.expires_at <= (now or datetime.utcnow()))
+    ).rowcount
+    db.session.commit()
+    return deleted
+
+register_periodic_task("purge_expired_idempotency_keys", purge_expired_idempotency_keys, "IDEMPOTENCY_SWEEP_INTERVAL_SECONDS")
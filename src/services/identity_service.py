@@ -0,0 +1,89 @@
+import threading
+import time
+from flask import g, session, current_app
+
+from src.models.models import db, User
+
+# The logged-in user is looked up at most once per request and kept on flask.g, shared by the
+# role decorators, the inject_user context processor and routes. With USER_CACHE_TTL_SECONDS > 0
+# a small snapshot (id, username, role, is_active) is also cached per process, so most
+# authenticated pages need no user query at all; a deactivation then takes effect in other
+# processes within the TTL (immediately in the process that made it, via invalidate_identity).
+
+_identity_cache = {} # user_id -> (expires_at, UserIdentity)
+_identity_cache_lock = threading.Lock()
+_IDENTITY_CACHE_MAX_ENTRIES = 10000
+
+class UserIdentity:
+    """What decorators and templates need to know about the current user, detached from the session."""
+    is_authenticated = True
+
+    def __init__(self, id, username, role, is_active):
+        self.id = id
+        self.username = username
+        self.role = role
+        self.is_active = is_active
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.username, user.role, user.is_active)
+
+class AnonymousIdentity:
+    is_authenticated = False
+    id = None
+    role = None
+    username = "Guest"
+    is_active = False
+
+def _cache_ttl():
+    return current_app.config.get("USER_CACHE_TTL_SECONDS", 0)
+
+def _cached_identity(user_id):
+    with _identity_cache_lock:
+        entry = _identity_cache.get(user_id)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    return None
+
+def _store_identity(identity):
+    ttl = _cache_ttl()
+    if ttl > 0:
+        with _identity_cache_lock:
+            if len(_identity_cache) >= _IDENTITY_CACHE_MAX_ENTRIES:
+                _identity_cache.clear()
+            _identity_cache[identity.id] = (time.monotonic() + ttl, identity)
+
+def invalidate_identity(user_id):
+    """Drops a user's cached identity, e.g. after their role or active flag changed."""
+    with _identity_cache_lock:
+        _identity_cache.pop(user_id, None)
+
+def reset_request_identity():
+    """Registered as a before_request hook: g outlives a request when an app context is reused (CLI, tests)."""
+    g.pop("current_user", None)
+    g.pop("current_identity", None)
+
+def load_current_user():
+    """The logged-in User (or None), loaded once per request."""
+    if "current_user" not in g:
+        user_id = session.get("user_id")
+        g.current_user = db.session.get(User, user_id) if user_id else None
+        if g.current_user is not None:
+            g.current_identity = UserIdentity.from_user(g.current_user)
+            _store_identity(g.current_identity)
+    return g.current_user
+
+def current_identity():
+    """
+    The logged-in user's UserIdentity, or None when nobody is logged in or the account no longer exists.
+    Served from flask.g, then the TTL cache, and only then from the database.
+    """
+    if "current_identity" not in g:
+        user_id = session.get("user_id")
+        identity = _cached_identity(user_id) if user_id else None
+        if identity is not None:
+            g.current_identity = identity
+        else:
+            user = load_current_user()
+            g.current_identity = UserIdentity.from_user(user) if user else None
+    return g.current_identity
@@ -0,0 +1,213 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import update, select, case, literal
+
+from src.models.models import db, CarbonCredit, CreditStatus, Order, OrderStatus
+from src.services.counter_service import adjust_counters, credit_counter, MARKETPLACE_GENERATION
+from src.services.facet_service import adjust_facets, credit_facet_deltas
+from src.services.job_service import register_periodic_task
+
+# Stock changes are single conditional UPDATE statements, so the database (not a Python check
+# after a read) decides whether enough quantity is left. Two sellers confirming orders against the
+# same credit at once can no longer oversell it, and a double-submitted confirmation can only
+# claim the order once. The SOLD transition happens in the same statement as the decrement.
+#
+# Placing an order holds its quantity: carbon_credits.reserved_quantity is raised by one
+# conditional UPDATE on the credit's primary key (the hot path), and the order row itself is the
+# ledger entry (orders.reserved_quantity + reservation_expires_at). Confirming converts the hold
+# into a sale; cancelling, rejecting or the expiry sweeper gives it back.
+
+RESERVATION_SWEEP_BATCH_SIZE = 500
+
+class StockError(Exception):
+    """Base class for order confirmations that could not take stock."""
+
+class OrderAlreadyProcessed(StockError):
+    """The order is no longer pending seller action (e.g. confirmed by a concurrent request)."""
+
+class CreditUnavailable(StockError):
+    """The credit is missing or no longer approved for sale."""
+
+class InsufficientStock(StockError):
+    """The credit does not have enough quantity left for the order."""
+
+def reserve_stock(credit_id, quantity):
+    """
+    Holds quantity of an approved credit for a new order in the current transaction.
+    Returns True, or False (changing nothing) if less than quantity is unreserved.
+    """
+    reserved = db.session.execute(
+        update(CarbonCredit)
+        .where(CarbonCredit.id == credit_id,
+               CarbonCredit.status == CreditStatus.APPROVED,
+               CarbonCredit.quantity - CarbonCredit.reserved_quantity >= quantity)
+        .values(reserved_quantity=CarbonCredit.reserved_quantity + quantity)
+        .execution_options(synchronize_session=False)
+    ).rowcount == 1
+    _expire_loaded(CarbonCredit, credit_id, ["reserved_quantity"])
+    return reserved
+
+def reservation_expiry(now=None):
+    """Expiry time for a reservation made now (ORDER_RESERVATION_TTL_SECONDS)."""
+    return (now or datetime.utcnow()) + timedelta(seconds=current_app.config.get("ORDER_RESERVATION_TTL_SECONDS", 86400))
+
+def release_reservation(order):
+    """
+    Gives back the quantity held for order (on cancel/reject) in the current transaction.
+    Returns the released quantity; 0 if the hold was already released or expired.
+    """
+    held = db.session.execute(
+        select(Order.reserved_quantity).where(Order.id == order.id, Order.reservation_expires_at.is_not(None))
+    ).scalar()
+    if not held:
+        return 0
+    released = db.session.execute(
+        update(Order)
+        .where(Order.id == order.id, Order.reservation_expires_at.is_not(None))
+        .values(reserved_quantity=0, reservation_expires_at=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if released != 1:
+        return 0 # The sweeper got there first
+    _adjust_reserved({order.credit_id: held})
+    db.session.expire(order, ["reserved_quantity", "reservation_expires_at"])
+    return held
+
+def release_expired_reservations(now=None, batch_size=RESERVATION_SWEEP_BATCH_SIZE):
+    """
+    Releases every reservation whose TTL has passed, batch by batch (one commit per batch).
+    The orders stay pending; a seller can still confirm them if the stock is there. Returns the number released.
+    """
+    now = now or datetime.utcnow()
+    released = 0
+    while True:
+        expired = db.session.execute(
+            select(Order.id, Order.credit_id, Order.reserved_quantity)
+            .where(Order.reservation_expires_at <= now)
+            .order_by(Order.reservation_expires_at)
+            .limit(batch_size)
+        ).all()
+        if not expired:
+            db.session.commit() # End the read transaction
+            break
+        # Conditional: a concurrent confirm/cancel may have released some of them already
+        released_ids = set(db.session.execute(
+            update(Order)
+            .where(Order.id.in_([order_id for order_id, _, _ in expired]), Order.reservation_expires_at <= now)
+            .values(reserved_quantity=0, reservation_expires_at=None)
+            .returning(Order.id)
+            .execution_options(synchronize_session=False)
+        ).scalars())
+        per_credit = defaultdict(float)
+        for order_id, credit_id, held in expired:
+            if order_id in released_ids:
+                per_credit[credit_id] += held
+        released += len(released_ids)
+        _adjust_reserved(per_credit)
+        db.session.commit()
+    if released:
+        current_app.logger.info(f"Released {released} expired order reservation(s).")
+    return released
+
+def decrement_stock(credit_id, quantity, held=0):
+    """
+    Atomically takes quantity from an approved credit in the current transaction, marking it SOLD
+    when nothing is left. held is the part of quantity already reserved for this sale; the rest must
+    be unreserved. Returns the remaining quantity, or None if the credit is not approved or the
+    stock is not there (in which case nothing was changed).
+    """
+    remaining = CarbonCredit.quantity - quantity
+    row = db.session.execute(
+        update(CarbonCredit)
+        .where(CarbonCredit.id == credit_id,
+               CarbonCredit.status == CreditStatus.APPROVED,
+               CarbonCredit.quantity - CarbonCredit.reserved_quantity + held >= quantity)
+        .values(quantity=remaining,
+                reserved_quantity=CarbonCredit.reserved_quantity - held,
+                status=case((remaining <= 0, literal(CreditStatus.SOLD, CarbonCredit.status.type)), else_=CarbonCredit.status))
+        .returning(CarbonCredit.quantity, CarbonCredit.status, CarbonCredit.source_project_type,
+                   CarbonCredit.source_project_location, CarbonCredit.price_per_unit)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if row is None:
+        return None
+    # Core statements bypass the counter and facet flush listeners; the listed quantity changed either way
+    deltas = {MARKETPLACE_GENERATION: 1}
+    if row.status == CreditStatus.SOLD:
+        deltas.update({credit_counter(CreditStatus.APPROVED): -1, credit_counter(CreditStatus.SOLD): 1})
+        adjust_facets(db.session.connection(), credit_facet_deltas(
+            [(row.source_project_type, row.source_project_location, row.price_per_unit)], -1))
+    adjust_counters(db.session.connection(), deltas)
+    _expire_loaded(CarbonCredit, credit_id)
+    return row.quantity
+
+def confirm_order_stock(order):
+    """
+    Moves a pending order to CONFIRMED_BY_SELLER and takes its quantity from the credit (using its
+    reservation, if still held), all in the current transaction. Raises a StockError subclass (after
+    rolling back) if either step loses a race or the stock is not there; the caller commits on success.
+    """
+    claimed = db.session.execute(
+        update(Order)
+        .where(Order.id == order.id, Order.status == OrderStatus.PENDING_SELLER_ACTION)
+        .values(status=OrderStatus.CONFIRMED_BY_SELLER, seller_action_date=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if claimed != 1:
+        db.session.rollback()
+        raise OrderAlreadyProcessed(f"Order {order.id} is not pending seller action.")
+    # The claim holds the write lock on the order, so the hold read here cannot be swept concurrently
+    held = db.session.execute(
+        select(Order.reserved_quantity).where(Order.id == order.id, Order.reservation_expires_at.is_not(None))
+    ).scalar() or 0
+    if held:
+        db.session.execute(
+            update(Order).where(Order.id == order.id)
+            .values(reserved_quantity=0, reservation_expires_at=None)
+            .execution_options(synchronize_session=False)
+        )
+    credit_id, quantity = order.credit_id, order.quantity_ordered
+    db.session.expire(order, ["status", "seller_action_date", "reserved_quantity", "reservation_expires_at"])
+    if decrement_stock(credit_id, quantity, held=held) is None:
+        db.session.rollback()
+        credit = db.session.get(CarbonCredit, credit_id)
+        if credit is None or credit.status != CreditStatus.APPROVED:
+            raise CreditUnavailable(f"Credit {credit_id} is not available for sale.")
+        raise InsufficientStock(f"Credit {credit_id} has {credit.available_quantity} unreserved, order {order.id} needs {quantity}.")
+
+def close_pending_order(order, status, **values):
+    """
+    Moves a pending order to status (a rejection or cancellation, with extra column values) and gives
+    back its hold, in the current transaction. Raises OrderAlreadyProcessed (after rolling back) if a
+    concurrent request confirmed or closed it first; the caller commits on success.
+    """
+    closed = db.session.execute(
+        update(Order)
+        .where(Order.id == order.id, Order.status == OrderStatus.PENDING_SELLER_ACTION)
+        .values(status=status, **values)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if closed != 1:
+        db.session.rollback()
+        raise OrderAlreadyProcessed(f"Order {order.id} is not pending seller action.")
+    db.session.expire(order, ["status", *values])
+    release_reservation(order)
+
+def _adjust_reserved(per_credit):
+    for credit_id, quantity in per_credit.items():
+        db.session.execute(
+            update(CarbonCredit).where(CarbonCredit.id == credit_id)
+            # Floating-point sums of holds must never leave a tiny negative reservation behind
+            .values(reserved_quantity=case((CarbonCredit.reserved_quantity - quantity < 0, 0),
+                                           else_=CarbonCredit.reserved_quantity - quantity))
+            .execution_options(synchronize_session=False)
+        )
+        _expire_loaded(CarbonCredit, credit_id)
+
+def _expire_loaded(model, ident, attribute_names=None):
+    obj = db.session.identity_map.get(db.session.identity_key(model, ident))
+    if obj is not None:
+        db.session.expire(obj, attribute_names)
+
+register_periodic_task("release_expired_reservations", release_expired_reservations, "RESERVATION_SWEEP_INTERVAL_SECONDS")
@@ -0,0 +1,237 @@
+import threading
+import traceback
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import update, select
+
+from src.models.models import db, BackgroundJob, JobStatus
+
+# job_type -> (handler(related_entity_id), on_failure(related_entity_id, error) or None)
+_job_handlers = {}
+
+# name -> (task(), config key holding its interval in seconds); run by JobWorker between jobs
+_periodic_tasks = {}
+
+_worker_lock = threading.Lock()
+
+def register_job_handler(job_type, handler, on_failure=None):
+    """
+    Registers the function that executes jobs of job_type.
+    handler receives the job's related_entity_id and must raise on failure.
+    on_failure is called once a job has exhausted its attempts.
+    """
+    _job_handlers[job_type] = (handler, on_failure)
+
+def register_periodic_task(name, task, interval_config_key):
+    """
+    Registers housekeeping (e.g. releasing expired reservations) that job workers run every
+    app.config[interval_config_key] seconds. task() runs inside an app context and must be idempotent:
+    every worker process runs it on its own schedule.
+    """
+    _periodic_tasks[name] = (task, interval_config_key)
+
+def run_periodic_tasks(last_runs, now=None):
+    """Runs the periodic tasks that are due, recording their run times in last_runs. Returns the names run."""
+    now = now if now is not None else datetime.utcnow()
+    ran = []
+    for name, (task, interval_config_key) in _periodic_tasks.items():
+        interval = current_app.config.get(interval_config_key)
+        if not interval or interval <= 0:
+            continue
+        last_run = last_runs.get(name)
+        if last_run is not None and now < last_run + timedelta(seconds=interval):
+            continue
+        last_runs[name] = now
+        try:
+            task()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Periodic task {name} failed: {e}")
+        ran.append(name)
+    return ran
+
+def enqueue_job(job_type, related_entity_id=None, max_attempts=None):
+    """
+    Adds a job to the current session. It becomes visible to workers when the caller commits,
+    so the job is durable exactly when the change that requested it is.
+    Call dispatch_jobs() after the commit to wake the workers.
+    """
+    if max_attempts is None:
+        max_attempts = current_app.config.get("JOB_MAX_ATTEMPTS", 3)
+    job = BackgroundJob(job_type=job_type, related_entity_id=related_entity_id,
+                        status=JobStatus.QUEUED, max_attempts=max_attempts,
+                        run_after=datetime.utcnow())
+    db.session.add(job)
+    return job
+
+def claim_next_job():
+    """
+    Atomically moves the oldest runnable QUEUED job to RUNNING and returns it, or None.
+    The conditional UPDATE makes the claim safe with several workers (threads or processes).
+    """
+    now = datetime.utcnow()
+    while True:
+        job_id = db.session.execute(
+            select(BackgroundJob.id)
+            .where(BackgroundJob.status == JobStatus.QUEUED, BackgroundJob.run_after <= now)
+            .order_by(BackgroundJob.run_after.asc(), BackgroundJob.id.asc())
+            .limit(1)
+        ).scalar()
+        if job_id is None:
+            db.session.commit() # End the read transaction
+            return None
+        claimed = db.session.execute(
+            update(BackgroundJob)
+            .where(BackgroundJob.id == job_id, BackgroundJob.status == JobStatus.QUEUED)
+            .values(status=JobStatus.RUNNING, attempts=BackgroundJob.attempts + 1, started_at=now)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return db.session.get(BackgroundJob, job_id, populate_existing=True)
+        # Another worker claimed it first; try the next one
+
+def requeue_stale_jobs(stale_after_seconds=None):
+    """Returns RUNNING jobs whose worker died (no progress for stale_after_seconds) to the queue."""
+    if stale_after_seconds is None:
+        stale_after_seconds = current_app.config.get("JOB_STALE_AFTER_SECONDS", 600)
+    cutoff = datetime.utcnow() - timedelta(seconds=stale_after_seconds)
+    requeued = db.session.execute(
+        update(BackgroundJob)
+        .where(BackgroundJob.status == JobStatus.RUNNING, BackgroundJob.started_at < cutoff)
+        .values(status=JobStatus.QUEUED, run_after=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    if requeued:
+        current_app.logger.warning(f"Requeued {requeued} stale background job(s).")
+    return requeued
+
+def run_job(job):
+    """Executes a claimed job and records success, a scheduled retry, or final failure."""
+    handler, on_failure = _job_handlers.get(job.job_type, (None, None))
+    job_id = job.id
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for job type '{job.job_type}'.")
+        handler(job.related_entity_id)
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(BackgroundJob, job_id)
+        job.last_error = f"{e}\n{traceback.format_exc(limit=5)}"
+        if job.attempts < job.max_attempts:
+            # Exponential backoff: base, 2*base, 4*base ...
+            backoff = current_app.config.get("JOB_RETRY_BACKOFF_SECONDS", 5) * (2 ** (job.attempts - 1))
+            job.status = JobStatus.QUEUED
+            job.run_after = datetime.utcnow() + timedelta(seconds=backoff)
+            current_app.logger.warning(f"Job {job_id} ({job.job_type}) failed on attempt {job.attempts}, retrying in {backoff}s: {e}")
+            db.session.commit()
+        else:
+            job.status = JobStatus.FAILED
+            job.finished_at = datetime.utcnow()
+            current_app.logger.error(f"Job {job_id} ({job.job_type}) failed permanently after {job.attempts} attempt(s): {e}")
+            db.session.commit()
+            if on_failure is not None:
+                try:
+                    on_failure(job.related_entity_id, e)
+                except Exception as failure_error:
+                    db.session.rollback()
+                    current_app.logger.error(f"Failure handler for job {job_id} raised: {failure_error}")
+        return False
+
+    job = db.session.get(BackgroundJob, job_id)
+    job.status = JobStatus.SUCCEEDED
+    job.finished_at = datetime.utcnow()
+    job.last_error = None
+    db.session.commit()
+    return True
+
+def run_pending_jobs(limit=None):
+    """Runs runnable jobs in the calling thread until the queue is empty (or limit is reached). Returns the number run."""
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
+
+class JobWorker:
+    """
+    Pool of threads that poll the job table and run jobs, each inside its own app context.
+    max_concurrency bounds how many jobs (e.g. WeasyPrint renders + openssl signatures) run at once.
+    """
+
+    def __init__(self, app, max_concurrency=2, poll_interval=2.0):
+        self.app = app
+        self.max_concurrency = max_concurrency
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._periodic_lock = threading.Lock()
+        self._periodic_last_runs = {}
+
+    def start(self):
+        with self.app.app_context():
+            requeue_stale_jobs()
+        for i in range(self.max_concurrency):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def notify(self):
+        self._wake.set()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            ran_job = False
+            with self.app.app_context():
+                try:
+                    # One thread at a time; the others keep running jobs
+                    if self._periodic_lock.acquire(blocking=False):
+                        try:
+                            run_periodic_tasks(self._periodic_last_runs)
+                        finally:
+                            self._periodic_lock.release()
+                    job = claim_next_job()
+                    if job is not None:
+                        run_job(job)
+                        ran_job = True
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.error(f"Background job worker error: {e}")
+                finally:
+                    db.session.remove()
+            if not ran_job:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+def start_job_worker(app):
+    """Starts the in-process worker pool once per app (JOB_WORKER_MODE == 'thread')."""
+    with _worker_lock:
+        worker = app.extensions.get("job_worker")
+        if worker is None:
+            worker = JobWorker(app,
+                               max_concurrency=app.config.get("JOB_WORKER_CONCURRENCY", 2),
+                               poll_interval=app.config.get("JOB_POLL_INTERVAL_SECONDS", 2.0))
+            worker.start()
+            app.extensions["job_worker"] = worker
+    return worker
+
+def dispatch_jobs():
+    """
+    Called after committing new jobs. Depending on JOB_WORKER_MODE:
+    'eager' runs them now in the calling thread, 'thread' wakes the in-process pool,
+    'external' does nothing (a separate `flask run-jobs` process polls the table).
+    """
+    mode = current_app.config.get("JOB_WORKER_MODE", "thread")
+    if mode == "eager":
+        run_pending_jobs()
+    elif mode == "thread":
+        start_job_worker(current_app._get_current_object()).notify()
@@ -0,0 +1,132 @@
+import threading
+from collections import OrderedDict
+from flask import current_app
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy.orm import joinedload
+
+from src.models.models import CarbonCredit
+from src.services.counter_service import get_marketplace_generation
+from src.services.pagination_service import KeysetPage
+
+# The busiest marketplace pages (default sort, the first few pages, common project type filters)
+# are requested over and over with identical results. Each process keeps an LRU of result pages
+# keyed by the normalized filter/sort/page tuple. An entry holds the page's credit IDs and
+# pagination state, not the credits: a hit loads the rows by primary key in one query instead of
+# filtering, sorting and counting again, so sellers' names and quantities shown are always current.
+#
+# Entries belong to the marketplace generation they were computed in (see counter_service), which
+# every change to the set or order of listed credits bumps in the same transaction. Reading a new
+# generation empties the cache, so a result is never served after a change it does not reflect.
+
+CACHE_EXTENSION_KEY = "marketplace_cache"
+
+class CachedPagination(Pagination):
+    """Flask-SQLAlchemy Pagination over a page whose items and total were looked up already."""
+
+    def _query_items(self):
+        return self._query_args["items"]
+
+    def _query_count(self):
+        return self._query_args["total"]
+
+class MarketplaceCache:
+    """Thread-safe LRU of marketplace result pages for one generation, with hit/miss statistics."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # key -> page state, least recently used first
+        self._generation = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, generation, key):
+        with self._lock:
+            if generation != self._generation:
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._generation = generation
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, generation, key, entry):
+        with self._lock:
+            if generation != self._generation:
+                return # Another request already saw a newer generation
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+def marketplace_cache(app=None):
+    """The app's cache in this process, or None when MARKETPLACE_CACHE_SIZE is 0."""
+    app = app or current_app._get_current_object()
+    max_entries = app.config.get("MARKETPLACE_CACHE_SIZE", 0)
+    if max_entries <= 0:
+        return None
+    cache = app.extensions.get(CACHE_EXTENSION_KEY)
+    if cache is None:
+        cache = app.extensions.setdefault(CACHE_EXTENSION_KEY, MarketplaceCache(max_entries))
+    return cache
+
+def marketplace_cache_stats():
+    """Hit/miss statistics of this process's marketplace cache, or None when caching is disabled."""
+    cache = marketplace_cache()
+    return cache.stats() if cache else None
+
+def _page_state(pagination):
+    ids = [credit.id for credit in pagination.items]
+    if getattr(pagination, "is_keyset", False):
+        return ("keyset", ids, pagination.per_page, pagination.next_cursor, pagination.prev_cursor)
+    return ("offset", ids, pagination.per_page, pagination.page, pagination.total)
+
+def _load_page(state):
+    kind, ids, per_page, *rest = state
+    credits = {credit.id: credit for credit in
+               CarbonCredit.query.options(joinedload(CarbonCredit.seller)).filter(CarbonCredit.id.in_(ids))} if ids else {}
+    items = [credits[credit_id] for credit_id in ids if credit_id in credits]
+    if kind == "keyset":
+        next_cursor, prev_cursor = rest
+        return KeysetPage(items, per_page, next_cursor=next_cursor, prev_cursor=prev_cursor)
+    page, total = rest
+    return CachedPagination(page=page, per_page=per_page, error_out=False, items=items, total=total)
+
+def cached_marketplace_page(key, compute_page, generation=None):
+    """
+    Returns (pagination, hit) for the marketplace page identified by key (a hashable, normalized
+    filter/sort/page tuple), calling compute_page() to run the real query on a miss.
+    Pass the marketplace generation if the caller has already read it.
+    """
+    cache = marketplace_cache()
+    if cache and generation is None:
+        generation = get_marketplace_generation()
+    if cache is None or generation is None:
+        return compute_page(), False
+    state = cache.get(generation, key)
+    if state is not None:
+        return _load_page(state), True
+    pagination = compute_page()
+    cache.put(generation, key, _page_state(pagination))
+    return pagination, False
@@ -0,0 +1,50 @@
+from datetime import datetime
+from sqlalchemy import update
+
+from src.models.models import db, CarbonCredit, CreditStatus
+from src.services.counter_service import adjust_counters, credit_counter, MARKETPLACE_GENERATION
+from src.services.facet_service import adjust_facets, credit_facet_deltas
+
+# Admin moderation of the credit approval queue. A batch of decisions is one UPDATE restricted to
+# credits that are still pending, so credits handled meanwhile (by another admin, or twice in the
+# same submission) are skipped rather than overwritten, and the row count is exactly the number of
+# credits whose state changed.
+
+MAX_BULK_MODERATION = 500 # Credit IDs per request; keeps the IN (...) list within driver limits
+
+MODERATION_ACTIONS = {
+    "approve": CreditStatus.APPROVED,
+    "reject": CreditStatus.REJECTED,
+}
+
+def moderate_credits(credit_ids, new_status, admin_id, remarks):
+    """
+    Moves the pending credits among credit_ids to new_status (APPROVED or REJECTED) with remarks, in
+    the current transaction; the caller commits. Returns the number of credits that changed state.
+    """
+    if new_status not in MODERATION_ACTIONS.values():
+        raise ValueError(f"Credits cannot be moderated to {new_status}.")
+    credit_ids = sorted(set(credit_ids))
+    if not credit_ids:
+        return 0
+    moderated = db.session.execute(
+        update(CarbonCredit)
+        .where(CarbonCredit.id.in_(credit_ids), CarbonCredit.status == CreditStatus.PENDING_APPROVAL)
+        .values(status=new_status, admin_id_reviewer=admin_id, admin_remarks=remarks,
+                approved_or_rejected_at=datetime.utcnow())
+        .returning(CarbonCredit.source_project_type, CarbonCredit.source_project_location, CarbonCredit.price_per_unit)
+        .execution_options(synchronize_session=False)
+    ).all()
+    changed = len(moderated)
+    if changed:
+        # Core statements bypass the counter and facet flush listeners
+        deltas = {credit_counter(CreditStatus.PENDING_APPROVAL): -changed, credit_counter(new_status): changed}
+        if new_status == CreditStatus.APPROVED:
+            deltas[MARKETPLACE_GENERATION] = 1
+            adjust_facets(db.session.connection(), credit_facet_deltas(moderated, 1))
+        adjust_counters(db.session.connection(), deltas)
+        for credit_id in credit_ids:
+            credit = db.session.identity_map.get(db.session.identity_key(CarbonCredit, credit_id))
+            if credit is not None:
+                db.session.expire(credit)
+    return changed
@@ -0,0 +1,158 @@
+import base64
+import binascii
+import json
+import math
+from datetime import datetime
+from flask import current_app, request
+from sqlalchemy import and_, or_
+
+class KeysetPage:
+    """
+    A page of results produced by keyset (cursor) pagination.
+    Exposes items/has_next/has_prev like Flask-SQLAlchemy's Pagination, plus opaque
+    next_cursor/prev_cursor tokens instead of page numbers. total is only computed on request.
+    """
+    is_keyset = True
+
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None, total=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+def keyset_mode_requested(cursor_arg="cursor", page_arg="page"):
+    """
+    Whether the current listing request should use keyset pagination.
+    Explicit ?page=N links (bookmarks, old templates) keep using OFFSET pagination.
+    Pages listing several tables pass per-table argument names (e.g. orders_cursor/orders_page).
+    """
+    if cursor_arg in request.args:
+        return True
+    return current_app.config.get("PAGINATION_MODE", "keyset") == "keyset" and page_arg not in request.args
+
+def cursor_url_args(args, cursor_arg="cursor", page_arg="page"):
+    """Copies request args for building next/prev links, dropping any existing page/cursor."""
+    return {key: value for key, value in args.items() if key not in (page_arg, cursor_arg)}
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    return value
+
+_MAX_CURSOR_INT = 2 ** 63 - 1 # Largest integer every supported database binds
+
+def _decode_int(value):
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError("Non-integral cursor value")
+        value = int(value)
+    if not isinstance(value, int) or abs(value) > _MAX_CURSOR_INT:
+        raise ValueError("Cursor integer out of range")
+    return value
+
+def _decode_value(value, value_type=None):
+    # Only values encode_cursor can produce are accepted, converted to the sort column's type
+    if isinstance(value, dict):
+        if set(value) != {"dt"} or value_type not in (None, datetime):
+            raise ValueError("Unexpected cursor object")
+        return datetime.fromisoformat(value["dt"])
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        raise TypeError("Unexpected cursor value type")
+    if value_type is float:
+        value = float(value)
+        if not math.isfinite(value):
+            raise ValueError("Non-finite cursor value")
+        return value
+    if value_type is int:
+        return _decode_int(value)
+    if value_type is str and not isinstance(value, str):
+        raise TypeError("Cursor value is not a string")
+    if value_type is datetime:
+        raise TypeError("Cursor value is not a datetime")
+    if isinstance(value, float) and not math.isfinite(value):
+        raise ValueError("Non-finite cursor value")
+    if isinstance(value, int):
+        return _decode_int(value)
+    return value
+
+def _python_type(column):
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return None
+
+def encode_cursor(sort_key, value, row_id, direction):
+    """Packs a position (sort value + id tiebreaker) into a URL-safe opaque token."""
+    payload = json.dumps({"s": sort_key, "v": _encode_value(value), "i": row_id, "d": direction}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor, sort_key, value_type=None):
+    """
+    Unpacks a cursor produced by encode_cursor, converting its sort value to value_type (the sort
+    column's Python type) when given. Returns None for missing, malformed or foreign cursors (e.g.
+    issued for a different sort order, or holding a value of the wrong type), in which case
+    pagination restarts from the first page.
+    """
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        if payload.get("s") != sort_key or payload.get("d") not in ("next", "prev"):
+            return None
+        return {"value": _decode_value(payload["v"], value_type), "id": _decode_int(payload["i"]), "direction": payload["d"]}
+    except (ValueError, TypeError, KeyError, AttributeError, OverflowError, binascii.Error, UnicodeDecodeError):
+        return None
+
+def keyset_paginate(query, sort_column, id_column, sort_key, descending=True, cursor=None, per_page=10, with_total=False):
+    """
+    Paginates query by seeking past the (sort_column, id_column) position stored in cursor
+    instead of using OFFSET, so every page costs the same regardless of depth.
+    The query must not already be ordered; the sort column should be non-nullable.
+    """
+    total = query.order_by(None).count() if with_total else None
+    position = decode_cursor(cursor, sort_key, _python_type(sort_column))
+    backwards = position is not None and position["direction"] == "prev"
+    # Walk in display order when paging forwards, and in reverse order when paging backwards
+    walk_descending = descending != backwards
+
+    if position is not None:
+        value, last_id = position["value"], position["id"]
+        if walk_descending:
+            query = query.filter(or_(sort_column < value, and_(sort_column == value, id_column < last_id)))
+        else:
+            query = query.filter(or_(sort_column > value, and_(sort_column == value, id_column > last_id)))
+
+    if walk_descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+
+    rows = query.limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    has_next = True if backwards else has_more
+    has_prev = has_more if backwards else position is not None
+
+    next_cursor = None
+    prev_cursor = None
+    if rows and has_next:
+        last = rows[-1]
+        next_cursor = encode_cursor(sort_key, getattr(last, sort_column.key), getattr(last, id_column.key), "next")
+    if rows and has_prev:
+        first = rows[0]
+        prev_cursor = encode_cursor(sort_key, getattr(first, sort_column.key), getattr(first, id_column.key), "prev")
+
+    return KeysetPage(rows, per_page, next_cursor=next_cursor, prev_cursor=prev_cursor, total=total)
@@ -0,0 +1,80 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+# Password hashing (PBKDF2/scrypt) is deliberately CPU-heavy. It runs on a bounded pool instead of
+# the request thread; hashlib releases the GIL while hashing, so threads hash in parallel. When
+# every worker is busy and PASSWORD_HASH_MAX_PENDING requests are already waiting, callers get
+# PasswordHasherBusy immediately (the routes answer 503) instead of queueing without bound.
+
+_hasher_lock = threading.Lock()
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing pool and its queue are full."""
+
+class PasswordHasher:
+    """Thread pool for password hashing with a cap on running + queued hashes."""
+
+    def __init__(self, max_workers=2, max_pending=8):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash")
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self.rejected = 0
+
+    def run(self, fn, *args, timeout=None):
+        """Runs fn(*args) on the pool and returns its result, or raises PasswordHasherBusy at once when saturated."""
+        if not self._slots.acquire(blocking=False):
+            self.rejected += 1
+            raise PasswordHasherBusy("Password hashing capacity exhausted.")
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result(timeout=timeout)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+def get_password_hasher(app=None):
+    """Returns the app's shared PasswordHasher, creating it on first use."""
+    app = app or current_app._get_current_object()
+    with _hasher_lock:
+        hasher = app.extensions.get("password_hasher")
+        if hasher is None:
+            hasher = PasswordHasher(max_workers=app.config.get("PASSWORD_HASH_WORKERS") or os.cpu_count() or 1,
+                                    max_pending=app.config.get("PASSWORD_HASH_MAX_PENDING", 8))
+            app.extensions["password_hasher"] = hasher
+    return hasher
+
+def _configured_method():
+    return current_app.config.get("PASSWORD_HASH_METHOD", "pbkdf2:sha256")
+
+def _normalize_method(method):
+    # "pbkdf2:sha256" means werkzeug's default iteration count; spell it out so changes are detectable
+    parts = method.split(":")
+    if parts[0] == "pbkdf2":
+        hash_name = parts[1] if len(parts) > 1 else "sha256"
+        iterations = parts[2] if len(parts) > 2 else str(DEFAULT_PBKDF2_ITERATIONS)
+        return f"pbkdf2:{hash_name}:{iterations}"
+    if parts[0] == "scrypt":
+        n, r, p = (parts[1:] + ["32768", "8", "1"][len(parts) - 1:])[:3] # werkzeug's scrypt defaults
+        return f"scrypt:{n}:{r}:{p}"
+    return method
+
+def hash_password(password):
+    """Hashes password with PASSWORD_HASH_METHOD on the hashing pool."""
+    return get_password_hasher().run(generate_password_hash, password, _normalize_method(_configured_method()))
+
+def verify_password(password_hash, password):
+    """Checks password against password_hash on the hashing pool."""
+    return get_password_hasher().run(check_password_hash, password_hash, password)
+
+def needs_rehash(password_hash):
+    """True when password_hash was made with a different method or work factor than PASSWORD_HASH_METHOD."""
+    stored_method = password_hash.split("$", 1)[0]
+    return _normalize_method(stored_method) != _normalize_method(_configured_method())
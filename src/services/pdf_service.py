@@ -1,11 +1,178 @@
 import os
+import threading
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from flask import render_template, current_app
+from jinja2 import Environment, FileSystemLoader, select_autoescape
 from weasyprint import HTML, CSS
+from weasyprint.text.fonts import FontConfiguration
 from datetime import datetime
 import uuid
 
 from src.models.models import Order, User, CarbonCredit
 
+CERTIFICATE_STYLESHEET = os.path.join("static", "css", "certificate_pdf.css")
+
+class CertificateRenderer:
+    """
+    Long-lived WeasyPrint renderer for certificates.
+    The shared stylesheet is parsed once with a FontConfiguration that is kept for the life of the
+    renderer, so @font-face fonts are loaded once instead of on every certificate. The stylesheet is
+    re-parsed only if the file changes on disk. Renders are serialised with a lock because WeasyPrint's
+    font configuration is not safe to share between concurrently rendering threads.
+    """
+
+    def __init__(self, base_url, stylesheet_path):
+        self.base_url = base_url
+        self.stylesheet_path = stylesheet_path
+        self._lock = threading.Lock()
+        self._font_config = None
+        self._stylesheet = None
+        self._stylesheet_mtime = None
+        self.render_count = 0
+        self.failure_count = 0
+        self.stylesheet_loads = 0
+        self.total_render_seconds = 0.0
+        self.last_render_seconds = None
+        self.max_render_seconds = 0.0
+
+    def _load_stylesheet(self):
+        mtime = os.path.getmtime(self.stylesheet_path)
+        if self._stylesheet is None or mtime != self._stylesheet_mtime:
+            self._font_config = FontConfiguration()
+            self._stylesheet = CSS(filename=self.stylesheet_path, font_config=self._font_config)
+            self._stylesheet_mtime = mtime
+            self.stylesheet_loads += 1
+        return self._stylesheet
+
+    def render(self, html_string, target):
+        """Writes the PDF for html_string to target (a path or file object). Raises on failure."""
+        with self._lock:
+            started = time.perf_counter()
+            try:
+                stylesheet = self._load_stylesheet()
+                html = HTML(string=html_string, base_url=self.base_url)
+                html.write_pdf(target, stylesheets=[stylesheet], font_config=self._font_config)
+            except Exception:
+                self.failure_count += 1
+                raise
+            elapsed = time.perf_counter() - started
+            self.render_count += 1
+            self.total_render_seconds += elapsed
+            self.last_render_seconds = elapsed
+            self.max_render_seconds = max(self.max_render_seconds, elapsed)
+            return elapsed
+
+    def metrics(self):
+        """Render counters and timings (milliseconds) for logging or monitoring."""
+        with self._lock:
+            average = self.total_render_seconds / self.render_count if self.render_count else None
+            return {
+                "renders": self.render_count,
+                "failures": self.failure_count,
+                "stylesheet_loads": self.stylesheet_loads,
+                "avg_render_ms": round(average * 1000, 2) if average is not None else None,
+                "last_render_ms": round(self.last_render_seconds * 1000, 2) if self.last_render_seconds is not None else None,
+                "max_render_ms": round(self.max_render_seconds * 1000, 2),
+            }
+
+def get_certificate_renderer(app=None):
+    """Returns the app's shared CertificateRenderer, creating it on first use."""
+    app = app or current_app._get_current_object()
+    renderer = app.extensions.get("certificate_renderer")
+    if renderer is None:
+        renderer = app.extensions.setdefault("certificate_renderer", CertificateRenderer(
+            base_url=app.root_path,
+            stylesheet_path=os.path.join(app.root_path, CERTIFICATE_STYLESHEET)))
+    return renderer
+
+# --- Process-pool rendering ---
+# WeasyPrint layout is CPU-bound and holds the GIL, so renders from the Flask process use one core.
+# With PDF_RENDER_BACKEND = "process" certificates are rendered by worker processes instead. Workers
+# receive plain data (certificate_data()), never ORM objects, and render both the template and the PDF.
+
+_render_pool_lock = threading.Lock()
+_worker_templates = None
+_worker_renderer = None
+
+def certificate_data(order, buyer, seller, credit, generation_time):
+    """Picklable snapshot of everything certificates/pdf_template.html needs."""
+    return {
+        "order": {
+            "id": order.id,
+            "quantity_ordered": order.quantity_ordered,
+            "price_per_unit_at_order": order.price_per_unit_at_order,
+            "total_price": order.total_price,
+            "order_date": order.order_date,
+            "seller_action_date": order.seller_action_date,
+            "completion_date": order.completion_date,
+        },
+        "buyer": {"company_name": buyer.company_name, "username": buyer.username, "email": buyer.email},
+        "seller": {"company_name": seller.company_name, "username": seller.username, "email": seller.email},
+        "credit": {
+            "title": credit.title,
+            "description": credit.description,
+            "unit": credit.unit,
+            "source_project_type": credit.source_project_type,
+            "source_project_location": credit.source_project_location,
+        },
+        "generation_time": generation_time,
+    }
+
+def _init_render_worker(root_path, template_folder):
+    """Runs once in each worker process: builds the template environment and the process's renderer."""
+    global _worker_templates, _worker_renderer
+    _worker_templates = Environment(loader=FileSystemLoader(template_folder), autoescape=select_autoescape(["html"]))
+    _worker_renderer = CertificateRenderer(base_url=root_path, stylesheet_path=os.path.join(root_path, CERTIFICATE_STYLESHEET))
+
+def _render_certificate_worker(data, pdf_filepath):
+    """Renders one certificate in a worker process. Returns the render time in seconds."""
+    try:
+        html_string = _worker_templates.get_template("certificates/pdf_template.html").render(**data)
+        return _worker_renderer.render(html_string, pdf_filepath)
+    except Exception as e:
+        if os.path.exists(pdf_filepath):
+            os.remove(pdf_filepath)
+        # Re-raise as a plain exception so it always pickles back to the parent
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+
+def create_render_pool(app, processes=None):
+    """New process pool for certificate rendering. Uses spawn so workers do not inherit the parent's threads or DB connections."""
+    processes = processes or app.config.get("PDF_RENDER_PROCESSES") or os.cpu_count() or 1
+    return ProcessPoolExecutor(max_workers=processes,
+                               mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_init_render_worker,
+                               initargs=(app.root_path, os.path.join(app.root_path, app.template_folder)))
+
+def get_render_pool(app=None):
+    """Returns the app's shared rendering pool, starting it on first use."""
+    app = app or current_app._get_current_object()
+    with _render_pool_lock:
+        pool = app.extensions.get("certificate_render_pool")
+        if pool is None:
+            pool = create_render_pool(app)
+            app.extensions["certificate_render_pool"] = pool
+    return pool
+
+def render_certificates(jobs, pool):
+    """
+    Renders (data, pdf_filepath) pairs on the given process pool.
+    Returns {pdf_filepath: render seconds or the exception that failed it}.
+    """
+    futures = {pool.submit(_render_certificate_worker, data, pdf_filepath): pdf_filepath for data, pdf_filepath in jobs}
+    results = {}
+    for future in as_completed(futures):
+        try:
+            results[futures[future]] = future.result()
+        except Exception as e:
+            results[futures[future]] = e
+    return results
+
+def certificate_pdf_filename(order_id):
+    # Using a UUID to ensure unique filenames
+    return f"CarbonConnect_Certificate_Order_{order_id}_{uuid.uuid4().hex[:8]}.pdf"
+
 def generate_certificate_pdf(order_id):
     """
     Generates a PDF certificate for a given order ID.
@@ -26,41 +193,31 @@ def generate_certificate_pdf(order_id):
         return None
 
     generation_time = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S")
-    
-    # Render HTML template with order data
-    # Ensure the template path is correct relative to the templates folder
-    html_string = render_template(
-        "certificates/pdf_template.html", 
-        order=order,
-        buyer=buyer,
-        seller=seller, # Pass the seller associated with the order
-        credit=credit,
-        generation_time=generation_time
-    )
 
     # Define filename and path
-    # Using a UUID to ensure unique filenames
-    pdf_filename = f"CarbonConnect_Certificate_Order_{order.id}_{uuid.uuid4().hex[:8]}.pdf"
+    pdf_filename = certificate_pdf_filename(order.id)
     certificates_folder = os.path.join(current_app.config["UPLOAD_FOLDER"], "certificates")
     pdf_filepath = os.path.join(certificates_folder, pdf_filename)
 
     try:
-        # WeasyPrint setup for fonts (if not globally configured via CSS @font-face with absolute file paths)
-        # The @font-face in pdf_template.html uses file:/// which should work if paths are correct.
-        # font_config = FontConfiguration()
-        # css = CSS(string=\
-        #     """@font-face {
-        #            font-family: \'Noto Sans CJK SC\"; 
-        #            src: url(\"/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc\") format(\"truetype\");
-        #        }
-        #        body { font-family: \'Noto Sans CJK SC\"; }""", 
-        #        font_config=font_config)
-        
-        # html = HTML(string=html_string, base_url=os.path.dirname(os.path.abspath(__file__)))
-        # Using base_url=current_app.root_path might be more robust if static assets are referenced from template
-        html = HTML(string=html_string, base_url=current_app.root_path)
-        html.write_pdf(pdf_filepath) #, stylesheets=[css]) # Pass stylesheets if CSS is defined separately
-        
+        if current_app.config.get("PDF_RENDER_BACKEND", "inline") == "process":
+            data = certificate_data(order, buyer, seller, credit, generation_time)
+            elapsed = get_render_pool().submit(_render_certificate_worker, data, pdf_filepath).result()
+            current_app.logger.info(f"Rendered certificate for Order ID {order.id} in a worker process in {elapsed * 1000:.1f} ms")
+        else:
+            # Render HTML template with order data
+            html_string = render_template(
+                "certificates/pdf_template.html",
+                order=order,
+                buyer=buyer,
+                seller=seller, # Pass the seller associated with the order
+                credit=credit,
+                generation_time=generation_time
+            )
+            renderer = get_certificate_renderer()
+            elapsed = renderer.render(html_string, pdf_filepath)
+            current_app.logger.info(f"Rendered certificate for Order ID {order.id} in {elapsed * 1000:.1f} ms "
+                                    f"(average {renderer.metrics()['avg_render_ms']} ms over {renderer.render_count} renders)")
         current_app.logger.info(f"Successfully generated PDF: {pdf_filepath} for Order ID {order.id}")
         return pdf_filename
     except Exception as e:
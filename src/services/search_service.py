@@ -0,0 +1,120 @@
+import re
+from flask import current_app
+from sqlalchemy import event, text, inspect, or_, literal_column
+
+from src.models.models import db, CarbonCredit
+
+# Name of the FTS5 shadow table that mirrors the searchable columns of carbon_credits.
+FTS_TABLE = "carbon_credits_fts"
+SEARCHABLE_COLUMNS = ("title", "description", "source_project_type", "source_project_location")
+
+_columns = ", ".join(SEARCHABLE_COLUMNS)
+_new_values = ", ".join(f"new.{c}" for c in SEARCHABLE_COLUMNS)
+_old_values = ", ".join(f"old.{c}" for c in SEARCHABLE_COLUMNS)
+
+# External-content FTS5 table: the index stores only the tokens, the text itself stays in carbon_credits.
+# The prefix option builds extra 2- and 3-character prefix indexes so that "sol*" style queries stay fast.
+CREATE_FTS_STATEMENTS = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+            {_columns},
+            content='carbon_credits', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON carbon_credits BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new_values});
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON carbon_credits BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.id, {_old_values});
+        END""",
+    # Only re-index when a searchable column changes; status and quantity updates do not touch the index.
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {_columns} ON carbon_credits BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_columns}) VALUES ('delete', old.id, {_old_values});
+            INSERT INTO {FTS_TABLE}(rowid, {_columns}) VALUES (new.id, {_new_values});
+        END""",
+]
+
+DROP_FTS_STATEMENTS = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+def _create_fts(target, connection, **kw):
+    if connection.dialect.name != "sqlite":
+        return
+    for statement in CREATE_FTS_STATEMENTS:
+        connection.exec_driver_sql(statement)
+
+def _drop_fts(target, connection, **kw):
+    if connection.dialect.name != "sqlite":
+        return
+    for statement in DROP_FTS_STATEMENTS:
+        connection.exec_driver_sql(statement)
+
+# Keep the shadow table's lifecycle tied to carbon_credits so db.create_all()/drop_all() manage it too.
+event.listen(CarbonCredit.__table__, "after_create", _create_fts)
+event.listen(CarbonCredit.__table__, "before_drop", _drop_fts)
+
+def search_index_available():
+    """Returns True if the FTS5 index exists on the current database."""
+    if db.engine.dialect.name != "sqlite":
+        return False
+    return inspect(db.engine).has_table(FTS_TABLE)
+
+def build_match_expression(keyword):
+    """
+    Turns free-text user input into an FTS5 MATCH expression.
+    Every word is quoted (so FTS5 operators in user input are treated as text)
+    and suffixed with * for prefix matching; all words must match.
+    Returns None if the keyword contains no searchable words.
+    """
+    tokens = re.findall(r"\w+", keyword or "", re.UNICODE)
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+def apply_keyword_search(query, keyword, rank_results=False):
+    """
+    Restricts a CarbonCredit query to credits matching the keyword.
+    Uses the FTS5 index when available (optionally ordering by bm25 relevance),
+    otherwise falls back to the original ILIKE scan.
+    """
+    match_expression = build_match_expression(keyword)
+    if match_expression is None or not search_index_available():
+        search_term = f"%{keyword}%"
+        return query.filter(or_(
+            CarbonCredit.title.ilike(search_term),
+            CarbonCredit.description.ilike(search_term),
+            CarbonCredit.source_project_type.ilike(search_term),
+            CarbonCredit.source_project_location.ilike(search_term)
+        ))
+
+    # Column weights for bm25(): title matches rank highest, then project type, location and description.
+    matches = db.select(
+        literal_column("rowid").label("credit_id"),
+        literal_column(f"bm25({FTS_TABLE}, 10.0, 1.0, 4.0, 2.0)").label("rank")
+    ).select_from(text(FTS_TABLE)).where(
+        text(f"{FTS_TABLE} MATCH :match_expression").bindparams(match_expression=match_expression)
+    ).subquery("fts_matches")
+
+    query = query.join(matches, CarbonCredit.id == matches.c.credit_id)
+    if rank_results:
+        # bm25() returns lower (more negative) scores for better matches.
+        query = query.order_by(matches.c.rank.asc(), CarbonCredit.id.desc())
+    return query
+
+def rebuild_search_index():
+    """
+    Creates the FTS5 table and triggers if missing and rebuilds the index from carbon_credits.
+    Returns the number of credits indexed.
+    """
+    with db.engine.begin() as connection:
+        if connection.dialect.name != "sqlite":
+            current_app.logger.warning("Full-text search index is only supported on SQLite; skipping rebuild.")
+            return 0
+        _create_fts(None, connection)
+        connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        indexed = connection.exec_driver_sql("SELECT COUNT(*) FROM carbon_credits").scalar()
+    current_app.logger.info(f"Rebuilt full-text search index for {indexed} carbon credits.")
+    return indexed
@@ -1,11 +1,69 @@
 import os
+import json
+import hashlib
 import subprocess
+import threading
+from datetime import datetime
 from flask import current_app
 import uuid
 
+try:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.serialization import pkcs7
+except ImportError: # cryptography is optional; the OpenSSL CLI path is used without it
+    x509 = None
+
+# (certificate_path, private_key_path) -> (certificate mtime, key mtime, certificate, private key)
+_signer_cache = {}
+_signer_cache_lock = threading.Lock()
+
+def load_signer(certificate_path, private_key_path):
+    """
+    Returns the parsed (certificate, private_key) pair, loading the PEM files only once per process.
+    The cache is refreshed automatically if either file is modified (e.g. certificate rotation).
+    """
+    if x509 is None:
+        raise RuntimeError("The cryptography library is not installed.")
+    mtimes = (os.path.getmtime(certificate_path), os.path.getmtime(private_key_path))
+    cache_key = (certificate_path, private_key_path)
+    cached = _signer_cache.get(cache_key)
+    if cached is not None and cached[:2] == mtimes:
+        return cached[2], cached[3]
+    with _signer_cache_lock:
+        with open(certificate_path, "rb") as f:
+            certificate = x509.load_pem_x509_certificate(f.read())
+        with open(private_key_path, "rb") as f:
+            private_key = serialization.load_pem_private_key(f.read(), password=None)
+        _signer_cache[cache_key] = (*mtimes, certificate, private_key)
+    return certificate, private_key
+
+def sign_data_in_process(data, certificate_path, private_key_path):
+    """
+    Produces a DER-encoded CMS SignedData structure with the content attached, equivalent to
+    `openssl cms -sign -binary -nodetach -outform DER` (SHA-256, signer certificate included,
+    contentType/signingTime/messageDigest/S-MIME capabilities signed attributes).
+    """
+    certificate, private_key = load_signer(certificate_path, private_key_path)
+    return pkcs7.PKCS7SignatureBuilder().set_data(data).add_signer(
+        certificate, private_key, hashes.SHA256()
+    ).sign(serialization.Encoding.DER, [pkcs7.PKCS7Options.Binary])
+
+def _write_atomically(path, data):
+    """Writes to a temporary file and renames it so readers never see a partial signature."""
+    temp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
 def sign_pdf_document(pdf_filename):
     """
-    Signs a given PDF document using OpenSSL command-line tools.
+    Signs a given PDF document, in-process with the cryptography library by default
+    (SIGNING_BACKEND = "inprocess") or with the OpenSSL command-line tools ("openssl", and as fallback).
     Assumes platform_certificate.pem and platform_private_key.pem are in src/certs/.
     Saves the signed PDF (in .p7m format or as a PDF with embedded signature)
     to the designated signed certificates upload folder.
@@ -37,6 +95,21 @@ def sign_pdf_document(pdf_filename):
     # signed_pdf_filepath = os.path.join(signed_certificates_folder, signed_pdf_filename)
     signed_p7m_filepath = os.path.join(signed_certificates_folder, signed_p7m_filename)
 
+    if current_app.config.get("SIGNING_BACKEND", "inprocess") == "inprocess":
+        try:
+            with open(unsigned_pdf_path, "rb") as f:
+                signed_data = sign_data_in_process(f.read(), certificate_path, private_key_path)
+            _write_atomically(signed_p7m_filepath, signed_data)
+            current_app.logger.info(f"Successfully signed PDF in-process: {pdf_filename}, output: {signed_p7m_filepath}")
+            return signed_p7m_filename
+        except Exception as e:
+            # Fall back to the OpenSSL CLI (e.g. cryptography not installed or an unsupported key type)
+            current_app.logger.warning(f"In-process signing failed for {pdf_filename}, falling back to OpenSSL CLI: {str(e)}")
+
+    return _sign_with_openssl(pdf_filename, unsigned_pdf_path, certificate_path, private_key_path, signed_p7m_filename, signed_p7m_filepath)
+
+def _sign_with_openssl(pdf_filename, unsigned_pdf_path, certificate_path, private_key_path, signed_p7m_filename, signed_p7m_filepath):
+    """Signs by spawning `openssl cms -sign` (one process per certificate)."""
     try:
         # Command to sign the PDF using OpenSSL CMS
         # This creates a detached signature in .p7m format.
@@ -96,4 +169,180 @@ def sign_pdf_document(pdf_filename):
                 current_app.logger.error(f"Error removing partial signed file {signed_p7m_filepath}: {str(oe)}")
         return None
 
+# --- Batch signing (Merkle root) ---
+# A batch of certificates is hashed into a Merkle tree and only the root is signed (one RSA operation
+# per batch). Each certificate gets an inclusion proof linking its hash to the signed root.
+# Leaf and node hashes are domain-separated (RFC 6962 style) so a leaf can never be passed off as a node.
+MERKLE_HASH_ALGORITHM = "sha256"
+
+def merkle_leaf_hash(data_hash):
+    return hashlib.sha256(b"\x00" + data_hash).digest()
+
+def merkle_node_hash(left, right):
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+def file_sha256(path, chunk_size=64 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+def build_merkle_tree(leaves):
+    """
+    Returns the tree as a list of levels (leaves first, root last).
+    An odd node at the end of a level is promoted unchanged to the next level.
+    """
+    if not leaves:
+        raise ValueError("Cannot build a Merkle tree without leaves.")
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        next_level = [merkle_node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            next_level.append(level[-1])
+        levels.append(next_level)
+    return levels
+
+def merkle_proof(levels, index):
+    """Sibling hashes from leaf to root; each step records whether the sibling sits on the left or right."""
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append({"side": "left" if sibling < index else "right", "hash": level[sibling].hex()})
+        index //= 2
+    return proof
+
+def merkle_root_from_proof(leaf_hash, proof):
+    node = leaf_hash
+    for step in proof:
+        sibling = bytes.fromhex(step["hash"])
+        node = merkle_node_hash(sibling, node) if step["side"] == "left" else merkle_node_hash(node, sibling)
+    return node
+
+def sign_pdf_batch(pdf_filenames):
+    """
+    Signs a batch of generated certificates with a single signature over their Merkle root.
+    Writes the signed root manifest to certificates/signed/batches/batch_<id>.json.p7m and an
+    inclusion proof next to each certificate as certificates/signed/<name>.pdf.proof.json.
+    Returns {"batch_id", "signature_filename", "proofs": {pdf_filename: proof_filename}} or None on error.
+    """
+    if not pdf_filenames:
+        return None
+    unsigned_pdf_folder = os.path.join(current_app.config["UPLOAD_FOLDER"], "certificates")
+    signed_certificates_folder = os.path.join(unsigned_pdf_folder, "signed")
+    batches_folder = os.path.join(signed_certificates_folder, "batches")
+    certs_dir = os.path.join(current_app.root_path, "certs")
+    certificate_path = os.path.join(certs_dir, "platform_certificate.pem")
+    private_key_path = os.path.join(certs_dir, "platform_private_key.pem")
+
+    if not os.path.exists(certificate_path) or not os.path.exists(private_key_path):
+        current_app.logger.error(f"Signing certificate or private key not found in {certs_dir}.")
+        return None
+
+    try:
+        document_hashes = [file_sha256(os.path.join(unsigned_pdf_folder, filename)) for filename in pdf_filenames]
+    except OSError as e:
+        current_app.logger.error(f"Unable to read certificate for batch signing: {str(e)}")
+        return None
+    levels = build_merkle_tree([merkle_leaf_hash(h) for h in document_hashes])
+    root = levels[-1][0]
+
+    batch_id = uuid.uuid4().hex
+    manifest = {
+        "batch_id": batch_id,
+        "hash_algorithm": MERKLE_HASH_ALGORITHM,
+        "merkle_root": root.hex(),
+        "leaf_count": len(pdf_filenames),
+        "signed_at": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }
+    manifest_bytes = json.dumps(manifest, sort_keys=True, separators=(",", ":")).encode()
+    signature_filename = f"batch_{batch_id}.json.p7m"
+    signature_path = os.path.join(batches_folder, signature_filename)
+    os.makedirs(batches_folder, exist_ok=True)
+
+    written = []
+    try:
+        signed_root = _sign_bytes(manifest_bytes, certificate_path, private_key_path, batches_folder)
+        _write_atomically(signature_path, signed_root)
+        written.append(signature_path)
+
+        proofs = {}
+        for index, filename in enumerate(pdf_filenames):
+            base_name, ext = os.path.splitext(filename)
+            proof_filename = f"{base_name}.pdf.proof.json"
+            proof = {
+                "batch_id": batch_id,
+                "signature_filename": signature_filename,
+                "document": filename,
+                "document_hash": document_hashes[index].hex(),
+                "leaf_index": index,
+                "merkle_root": root.hex(),
+                "proof": merkle_proof(levels, index),
+            }
+            proof_path = os.path.join(signed_certificates_folder, proof_filename)
+            _write_atomically(proof_path, json.dumps(proof, indent=2).encode())
+            written.append(proof_path)
+            proofs[filename] = proof_filename
+    except Exception as e:
+        current_app.logger.error(f"Batch signing failed for {len(pdf_filenames)} certificate(s): {str(e)}")
+        for path in written:
+            if os.path.exists(path):
+                os.remove(path)
+        return None
+
+    current_app.logger.info(f"Signed batch {batch_id} of {len(pdf_filenames)} certificate(s) with one root signature.")
+    return {"batch_id": batch_id, "signature_filename": signature_filename, "proofs": proofs}
+
+def _sign_bytes(data, certificate_path, private_key_path, work_folder):
+    """CMS-signs data in-process, falling back to the OpenSSL CLI via a temporary file."""
+    if current_app.config.get("SIGNING_BACKEND", "inprocess") == "inprocess":
+        try:
+            return sign_data_in_process(data, certificate_path, private_key_path)
+        except Exception as e:
+            current_app.logger.warning(f"In-process signing failed, falling back to OpenSSL CLI: {str(e)}")
+    temp_name = f"unsigned_{uuid.uuid4().hex}"
+    temp_in = os.path.join(work_folder, temp_name)
+    temp_out = os.path.join(work_folder, f"{temp_name}.p7m")
+    try:
+        with open(temp_in, "wb") as f:
+            f.write(data)
+        if not _sign_with_openssl(temp_name, temp_in, certificate_path, private_key_path, f"{temp_name}.p7m", temp_out):
+            raise RuntimeError("OpenSSL signing failed.")
+        with open(temp_out, "rb") as f:
+            return f.read()
+    finally:
+        for path in (temp_in, temp_out):
+            if os.path.exists(path):
+                os.remove(path)
+
+def verify_certificate_proof(pdf_path, proof_path, signature_path, certificate_path):
+    """
+    Checks a single batch-signed certificate:
+    1. the PDF's hash matches the proof, 2. the proof leads to the Merkle root,
+    3. the root is the one in the batch manifest, and 4. the manifest's CMS signature verifies
+    against the platform certificate (via `openssl cms -verify`; validity time is not checked so that
+    certificates signed before the platform certificate expired remain verifiable).
+    Returns True if all checks pass, otherwise False.
+    """
+    with open(proof_path, "rb") as f:
+        proof = json.load(f)
+    document_hash = file_sha256(pdf_path)
+    if document_hash.hex() != proof["document_hash"]:
+        return False
+    root = merkle_root_from_proof(merkle_leaf_hash(document_hash), proof["proof"])
+    if root.hex() != proof["merkle_root"]:
+        return False
+
+    result = subprocess.run(
+        ["openssl", "cms", "-verify", "-binary", "-inform", "DER", "-in", signature_path,
+         "-CAfile", certificate_path, "-purpose", "any", "-no_check_time"],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    if result.returncode != 0:
+        return False
+    manifest = json.loads(result.stdout)
+    return manifest.get("merkle_root") == root.hex() and manifest.get("batch_id") == proof["batch_id"]
+
 # TODO: Aim for a signed PDF instead of a .p7m file.
\ No newline at end of file
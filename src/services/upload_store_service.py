@@ -0,0 +1,266 @@
+import hashlib
+import os
+import re
+import time
+import uuid
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import event, select, update, insert, delete, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import get_history
+from werkzeug.utils import secure_filename
+
+from src.models.models import db, CarbonCredit, StoredFile, UploadedFile
+from src.services.job_service import register_periodic_task
+
+# Seller uploads are stored by content: the upload is hashed (SHA-256) while it is streamed to disk,
+# and kept as <hash>.<ext>, so a document uploaded for many listings is stored once. Files are
+# sharded into two levels of hash-prefix directories (credits/ab/cd/abcd....png) so no directory
+# grows to hundreds of thousands of entries; the name stored on records and used in /uploads URLs
+# stays the flat <hash>.<ext> and storage_path() maps it to the shard.
+#
+# Each stored file has one StoredFile row whose ref_count is the number of uploads using it, and
+# every upload has its own UploadedFile row (uploader, original name, the record it belongs to).
+# Both are written in the caller's transaction, so a listing that fails to save takes its upload
+# back with the rollback. A flush listener releases the upload when a credit is deleted or its file
+# replaced. Files are never deleted inline: a concurrent upload of the same content may be about to
+# commit a reference to them. sweep_unreferenced_uploads() removes files that no committed row
+# references and that nobody stored or reused for UPLOAD_SWEEP_GRACE_SECONDS.
+
+INCOMING_FOLDER = ".incoming" # Under UPLOAD_FOLDER (same filesystem, so files are moved into place atomically)
+STORE_SUBFOLDERS = ("credits", "verifications")
+_CONTENT_NAME = re.compile(r"^([0-9a-f]{64})\.[a-z0-9]+$")
+_SHARD_NAME = re.compile(r"^[0-9a-f]{2}$")
+_CHUNK_SIZE = 64 * 1024
+_SWEEP_BATCH_SIZE = 500
+STORE_LOCK_ID = 0x55504C44 # PostgreSQL advisory lock key of the upload store ("UPLD")
+CREDIT_UPLOADS = {"image_filename": "credits", "verification_details_filename": "verifications"} # Attribute -> subfolder
+
+def content_name_digest(filename):
+    """The SHA-256 a content-addressed name (<hash>.<ext>) carries, or None for other names."""
+    match = _CONTENT_NAME.match(filename)
+    return match.group(1) if match else None
+
+def storage_path(subfolder, filename):
+    """Path of subfolder/filename relative to UPLOAD_FOLDER; content-addressed names live in hash-prefix shards."""
+    digest = content_name_digest(filename)
+    if digest is None:
+        return f"{subfolder}/{filename}"
+    return f"{subfolder}/{digest[:2]}/{digest[2:4]}/{filename}"
+
+def _stream_to_incoming(file_storage):
+    incoming = os.path.join(current_app.config["UPLOAD_FOLDER"], INCOMING_FOLDER)
+    os.makedirs(incoming, exist_ok=True)
+    temp_path = os.path.join(incoming, f"{uuid.uuid4().hex}.part")
+    sha256 = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, "wb") as temp_file:
+            for chunk in iter(lambda: file_storage.stream.read(_CHUNK_SIZE), b""):
+                sha256.update(chunk)
+                temp_file.write(chunk)
+                size += len(chunk)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    return temp_path, sha256.hexdigest(), size
+
+def _lock_store(exclusive):
+    # Uploads adding references hold the store lock shared and the sweep holds it exclusively, until
+    # their transactions end. SQLite needs nothing extra: both write first, which takes its database-wide
+    # write lock; on PostgreSQL that write only locks existing rows, so a transaction-level advisory lock is used.
+    if db.session.get_bind().dialect.name == "postgresql":
+        lock = "pg_advisory_xact_lock" if exclusive else "pg_advisory_xact_lock_shared"
+        db.session.execute(select(getattr(func, lock)(STORE_LOCK_ID)))
+
+def _upsert_statement():
+    dialect = db.session.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(StoredFile.__table__)
+    if dialect == "sqlite":
+        return sqlite.insert(StoredFile.__table__)
+    return None
+
+def _add_reference(relative_path, digest, size):
+    # Returns the id of the StoredFile row, created or with one more reference
+    table = StoredFile.__table__
+    _lock_store(exclusive=False)
+    row = {"storage_path": relative_path, "content_hash": digest, "size_bytes": size,
+           "ref_count": 1, "created_at": datetime.utcnow()}
+    upsert = _upsert_statement()
+    if upsert is not None:
+        return db.session.execute(
+            upsert.values(**row)
+            .on_conflict_do_update(index_elements=[table.c.storage_path], set_={"ref_count": table.c.ref_count + 1})
+            .returning(table.c.id)
+        ).scalar_one()
+    changed = db.session.execute(
+        update(table).where(table.c.storage_path == relative_path).values(ref_count=table.c.ref_count + 1)
+    ).rowcount
+    if not changed:
+        db.session.execute(insert(table).values(**row))
+    return db.session.execute(select(table.c.id).where(table.c.storage_path == relative_path)).scalar_one()
+
+def store_upload(file_storage, subfolder, file_type, uploader_id):
+    """
+    Stores an uploaded file (a FileStorage whose extension was checked with allowed_file) in
+    UPLOAD_FOLDER/subfolder under its content hash, reusing the stored copy if the same content
+    was uploaded before, and records the upload in the current transaction.
+    Returns the new UploadedFile; its saved_filename (<hash>.<ext>) is the name to keep on the record
+    and use in /uploads URLs, and its related_entity_id is to be set once the record has an id.
+    """
+    extension = secure_filename(file_storage.filename).rsplit(".", 1)[1].lower()
+    temp_path, digest, size = _stream_to_incoming(file_storage)
+    filename = f"{digest}.{extension}"
+    relative_path = storage_path(subfolder, filename)
+    # The reference is written first, under the store lock: it waits for (or holds off) a sweep, which
+    # checks the references under the same lock before deleting anything
+    try:
+        stored_file_id = _add_reference(relative_path, digest, size)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+    path = os.path.join(current_app.config["UPLOAD_FOLDER"], relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Even when the content is already stored: the rename is atomic, replaces it with identical bytes
+    # and gives it a fresh mtime, so a sweep's grace period starts over
+    os.replace(temp_path, path)
+    upload = UploadedFile(uploader_id=uploader_id, original_filename=file_storage.filename[:256], saved_filename=filename,
+                          file_type=file_type, stored_file_id=stored_file_id)
+    db.session.add(upload)
+    return upload
+
+def release_upload(connection, subfolder, filename, related_entity_id):
+    """
+    Deletes the record's upload of subfolder/filename on the given connection and drops its reference
+    to the stored file, deleting the StoredFile row when it was the last. Returns True if the file is
+    no longer referenced; it is left on disk for sweep_unreferenced_uploads().
+    Files the record got from older versions (no upload recorded) are left alone.
+    """
+    uploads = UploadedFile.__table__
+    files = StoredFile.__table__
+    upload = connection.execute(
+        select(uploads.c.id, uploads.c.stored_file_id)
+        .join(files, files.c.id == uploads.c.stored_file_id)
+        .where(uploads.c.related_entity_id == related_entity_id, files.c.storage_path == storage_path(subfolder, filename))
+        .limit(1)
+    ).first()
+    if upload is None:
+        return False
+    connection.execute(delete(uploads).where(uploads.c.id == upload.id))
+    connection.execute(
+        update(files).where(files.c.id == upload.stored_file_id).values(ref_count=files.c.ref_count - 1)
+    )
+    deleted = connection.execute(
+        delete(files).where(files.c.id == upload.stored_file_id, files.c.ref_count <= 0)
+    ).rowcount
+    return bool(deleted)
+
+def _released_credit_files(session):
+    # (subfolder, filename, credit id) of the files that deleted credits and changed file attributes let go of
+    for obj in session.deleted:
+        if isinstance(obj, CarbonCredit):
+            for attribute, subfolder in CREDIT_UPLOADS.items():
+                history = get_history(obj, attribute)
+                filename = (history.deleted or history.unchanged or [getattr(obj, attribute)])[0]
+                if filename:
+                    yield subfolder, filename, obj.id
+    for obj in session.dirty:
+        if isinstance(obj, CarbonCredit) and obj not in session.deleted:
+            for attribute, subfolder in CREDIT_UPLOADS.items():
+                history = get_history(obj, attribute)
+                if history.deleted and history.deleted[0] and history.added != history.deleted:
+                    yield subfolder, history.deleted[0], obj.id
+
+@event.listens_for(CarbonCredit.image_filename, "set", active_history=True)
+@event.listens_for(CarbonCredit.verification_details_filename, "set", active_history=True)
+def _load_previous_filename(credit, value, oldvalue, initiator):
+    # active_history makes SQLAlchemy load the old file name of an expired credit before it is
+    # overwritten, so the flush listener can always release it
+    pass
+
+@event.listens_for(Session, "before_flush")
+def _release_credit_uploads_on_flush(session, flush_context, instances):
+    released = list(_released_credit_files(session))
+    if released:
+        # Core statements on the session's connection: same transaction, no recursive flush
+        connection = session.connection()
+        for subfolder, filename, credit_id in released:
+            release_upload(connection, subfolder, filename, credit_id)
+
+def _stale_files(cutoff):
+    # Yields (relative path, absolute path) of content-addressed files and abandoned partial uploads
+    # last modified before cutoff; legacy flat names are referenced by credits directly and never swept
+    upload_folder = current_app.config["UPLOAD_FOLDER"]
+    incoming = os.path.join(upload_folder, INCOMING_FOLDER)
+    if os.path.isdir(incoming):
+        for entry in os.scandir(incoming):
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                yield None, entry.path
+    for subfolder in STORE_SUBFOLDERS:
+        root = os.path.join(upload_folder, subfolder)
+        if not os.path.isdir(root):
+            continue
+        for first in os.scandir(root):
+            if not (first.is_dir() and _SHARD_NAME.match(first.name)):
+                continue
+            for second in os.scandir(first.path):
+                if not (second.is_dir() and _SHARD_NAME.match(second.name)):
+                    continue
+                for entry in os.scandir(second.path):
+                    if (entry.is_file() and content_name_digest(entry.name) is not None
+                            and entry.stat().st_mtime < cutoff):
+                        yield storage_path(subfolder, entry.name), entry.path
+
+def _sweep_batch(batch, cutoff):
+    table = StoredFile.__table__
+    # The reference check and the deletions below hold the store lock exclusively, so they cannot
+    # interleave with store_upload() adding a reference (the DELETE of leftover rows at zero is
+    # what takes SQLite's write lock)
+    _lock_store(exclusive=True)
+    db.session.execute(delete(table).where(table.c.ref_count <= 0))
+    referenced = set(db.session.execute(
+        select(table.c.storage_path)
+        .where(table.c.storage_path.in_([relative_path for relative_path, _ in batch]), table.c.ref_count > 0)
+    ).scalars())
+    removed = 0
+    for relative_path, path in batch:
+        if relative_path in referenced:
+            continue
+        try:
+            if os.stat(path).st_mtime < cutoff: # Not reused since it was listed
+                os.remove(path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    db.session.commit()
+    return removed
+
+def sweep_unreferenced_uploads(now=None):
+    """
+    Deletes stored files that no StoredFile row references and that were not stored or reused
+    for UPLOAD_SWEEP_GRACE_SECONDS, plus abandoned partial uploads. Returns the number of files removed.
+    """
+    cutoff = (now if now is not None else time.time()) - current_app.config.get("UPLOAD_SWEEP_GRACE_SECONDS", 3600)
+    removed = 0
+    batch = []
+    for relative_path, path in _stale_files(cutoff):
+        if relative_path is None:
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            continue
+        batch.append((relative_path, path))
+        if len(batch) >= _SWEEP_BATCH_SIZE:
+            removed += _sweep_batch(batch, cutoff)
+            batch = []
+    if batch:
+        removed += _sweep_batch(batch, cutoff)
+    if removed:
+        current_app.logger.info(f"Removed {removed} unreferenced upload(s).")
+    return removed
+
+register_periodic_task("sweep_unreferenced_uploads", sweep_unreferenced_uploads, "UPLOAD_SWEEP_INTERVAL_SECONDS")
@@ -0,0 +1,15 @@
+"""
+WSGI entry point for production servers, e.g.:
+
+    gunicorn -c gunicorn.conf.py src.wsgi:app
+"""
+import os
+import sys
+
+# Add project root to Python path
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+sys.path.insert(0, PROJECT_ROOT)
+
+from src.main import create_app
+
+app = create_app()
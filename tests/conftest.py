@@ -1,6 +1,8 @@
 import pytest
 import os
 import tempfile
+from contextlib import contextmanager
+from sqlalchemy import event
 
 # Add project root to sys.path to allow imports from src
 import sys
@@ -22,11 +24,11 @@ def app():
         "SQLALCHEMY_DATABASE_URI": f"sqlite:///{db_path}",
         "WTF_CSRF_ENABLED": False, # Disable CSRF for simpler testing of forms if any
         "SECRET_KEY": "test_secret_key",
-        "UPLOAD_FOLDER": tempfile.mkdtemp(prefix='test_uploads_') # Use temp dir for uploads
+        "UPLOAD_FOLDER": tempfile.mkdtemp(prefix='test_uploads_'), # Use temp dir for uploads
+        "JOB_WORKER_MODE": "eager" # Run background jobs inline so tests see their results
     }
     
-    _app = create_app()
-    _app.config.update(config_override)
+    _app = create_app(config_override)
 
     # Ensure upload subdirectories exist for testing services that might use them
     test_upload_folder = _app.config["UPLOAD_FOLDER"]
@@ -98,3 +100,23 @@ def new_seller_user(new_user):
 def new_buyer_user(new_user):
     return new_user(username="buyeruser", email="buyer@example.com", role=UserRole.BUYER)
 
+
+@pytest.fixture(scope='function')
+def query_budget(db):
+    """
+    Context manager that fails the test if the wrapped block issues more than max_queries SQL statements.
+    Usage: with query_budget(5): client.get(...)
+    """
+    @contextmanager
+    def _query_budget(max_queries):
+        statements = []
+        def _count(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        event.listen(db.engine, "before_cursor_execute", _count)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, "before_cursor_execute", _count)
+        assert len(statements) <= max_queries, (
+            f"Expected at most {max_queries} queries, got {len(statements)}:\n" + "\n".join(statements))
+    return _query_budget
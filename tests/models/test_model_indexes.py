@@ -0,0 +1,20 @@
+import pytest
+from sqlalchemy import inspect, select
+
+from src.models.models import CarbonCredit, CreditStatus, Order, db
+
+def _index_names(table_name):
+    return {index["name"] for index in inspect(db.engine).get_indexes(table_name)}
+
+def test_composite_indexes_created(app, db):
+    assert {"ix_carbon_credits_status_submitted_at", "ix_carbon_credits_status_price_per_unit",
+            "ix_carbon_credits_status_type_submitted_at", "ix_carbon_credits_seller_id_status"} <= _index_names("carbon_credits")
+    assert {"ix_orders_buyer_id_order_date", "ix_orders_seller_id_order_date", "ix_orders_seller_id_status"} <= _index_names("orders")
+
+def test_marketplace_query_uses_status_index(app, db):
+    statement = select(CarbonCredit).where(CarbonCredit.status == CreditStatus.APPROVED).order_by(CarbonCredit.submitted_at.desc())
+    sql = str(statement.compile(dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}))
+    with db.engine.connect() as connection:
+        plan = " ".join(row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"))
+    assert "ix_carbon_credits_status_submitted_at" in plan
+    assert "TEMP B-TREE" not in plan
@@ -0,0 +1,80 @@
+import pytest
+from datetime import datetime, timedelta
+
+from src.models.models import User, UserRole, CarbonCredit, CreditStatus
+from src.services.counter_service import get_counters, credit_counter
+from src.services.moderation_service import moderate_credits
+
+@pytest.fixture
+def queue(db):
+    admin = User(username="modadmin", email="modadmin@example.com", role=UserRole.ADMIN, password_hash="unused")
+    seller = User(username="modseller", email="modseller@example.com", role=UserRole.SELLER, password_hash="unused")
+    db.session.add_all([admin, seller])
+    db.session.commit()
+    start = datetime.utcnow() - timedelta(days=1)
+    credits = [CarbonCredit(seller_id=seller.id, title=f"Pending {i}", description="Desc", quantity=1, price_per_unit=1,
+                            status=CreditStatus.PENDING_APPROVAL, submitted_at=start + timedelta(minutes=i))
+               for i in range(30)]
+    approved = CarbonCredit(seller_id=seller.id, title="Already approved", description="Desc", quantity=1,
+                            price_per_unit=1, status=CreditStatus.APPROVED)
+    db.session.add_all(credits + [approved])
+    db.session.commit()
+    return admin, credits, approved
+
+def _login(client, user):
+    with client.session_transaction() as sess:
+        sess["user_id"] = user.id
+        sess["username"] = user.username
+        sess["role"] = user.role.value
+
+def test_bulk_approve_changes_only_pending_credits(client, db, queue):
+    admin, credits, approved = queue
+    _login(client, admin)
+    get_counters() # Build the counters before the batch so the adjustment is what we observe
+    selected = [credit.id for credit in credits[:3]] + [approved.id]
+    response = client.post("/admin/credits/moderate", data={"action": "approve", "credit_ids": selected})
+    assert response.status_code == 302
+
+    db.session.expire_all()
+    assert [credit.status for credit in credits[:4]] == [CreditStatus.APPROVED] * 3 + [CreditStatus.PENDING_APPROVAL]
+    assert all(credit.admin_id_reviewer == admin.id for credit in credits[:3])
+    assert approved.admin_id_reviewer is None # Not pending, so untouched
+    counters = get_counters()
+    assert counters[credit_counter(CreditStatus.PENDING_APPROVAL)] == 27
+    assert counters[credit_counter(CreditStatus.APPROVED)] == 4
+    with client.session_transaction() as sess:
+        messages = [message for _, message in sess["_flashes"]]
+    assert any(message.startswith("3 credit(s) approved.") for message in messages)
+
+def test_bulk_reject_requires_remarks(client, db, queue):
+    admin, credits, _ = queue
+    _login(client, admin)
+    client.post("/admin/credits/moderate", data={"action": "reject", "credit_ids": [credits[0].id]})
+    db.session.expire_all()
+    assert credits[0].status == CreditStatus.PENDING_APPROVAL
+
+    client.post("/admin/credits/moderate", data={"action": "reject", "credit_ids": [credits[0].id],
+                                                 "admin_remarks": "Missing verification"})
+    db.session.expire_all()
+    assert credits[0].status == CreditStatus.REJECTED
+    assert credits[0].admin_remarks == "Missing verification"
+
+def test_moderation_is_a_single_update(db, queue, query_budget):
+    admin, credits, _ = queue
+    admin_id, credit_ids = admin.id, [credit.id for credit in credits]
+    get_counters()
+    with query_budget(6) as statements: # The UPDATE plus the counter, generation and facet adjustments
+        changed = moderate_credits(credit_ids, CreditStatus.APPROVED, admin_id, None)
+    db.session.commit()
+    assert changed == 30
+    assert sum(statement.lstrip().upper().startswith("UPDATE CARBON_CREDITS") for statement in statements) == 1
+    # A second pass over the same IDs finds nothing pending
+    assert moderate_credits(credit_ids, CreditStatus.REJECTED, admin_id, "late") == 0
+
+def test_approval_queue_is_paginated_oldest_first(client, db, queue):
+    admin, credits, _ = queue
+    _login(client, admin)
+    page = client.get("/admin/credits_approval").get_data(as_text=True)
+    assert "Pending 0<" in page and "Pending 24<" in page
+    assert "Pending 25<" not in page
+    assert "30 pending" in page
@@ -0,0 +1,74 @@
+import pytest
+
+from src.models.models import User, UserRole, CarbonCredit, CreditStatus, Order, OrderStatus, db
+
+ROWS = 8
+# Fixed per-page budget: session user lookups + the listing query (+ pagination), independent of ROWS
+LISTING_QUERY_BUDGET = 5
+
+def _login(client, user):
+    with client.session_transaction() as sess:
+        sess["user_id"] = user.id
+        sess["username"] = user.username
+        sess["role"] = user.role.value
+
+@pytest.fixture
+def marketplace_rows(db):
+    def make_user(name, role):
+        # Logged in through the session directly, so no real password hash is needed
+        user = User(username=name, email=f"{name}@example.com", role=role, password_hash="unused")
+        db.session.add(user)
+        return user
+
+    admin = make_user("budgetadmin", UserRole.ADMIN)
+    buyer = make_user("budgetbuyer", UserRole.BUYER)
+    sellers = [make_user(f"budgetseller{i}", UserRole.SELLER) for i in range(ROWS)]
+    db.session.commit()
+
+    credits = []
+    for i, seller in enumerate(sellers):
+        credits.append(CarbonCredit(seller_id=seller.id, title=f"Budget credit {i}", description="Desc",
+                                    quantity=100, price_per_unit=5, status=CreditStatus.APPROVED))
+        credits.append(CarbonCredit(seller_id=seller.id, title=f"Pending credit {i}", description="Desc",
+                                    quantity=100, price_per_unit=5, status=CreditStatus.PENDING_APPROVAL))
+    db.session.add_all(credits)
+    db.session.commit()
+
+    for credit in credits[::2]:
+        db.session.add(Order(buyer_id=buyer.id, seller_id=credit.seller_id, credit_id=credit.id, quantity_ordered=1,
+                             price_per_unit_at_order=5, total_price=5, status=OrderStatus.PENDING_SELLER_ACTION))
+    # A seller with many received orders, each for a different credit
+    for credit in credits[2::2]:
+        db.session.add(Order(buyer_id=buyer.id, seller_id=sellers[0].id, credit_id=credit.id, quantity_ordered=1,
+                             price_per_unit_at_order=5, total_price=5, status=OrderStatus.PENDING_SELLER_ACTION))
+    db.session.commit()
+    return {"admin": admin, "buyer": buyer, "seller": sellers[0]}
+
+@pytest.mark.parametrize("role, url", [
+    ("admin", "/admin/orders"),
+    ("admin", "/admin/credits_approval"),
+    ("buyer", "/buyer/dashboard"),
+    ("seller", "/seller/dashboard"),
+])
+def test_listing_pages_stay_within_query_budget(client, query_budget, marketplace_rows, role, url):
+    _login(client, marketplace_rows[role])
+    with query_budget(LISTING_QUERY_BUDGET):
+        response = client.get(url)
+    assert response.status_code == 200
+
+def test_marketplace_within_query_budget(client, query_budget, marketplace_rows):
+    with query_budget(LISTING_QUERY_BUDGET):
+        response = client.get("/marketplace")
+    assert response.status_code == 200
+    assert b"budgetseller3" in response.data
+
+def test_admin_dashboard_reads_counters(client, query_budget, marketplace_rows):
+    _login(client, marketplace_rows["admin"])
+    client.get("/admin/dashboard") # First view builds the counters
+    with query_budget(3): # Session user lookup + one counters read
+        response = client.get("/admin/dashboard")
+    assert response.status_code == 200
+    html = response.get_data(as_text=True)
+    for label, value in (("Credits Pending Approval", ROWS), ("Total Orders", 2 * ROWS - 1)):
+        assert label in html
+        assert f">{value}<" in html
@@ -0,0 +1,69 @@
+import re
+import pytest
+from datetime import datetime, timedelta
+
+from src.routes.seller import seller_stats, DASHBOARD_PER_PAGE
+from src.models.models import User, UserRole, CarbonCredit, CreditStatus, Order, OrderStatus, db
+
+ROWS = 25
+
+@pytest.fixture
+def busy_seller(db):
+    seller = User(username="busyseller", email="busyseller@example.com", role=UserRole.SELLER, password_hash="unused")
+    buyer = User(username="busybuyer", email="busybuyer@example.com", role=UserRole.BUYER, password_hash="unused")
+    db.session.add_all([seller, buyer])
+    db.session.commit()
+    start = datetime(2024, 1, 1)
+    credit_statuses = [CreditStatus.APPROVED, CreditStatus.PENDING_APPROVAL, CreditStatus.SOLD, CreditStatus.REJECTED]
+    credits = [CarbonCredit(seller_id=seller.id, title=f"Busy credit {i:02d}", description="Desc", quantity=100, price_per_unit=5,
+                            status=credit_statuses[i % 4], submitted_at=start + timedelta(hours=i)) for i in range(ROWS)]
+    db.session.add_all(credits)
+    db.session.commit()
+    order_statuses = [OrderStatus.PENDING_SELLER_ACTION, OrderStatus.CONFIRMED_BY_SELLER, OrderStatus.COMPLETED, OrderStatus.REJECTED_BY_SELLER]
+    db.session.add_all([Order(buyer_id=buyer.id, seller_id=seller.id, credit_id=credits[i].id, quantity_ordered=1,
+                              price_per_unit_at_order=5, total_price=5, status=order_statuses[i % 4],
+                              order_date=start + timedelta(hours=i)) for i in range(ROWS)])
+    db.session.commit()
+    return seller
+
+def _login(client, user):
+    with client.session_transaction() as sess:
+        sess["user_id"] = user.id
+        sess["username"] = user.username
+        sess["role"] = user.role.value
+
+def test_seller_stats_are_aggregated_in_sql(app, busy_seller):
+    assert seller_stats(busy_seller.id) == {
+        "total_listed": 25, "pending_approval": 6, "approved_active": 7, "sold": 6,
+        "total_orders": 25, "pending_action_orders": 7, "confirmed_orders": 12,
+    }
+    assert seller_stats(busy_seller.id + 100)["total_orders"] == 0
+
+def _credit_rows(html):
+    # The listed-credits table comes first; its rows link to the credit by title
+    return re.findall(r'">(Busy credit \d+)</a></td>\s*<td>100', html)
+
+def _order_ids(html):
+    return [int(order_id) for order_id in re.findall(r"<td>#(\d+)</td>", html)]
+
+def test_dashboard_tables_page_independently(client, busy_seller):
+    per_page = DASHBOARD_PER_PAGE
+    assert ROWS > 2 * per_page # Both tables have a full second page
+    _login(client, busy_seller)
+    html = client.get("/seller/dashboard").get_data(as_text=True)
+    # Newest first: credits are numbered 0..ROWS-1, orders have ids 1..ROWS
+    first_credits = [f"Busy credit {i:02d}" for i in range(ROWS - 1, ROWS - 1 - per_page, -1)]
+    assert _credit_rows(html) == first_credits
+    assert _order_ids(html) == list(range(ROWS, ROWS - per_page, -1))
+
+    next_orders = re.search(r'href="([^"]*orders_cursor=[^"]*)">Next', html).group(1).replace("&amp;", "&")
+    html = client.get(next_orders).get_data(as_text=True)
+    assert _credit_rows(html) == first_credits # Paging orders leaves the credits table alone
+    second_orders = list(range(ROWS - per_page, ROWS - 2 * per_page, -1))
+    assert _order_ids(html) == second_orders
+
+    next_credits = re.search(r'href="([^"]*credits_cursor=[^"]*)">Next', html).group(1).replace("&amp;", "&")
+    assert "orders_cursor=" in next_credits # ...and paging credits keeps the orders position
+    html = client.get(next_credits).get_data(as_text=True)
+    assert _credit_rows(html) == [f"Busy credit {i:02d}" for i in range(ROWS - 1 - per_page, ROWS - 1 - 2 * per_page, -1)]
+    assert _order_ids(html) == second_orders
@@ -1,10 +1,12 @@
 import pytest
 import os
+import hashlib
 from flask import url_for, session
 from unittest.mock import patch, MagicMock
 from werkzeug.datastructures import FileStorage
 
-from src.models.models import User, UserRole, CarbonCredit, CreditStatus, Order, OrderStatus, db
+from src.models.models import User, UserRole, CarbonCredit, CreditStatus, Order, OrderStatus, CertificateStatus, db
+from src.services.upload_store_service import storage_path
 
 # Helper function to log in a user (can be moved to a common test utility if used across more files)
 def login(client, username, password):
@@ -120,15 +122,13 @@ def test_post_list_credit_with_files(client, logged_in_seller, app):
     assert b"New carbon credit listed successfully!" in response.data
     credit = CarbonCredit.query.filter_by(title="Credit With Files").first()
     assert credit is not None
-    assert credit.image_filename is not None
-    assert credit.image_filename.startswith("credit_img_")
-    assert credit.image_filename.endswith(".png")
-    assert credit.verification_details_filename is not None
-    assert credit.verification_details_filename.startswith("credit_verif_")
-    assert credit.verification_details_filename.endswith(".pdf")
+    # Content-addressed names: SHA-256 of the content plus the extension
+    assert credit.image_filename == hashlib.sha256(b"dummy image data").hexdigest() + ".png"
+    assert credit.verification_details_filename == hashlib.sha256(b"dummy pdf data").hexdigest() + ".pdf"
     # Check if files were actually saved (optional, as this tests service logic too)
-    assert os.path.exists(os.path.join(image_path, credit.image_filename))
-    assert os.path.exists(os.path.join(verif_path, credit.verification_details_filename))
+    upload_folder = app.config["UPLOAD_FOLDER"]
+    assert os.path.exists(os.path.join(upload_folder, storage_path("credits", credit.image_filename)))
+    assert os.path.exists(os.path.join(upload_folder, storage_path("verifications", credit.verification_details_filename)))
 
 def test_post_list_credit_missing_fields(client, logged_in_seller):
     response = client.post(url_for("seller.list_credit"), data={"title": "Incomplete"}, follow_redirects=True)
@@ -137,8 +137,8 @@ def test_post_list_credit_missing_fields(client, logged_in_seller):
     assert b"List New Carbon Credit" in response.data # Stays on form
 
 # --- Confirm Order Tests ---
-@patch("src.routes.seller.generate_certificate_pdf")
-@patch("src.routes.seller.sign_pdf_document")
+@patch("src.services.certificate_service.generate_certificate_pdf")
+@patch("src.services.certificate_service.sign_pdf_document")
 def test_confirm_order_success(mock_sign_pdf, mock_generate_pdf, client, logged_in_seller, order_for_seller, seller_credit):
     mock_generate_pdf.return_value = "generated_dummy.pdf"
     mock_sign_pdf.return_value = "signed_dummy.pdf.p7m"
@@ -150,8 +150,10 @@ def test_confirm_order_success(mock_sign_pdf, mock_generate_pdf, client, logged_
     assert b"Seller Dashboard" in response.data
     assert b"Order #" + bytes(str(order_for_seller.id), "utf-8") + b" has been confirmed" in response.data
     
+    # The certificate job runs inline in tests (JOB_WORKER_MODE = "eager")
     updated_order = Order.query.get(order_for_seller.id)
     assert updated_order.status == OrderStatus.COMPLETED
+    assert updated_order.certificate_status == CertificateStatus.READY
     assert updated_order.pdf_certificate_filename == "generated_dummy.pdf"
     assert updated_order.signed_pdf_certificate_filename == "signed_dummy.pdf.p7m"
     
@@ -0,0 +1,138 @@
+import hashlib
+import os
+import pytest
+from unittest.mock import patch, MagicMock
+
+from src.services.certificate_service import regenerate_certificates
+from src.services import pdf_service
+from src.services.signing_service import merkle_leaf_hash, merkle_root_from_proof
+from src.models.models import User, UserRole, CarbonCredit, CreditStatus, Order, OrderStatus, CertificateStatus, db
+
+@pytest.fixture
+def orders(db):
+    seller = User(username="regenseller", email="regenseller@example.com", role=UserRole.SELLER, password_hash="unused", company_name="Seller & Co")
+    buyer = User(username="regenbuyer", email="regenbuyer@example.com", role=UserRole.BUYER, password_hash="unused")
+    db.session.add_all([seller, buyer])
+    db.session.commit()
+    credit = CarbonCredit(seller_id=seller.id, title="Regen Credit", description="Desc", quantity=90,
+                          price_per_unit=10, status=CreditStatus.APPROVED, source_project_type="Solar")
+    db.session.add(credit)
+    db.session.commit()
+    created = []
+    for status in (OrderStatus.CONFIRMED_BY_SELLER, OrderStatus.COMPLETED, OrderStatus.PENDING_SELLER_ACTION):
+        order = Order(buyer_id=buyer.id, seller_id=seller.id, credit_id=credit.id, quantity_ordered=10,
+                      price_per_unit_at_order=10, total_price=100, status=status)
+        db.session.add(order)
+        created.append(order)
+    created[0].certificate_status = CertificateStatus.FAILED
+    created[1].pdf_certificate_filename = "old.pdf"
+    created[1].signed_pdf_certificate_filename = "old.pdf.p7m"
+    db.session.commit()
+    return created
+
+@patch("src.services.pdf_service.HTML")
+def test_render_worker_uses_plain_data(mock_html, app, orders, tmp_path):
+    order = orders[0]
+    data = pdf_service.certificate_data(order, order.buyer, order.seller_user, order.carbon_credit, "2024-01-01 00:00:00")
+    assert all(isinstance(section, (dict, str)) for section in data.values()) # No ORM objects cross the process boundary
+
+    pdf_service._init_render_worker(app.root_path, os.path.join(app.root_path, app.template_folder))
+    elapsed = pdf_service._render_certificate_worker(data, str(tmp_path / "cert.pdf"))
+
+    assert elapsed >= 0
+    html_string = mock_html.call_args.kwargs["string"]
+    assert "Regen Credit" in html_string
+    assert "Seller &amp; Co" in html_string # Autoescaped like Flask's render_template
+    assert f"Order ID: {order.id}" in html_string
+
+def _batch(filenames):
+    return {"batch_id": "b1", "signature_filename": "batch_b1.json.p7m",
+            "proofs": {filename: f"{filename[:-4]}.pdf.proof.json" for filename in filenames}}
+
+@patch("src.services.certificate_service.sign_pdf_document")
+@patch("src.services.certificate_service.sign_pdf_batch", side_effect=_batch)
+@patch("src.services.certificate_service.render_certificates")
+@patch("src.services.certificate_service.create_render_pool")
+def test_regenerate_certificates(mock_create_pool, mock_render, mock_batch, mock_sign, app, orders):
+    mock_render.side_effect = lambda jobs, pool: {pdf_filepath: 0.01 for data, pdf_filepath in jobs}
+    old_pdf = os.path.join(app.config["UPLOAD_FOLDER"], "certificates", "old.pdf")
+    open(old_pdf, "wb").close()
+    confirmed, completed, pending = orders
+
+    summary = regenerate_certificates([confirmed.id, completed.id, pending.id, 99999], processes=2)
+
+    mock_create_pool.assert_called_once_with(app, 2)
+    rendered_orders = [data["order"]["id"] for data, pdf_filepath in mock_render.call_args.args[0]]
+    assert sorted(rendered_orders) == sorted([confirmed.id, completed.id])
+    assert summary["requested"] == 4
+    assert summary["rendered"] == summary["signed"] == 2
+    assert summary["batch_id"] == "b1"
+    assert set(summary["failures"]) == {pending.id, 99999}
+    assert summary["certificates_per_second"] > 0
+    mock_batch.assert_called_once() # One signature for the whole batch, none per certificate
+    mock_sign.assert_not_called()
+
+    for order in (confirmed, completed):
+        order = db.session.get(Order, order.id)
+        assert order.status == OrderStatus.COMPLETED
+        assert order.certificate_status == CertificateStatus.READY
+        assert order.pdf_certificate_filename in mock_batch.call_args.args[0]
+        assert order.certificate_proof_filename == f"{order.pdf_certificate_filename[:-4]}.pdf.proof.json"
+        assert order.certificate_batch_filename == "batch_b1.json.p7m"
+        assert order.signed_pdf_certificate_filename is None
+        assert order.has_signed_certificate
+    assert not os.path.exists(old_pdf) # Replaced certificate files are cleaned up
+    assert db.session.get(Order, pending.id).pdf_certificate_filename is None
+
+@patch("src.services.certificate_service.sign_pdf_batch", return_value=None)
+@patch("src.services.certificate_service.render_certificates")
+@patch("src.services.certificate_service.create_render_pool")
+def test_regenerate_certificates_reports_signing_failures(mock_create_pool, mock_render, mock_batch, app, orders):
+    mock_render.side_effect = lambda jobs, pool: {pdf_filepath: 0.01 for data, pdf_filepath in jobs}
+    completed = orders[1]
+
+    summary = regenerate_certificates([completed.id])
+
+    assert summary["signed"] == 0 and summary["batch_id"] is None
+    assert summary["failures"] == {completed.id: "signing failed"}
+    order = db.session.get(Order, completed.id)
+    assert (order.pdf_certificate_filename, order.signed_pdf_certificate_filename) == ("old.pdf", "old.pdf.p7m")
+
+def _render_dummy_pdfs(jobs, pool):
+    for data, pdf_filepath in jobs:
+        with open(pdf_filepath, "wb") as f:
+            f.write(f"%PDF-1.4 certificate of order {data['order']['id']}".encode())
+    return {pdf_filepath: 0.01 for data, pdf_filepath in jobs}
+
+@patch("src.services.certificate_service.render_certificates", side_effect=_render_dummy_pdfs)
+@patch("src.services.certificate_service.create_render_pool")
+def test_batch_signed_certificates_can_be_downloaded_and_verified(mock_create_pool, mock_render, app, client, orders):
+    confirmed, completed, pending = orders
+    regenerate_certificates([confirmed.id, completed.id])
+
+    for order in (confirmed, completed):
+        order = db.session.get(Order, order.id)
+        certificate = client.get(f"/uploads/certificates/{order.pdf_certificate_filename}")
+        proof = client.get(f"/uploads/certificates/signed/{order.certificate_proof_filename}")
+        manifest = client.get(f"/uploads/certificates/signed/batches/{order.certificate_batch_filename}")
+        assert certificate.status_code == proof.status_code == manifest.status_code == 200
+        proof_data = proof.get_json(force=True)
+        assert proof_data["document"] == order.pdf_certificate_filename
+        assert proof_data["document_hash"] == hashlib.sha256(certificate.data).hexdigest()
+        assert proof_data["signature_filename"] == order.certificate_batch_filename
+        assert merkle_root_from_proof(merkle_leaf_hash(bytes.fromhex(proof_data["document_hash"])),
+                                      proof_data["proof"]).hex() == proof_data["merkle_root"]
+
+@patch("src.services.certificate_service.sign_pdf_document")
+@patch("src.services.certificate_service.render_certificates")
+@patch("src.services.certificate_service.create_render_pool")
+def test_regenerate_certificates_reports_render_failures(mock_create_pool, mock_render, mock_sign, app, orders):
+    mock_render.side_effect = lambda jobs, pool: {pdf_filepath: RuntimeError("layout failed") for data, pdf_filepath in jobs}
+    confirmed = orders[0]
+
+    summary = regenerate_certificates([confirmed.id])
+
+    assert summary["signed"] == 0
+    assert "layout failed" in summary["failures"][confirmed.id]
+    mock_sign.assert_not_called()
+    assert db.session.get(Order, confirmed.id).certificate_status == CertificateStatus.FAILED
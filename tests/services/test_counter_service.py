@@ -0,0 +1,68 @@
+import pytest
+
+from src.services.counter_service import get_counters, get_dashboard_counts, rebuild_counters, count_totals, adjust_counters, credit_counter, USERS, ORDERS, MARKETPLACE_GENERATION
+from src.models.models import User, UserRole, CarbonCredit, CreditStatus, Order, OrderStatus, DashboardCounter, db
+
+def make_user(username, role=UserRole.BUYER):
+    user = User(username=username, email=f"{username}@example.com", role=role, password_hash="unused")
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+def make_credit(seller, status=None):
+    credit = CarbonCredit(seller_id=seller.id, title="Counter Credit", description="Desc", quantity=10, price_per_unit=5)
+    if status is not None:
+        credit.status = status
+    db.session.add(credit)
+    db.session.commit()
+    return credit
+
+def test_counters_are_built_from_one_aggregate(app, db):
+    seller = make_user("countseller", UserRole.SELLER)
+    make_credit(seller, CreditStatus.APPROVED)
+    make_credit(seller)
+    assert DashboardCounter.query.filter(DashboardCounter.name != MARKETPLACE_GENERATION).count() == 0
+
+    counts = get_dashboard_counts()
+
+    assert counts == {"pending_credits": 1, "approved_credits": 1, "total_users": 1, "total_orders": 0}
+    assert get_counters()[credit_counter(CreditStatus.SOLD)] == 0 # Every status gets a row
+
+def test_counters_follow_orm_changes(app, db):
+    rebuild_counters()
+    seller = make_user("incseller", UserRole.SELLER)
+    buyer = make_user("incbuyer")
+    credit = make_credit(seller) # Default status: pending approval
+    db.session.add(Order(buyer_id=buyer.id, seller_id=seller.id, credit_id=credit.id, quantity_ordered=1,
+                         price_per_unit_at_order=5, total_price=5, status=OrderStatus.PENDING_SELLER_ACTION))
+    db.session.commit()
+    assert get_dashboard_counts() == {"pending_credits": 1, "approved_credits": 0, "total_users": 2, "total_orders": 1}
+
+    credit.status = CreditStatus.APPROVED
+    db.session.commit()
+    counts = get_dashboard_counts()
+    assert (counts["pending_credits"], counts["approved_credits"]) == (0, 1)
+
+    credit.title = "Renamed" # Not a status change
+    db.session.commit()
+    assert get_dashboard_counts()["approved_credits"] == 1
+
+    db.session.delete(db.session.get(Order, 1))
+    db.session.commit()
+    assert get_dashboard_counts()["total_orders"] == 0
+    assert get_counters() == count_totals() # Incremental counters agree with a full recount
+
+def test_rolled_back_changes_do_not_count(app, db):
+    rebuild_counters()
+    db.session.add(User(username="ghost", email="ghost@example.com", role=UserRole.BUYER, password_hash="unused"))
+    db.session.flush()
+    db.session.rollback()
+    assert get_counters()[USERS] == 0
+
+def test_adjust_counters_for_bulk_updates(app, db):
+    rebuild_counters()
+    adjust_counters(db.session.connection(), {ORDERS: 3, credit_counter(CreditStatus.APPROVED): -1})
+    db.session.commit()
+    assert get_counters()[ORDERS] == 3
+    assert get_counters()[credit_counter(CreditStatus.APPROVED)] == -1
+    assert rebuild_counters()[ORDERS] == 0
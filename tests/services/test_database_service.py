@@ -0,0 +1,143 @@
+import time
+import pytest
+from datetime import datetime
+from flask import Flask, g
+from sqlalchemy import text, select, func, delete, event
+
+from src.main import create_app
+from src.services.database_service import init_database, database_engines, normalize_database_url, engine_options, DEFAULT_SQLITE_PRAGMAS
+from src.models.models import db, User, UserRole, CarbonCredit, CreditStatus, Order, MarketplaceFacet
+from src.models.session import PRIMARY_UNTIL_KEY, READ_REPLICA_FLAG, REPLICA_ENGINE_KEY
+
+def _pragma(connection, name):
+    return connection.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+def test_app_connections_use_sqlite_tuning(app):
+    with app.app_context(), db.engine.connect() as connection:
+        assert _pragma(connection, "journal_mode") == "wal"
+        assert _pragma(connection, "synchronous") == 1 # NORMAL
+        assert _pragma(connection, "busy_timeout") == DEFAULT_SQLITE_PRAGMAS["busy_timeout"]
+        assert _pragma(connection, "cache_size") == DEFAULT_SQLITE_PRAGMAS["cache_size"]
+    assert db.engine.pool.size() == app.config["SQLALCHEMY_POOL_SIZE"]
+
+def test_readers_are_not_blocked_by_a_writer(tmp_path):
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'wal.db'}"
+    init_database(app)
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"))
+            connection.execute(text("INSERT INTO items (name) VALUES ('committed')"))
+
+        writer = db.engine.connect()
+        writer.exec_driver_sql("BEGIN IMMEDIATE") # Holds the write lock, as an order confirmation would
+        writer.execute(text("INSERT INTO items (name) VALUES ('uncommitted')"))
+        try:
+            with db.engine.connect() as reader:
+                # With the default rollback journal this read could fail once the writer commits
+                # its pages; with WAL it sees the last committed snapshot without waiting
+                assert reader.execute(text("SELECT name FROM items")).scalars().all() == ["committed"]
+        finally:
+            writer.rollback()
+            writer.close()
+        db.engine.dispose()
+
+def test_in_memory_database_is_left_alone():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    init_database(app)
+    with app.app_context(), db.engine.connect() as connection:
+        assert _pragma(connection, "journal_mode") == "memory"
+        assert "pool_size" not in app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})
+
+def test_database_urls_and_server_pool_options():
+    app = Flask(__name__)
+    assert normalize_database_url("postgres://u:p@db/carbon") == "postgresql://u:p@db/carbon"
+    assert normalize_database_url("sqlite:///x.db") == "sqlite:///x.db"
+    options = engine_options(app, "postgresql://u:p@db/carbon")
+    assert options["pool_pre_ping"] is True and options["pool_size"] == 10
+    assert "connect_args" not in options
+    assert engine_options(app, "sqlite://") == {}
+
+
+@pytest.fixture
+def replicated_app(tmp_path):
+    """An app whose primary and replica are two SQLite files, seeded with diverging credit titles."""
+    app = create_app({
+        "TESTING": True,
+        "SECRET_KEY": "test_secret_key",
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'primary.db'}",
+        "DATABASE_REPLICA_URL": f"sqlite:///{tmp_path / 'replica.db'}",
+        "UPLOAD_FOLDER": str(tmp_path / "uploads"),
+        "JOB_WORKER_MODE": "eager",
+    })
+    with app.app_context():
+        for label, engine in (("primary", db.engine), ("replica", app.extensions[REPLICA_ENGINE_KEY])):
+            db.metadata.create_all(engine)
+            with engine.begin() as connection:
+                connection.execute(User.__table__.insert(), [
+                    {"id": 1, "username": "seller", "email": "seller@example.com", "password_hash": "x", "role": UserRole.SELLER, "is_active": True},
+                    {"id": 2, "username": "buyer", "email": "buyer@example.com", "password_hash": "x", "role": UserRole.BUYER, "is_active": True},
+                ])
+                connection.execute(CarbonCredit.__table__.insert(), {
+                    "id": 1, "seller_id": 1, "title": f"Credit from {label}", "description": "Desc", "quantity": 100.0,
+                    "price_per_unit": 5.0, "status": CreditStatus.APPROVED, "submitted_at": datetime(2024, 1, 1),
+                })
+        yield app
+        db.session.remove()
+        for engine in database_engines(app):
+            engine.dispose()
+
+def _login(client, user_id, username, role):
+    with client.session_transaction() as sess:
+        sess["user_id"] = user_id
+        sess["username"] = username
+        sess["role"] = role.value
+
+def test_read_only_views_use_the_replica(replicated_app):
+    client = replicated_app.test_client()
+    assert b"Credit from replica" in client.get("/marketplace").data
+    assert b"Credit from replica" in client.get("/credit/1").data
+
+def test_repairs_in_read_only_views_write_to_the_primary(replicated_app):
+    replica = replicated_app.extensions[REPLICA_ENGINE_KEY]
+    with replicated_app.app_context():
+        for engine in (db.engine, replica):
+            with engine.begin() as connection:
+                connection.execute(delete(MarketplaceFacet.__table__)) # Facets must be rebuilt on the next visit
+    replica.dispose()
+    event.listen(replica, "connect", lambda dbapi_connection, record: dbapi_connection.execute("PRAGMA query_only = ON"))
+
+    response = replicated_app.test_client().get("/marketplace")
+    assert response.status_code == 200
+    with replicated_app.app_context(), db.engine.connect() as connection:
+        assert connection.execute(select(func.count()).select_from(MarketplaceFacet.__table__)).scalar() > 0
+
+def test_writes_go_to_the_primary_and_reads_stick_to_it(replicated_app):
+    client = replicated_app.test_client()
+    _login(client, 2, "buyer", UserRole.BUYER)
+    response = client.post("/buyer/order/create/1", data={"quantity": "3"})
+    assert response.status_code == 302
+
+    with replicated_app.app_context():
+        with db.engine.connect() as connection:
+            assert connection.execute(select(func.count()).select_from(Order.__table__)).scalar() == 1
+        with replicated_app.extensions[REPLICA_ENGINE_KEY].connect() as connection:
+            assert connection.execute(select(func.count()).select_from(Order.__table__)).scalar() == 0
+
+    # The replica has not caught up yet, but the buyer's next reads are served by the primary
+    with client.session_transaction() as sess:
+        assert sess[PRIMARY_UNTIL_KEY] > time.time()
+    assert b"Credit from primary" in client.get("/marketplace").data
+    assert b"Credit from primary" in client.get("/buyer/dashboard").data
+
+    # Once the stickiness window has passed, reads go back to the replica
+    with client.session_transaction() as sess:
+        sess[PRIMARY_UNTIL_KEY] = time.time() - 1
+    assert b"Credit from replica" in client.get("/marketplace").data
+
+def test_without_a_replica_everything_uses_the_primary(app, db):
+    assert REPLICA_ENGINE_KEY not in app.extensions
+    with app.test_request_context():
+        setattr(g, READ_REPLICA_FLAG, True)
+        assert db.session.get_bind(mapper=CarbonCredit) is db.engine
@@ -0,0 +1,85 @@
+import pytest
+
+from src.models.models import User, UserRole, CarbonCredit, CreditStatus, MarketplaceFacet
+from src.services.facet_service import get_marketplace_facets, count_facets, rebuild_facets, price_bucket, TOTAL
+from src.services.inventory_service import decrement_stock
+from src.services.moderation_service import moderate_credits
+
+@pytest.fixture
+def seller(db):
+    user = User(username="facetseller", email="facetseller@example.com", role=UserRole.SELLER, password_hash="unused")
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+def make_credit(db, seller, project_type="Solar", location="Kenya", price=12.0, status=CreditStatus.APPROVED, quantity=5):
+    credit = CarbonCredit(seller_id=seller.id, title=f"{project_type} in {location}", description="Desc", quantity=quantity,
+                          price_per_unit=price, status=status, source_project_type=project_type, source_project_location=location)
+    db.session.add(credit)
+    db.session.commit()
+    return credit
+
+def stored_facets():
+    return {(row.facet, row.value): row.count for row in MarketplaceFacet.query if row.count}
+
+def test_price_buckets():
+    assert [price_bucket(price) for price in (0, 4.99, 5, 24.5, 99.99, 250, 10000)] == [0, 0, 5, 10, 50, 250, 250]
+
+def test_facets_follow_orm_changes(db, seller):
+    solar = make_credit(db, seller)
+    wind = make_credit(db, seller, project_type="Wind Power", location="Chile", price=60)
+    make_credit(db, seller, status=CreditStatus.PENDING_APPROVAL) # Not listed
+    facets = get_marketplace_facets()
+    assert facets["total"] == 2
+    assert facets["project_type"] == [("Solar", 1), ("Wind Power", 1)]
+    assert {bucket["min"]: bucket["count"] for bucket in facets["price"]}[10] == 1
+
+    db.session.expire_all() # Changes to expired credits must still take back their old contributions
+    solar.price_per_unit = 300
+    solar.source_project_location = "Peru"
+    db.session.commit()
+    db.session.expire_all()
+    wind.status = CreditStatus.REJECTED
+    db.session.commit()
+    db.session.delete(solar)
+    make_credit(db, seller, project_type="Forestry Carbon Sink", location="Peru", price=3)
+    assert stored_facets() == {key: count for key, count in count_facets().items() if count}
+    assert get_marketplace_facets()["location"] == [("Peru", 1)]
+
+def test_core_updates_adjust_facets(db, seller):
+    pending = make_credit(db, seller, status=CreditStatus.PENDING_APPROVAL)
+    moderate_credits([pending.id], CreditStatus.APPROVED, seller.id, None)
+    db.session.commit()
+    assert get_marketplace_facets()["project_type"] == [("Solar", 1)]
+
+    decrement_stock(pending.id, 5) # Sells out
+    db.session.commit()
+    assert get_marketplace_facets()["total"] == 0
+    assert stored_facets() == {}
+
+def test_facets_are_rebuilt_when_missing(db, seller, query_budget):
+    make_credit(db, seller)
+    MarketplaceFacet.query.delete()
+    db.session.commit()
+    assert get_marketplace_facets()["total"] == 1 # Rebuilt on first use
+    with query_budget(1):
+        assert get_marketplace_facets()["project_type"] == [("Solar", 1)]
+    assert rebuild_facets()[(TOTAL, "")] == 1
+
+def test_marketplace_shows_counts_and_filters_by_location(client, db, seller):
+    make_credit(db, seller, location="Kenya")
+    make_credit(db, seller, project_type="Wind Power", location="Chile")
+    page = client.get("/marketplace").get_data(as_text=True)
+    assert "Chile (1)" in page and "Kenya (1)" in page
+    assert "All Types (2)" in page
+
+    page = client.get("/marketplace?location=Chile").get_data(as_text=True)
+    assert "Wind Power in Chile" in page
+    assert "Solar in Kenya" not in page
+
+def test_empty_marketplace_is_not_rebuilt_on_every_request(client, db, query_budget):
+    client.get("/marketplace")
+    assert get_marketplace_facets()["total"] == 0
+    with query_budget(100) as statements:
+        assert client.get("/marketplace").status_code == 200
+    assert not [statement for statement in statements if statement.lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE"))]
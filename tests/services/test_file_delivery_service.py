@@ -0,0 +1,67 @@
+import hashlib
+import os
+import pytest
+
+IMAGE_NAME = "credit_img_0123456789abcdef0123456789abcdef.png"
+CONTENT = b"\x89PNG" + bytes(range(256)) * 8
+
+@pytest.fixture
+def stored_files(app):
+    folder = app.config["UPLOAD_FOLDER"]
+    paths = [os.path.join(folder, "credits", IMAGE_NAME), os.path.join(folder, "certificates", "CarbonConnect_Certificate_Order_1_abcd1234.pdf")]
+    for path in paths:
+        with open(path, "wb") as stored_file:
+            stored_file.write(CONTENT)
+    yield
+    for path in paths:
+        os.remove(path)
+
+@pytest.fixture
+def delivery_mode(app):
+    def _set(mode):
+        app.config["FILE_DELIVERY_MODE"] = mode
+    yield _set
+    app.config["FILE_DELIVERY_MODE"] = "direct"
+
+def test_direct_delivery_with_ranges_and_content_etag(client, stored_files):
+    response = client.get(f"/uploads/credits/{IMAGE_NAME}")
+    assert response.status_code == 200
+    assert response.data == CONTENT
+    etag = hashlib.sha256(CONTENT).hexdigest()
+    assert response.headers["ETag"] == f'"{etag}"'
+    assert response.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+
+    partial = client.get(f"/uploads/credits/{IMAGE_NAME}", headers={"Range": "bytes=4-13"})
+    assert partial.status_code == 206
+    assert partial.data == CONTENT[4:14]
+    assert partial.headers["Content-Range"] == f"bytes 4-13/{len(CONTENT)}"
+
+    assert client.get(f"/uploads/credits/{IMAGE_NAME}", headers={"If-None-Match": f'"{etag}"'}).status_code == 304
+
+def test_reusable_names_are_revalidated(client, stored_files):
+    response = client.get("/uploads/certificates/CarbonConnect_Certificate_Order_1_abcd1234.pdf")
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+@pytest.mark.parametrize("mode, header, expected", [
+    ("x-accel", "X-Accel-Redirect", f"/protected-uploads/credits/{IMAGE_NAME}"),
+    ("x-sendfile", "X-Sendfile", os.path.join("credits", IMAGE_NAME)),
+])
+def test_offloaded_delivery(client, stored_files, delivery_mode, mode, header, expected):
+    delivery_mode(mode)
+    response = client.get(f"/uploads/credits/{IMAGE_NAME}")
+    assert response.status_code == 200
+    assert response.data == b"" # The front server sends the bytes
+    assert response.headers[header].endswith(expected)
+    assert response.headers["Content-Type"] == "image/png"
+    assert response.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+
+    etag = response.headers["ETag"]
+    revalidated = client.get(f"/uploads/credits/{IMAGE_NAME}", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert header not in revalidated.headers
+
+def test_missing_and_outside_files_are_not_found(client, stored_files):
+    assert client.get("/uploads/credits/missing.png").status_code == 404
+    assert client.get("/uploads/credits/../certificates/CarbonConnect_Certificate_Order_1_abcd1234.pdf").status_code == 404
+    assert client.get("/uploads/secrets/anything.txt").status_code == 404
@@ -0,0 +1,106 @@
+import pytest
+from contextlib import contextmanager
+from flask import template_rendered
+
+from src.models.models import User, UserRole, CarbonCredit, CreditStatus
+from src.services.inventory_service import reserve_stock
+
+@pytest.fixture
+def listing(db):
+    seller = User(username="etagseller", email="etagseller@example.com", role=UserRole.SELLER, password_hash="unused")
+    buyer = User(username="etagbuyer", email="etagbuyer@example.com", role=UserRole.BUYER, password_hash="unused")
+    db.session.add_all([seller, buyer])
+    db.session.commit()
+    credit = CarbonCredit(seller_id=seller.id, title="Validated credit", description="Desc", quantity=10,
+                          price_per_unit=5, status=CreditStatus.APPROVED)
+    db.session.add(credit)
+    db.session.commit()
+    return seller, buyer, credit
+
+@contextmanager
+def rendered_templates(app):
+    templates = []
+    def record(sender, template, context, **extra):
+        templates.append(template.name)
+    template_rendered.connect(record, app)
+    try:
+        yield templates
+    finally:
+        template_rendered.disconnect(record, app)
+
+def _login(client, user):
+    with client.session_transaction() as sess:
+        sess["user_id"] = user.id
+        sess["username"] = user.username
+        sess["role"] = user.role.value
+
+@pytest.mark.parametrize("path", ["/marketplace", "/credit/{id}"])
+def test_unchanged_pages_are_not_rendered_again(app, client, db, listing, path):
+    _, _, credit = listing
+    url = path.format(id=credit.id)
+    first = client.get(url)
+    assert first.status_code == 200
+    assert first.headers["Cache-Control"] == "public, no-cache" # Anonymous: a reverse proxy may store it
+    etag = first.headers["ETag"]
+
+    with rendered_templates(app) as templates:
+        repeat = client.get(url, headers={"If-None-Match": etag})
+        assert repeat.status_code == 304
+        assert repeat.headers["ETag"] == etag
+        assert templates == []
+
+    db.session.expire_all()
+    credit.price_per_unit = 6 # Changes the credit's updated_at and the marketplace generation
+    db.session.commit()
+    changed = client.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+def test_reservations_change_the_credit_validator(client, db, listing):
+    _, _, credit = listing
+    etag = client.get(f"/credit/{credit.id}").headers["ETag"]
+    assert reserve_stock(credit.id, 2)
+    db.session.commit()
+    response = client.get(f"/credit/{credit.id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert b"2.0 of 10.0 reserved" in response.data
+
+def test_logged_in_pages_are_private_and_per_viewer(client, listing):
+    seller, buyer, credit = listing
+    anonymous_etag = client.get("/marketplace").headers["ETag"]
+    _login(client, seller)
+    response = client.get("/marketplace", headers={"If-None-Match": anonymous_etag})
+    assert response.status_code == 200 # The anonymous copy has no seller navigation
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+    # Buyers get a new idempotency key in the purchase form every time
+    _login(client, buyer)
+    response = client.get(f"/credit/{credit.id}")
+    assert "ETag" not in response.headers
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+def test_pending_flash_messages_are_always_rendered(client, listing):
+    etag = client.get("/marketplace").headers["ETag"]
+    with client.session_transaction() as sess:
+        sess["_flashes"] = [("info", "Welcome back")]
+    response = client.get("/marketplace", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert b"Welcome back" in response.data
+
+def test_shared_max_age_for_reverse_proxies(app, client, listing):
+    app.config["HTTP_CACHE_SHARED_MAX_AGE"] = 30
+    try:
+        assert client.get("/marketplace").headers["Cache-Control"] == "public, max-age=0, s-maxage=30"
+    finally:
+        app.config["HTTP_CACHE_SHARED_MAX_AGE"] = 0
+
+def test_if_modified_since_alone_never_gets_304(client, db, listing):
+    _, _, credit = listing
+    first = client.get(f"/credit/{credit.id}")
+    assert "Last-Modified" in first.headers
+    db.session.expire_all()
+    credit.price_per_unit = 7 # Within the same second as the copy the client holds
+    db.session.commit()
+    response = client.get(f"/credit/{credit.id}", headers={"If-Modified-Since": first.headers["Last-Modified"]})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != first.headers["ETag"]
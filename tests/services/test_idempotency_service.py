@@ -0,0 +1,126 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from sqlalchemy import delete
+
+from src.models.models import User, UserRole, CarbonCredit, CreditStatus, Order, OrderStatus, BackgroundJob, IdempotencyKey
+from src.services.idempotency_service import purge_expired_idempotency_keys
+
+@pytest.fixture
+def listing(db):
+    seller = User(username="idemseller", email="idemseller@example.com", role=UserRole.SELLER, password_hash="unused")
+    buyer = User(username="idembuyer", email="idembuyer@example.com", role=UserRole.BUYER, password_hash="unused")
+    db.session.add_all([seller, buyer])
+    db.session.commit()
+    credit = CarbonCredit(seller_id=seller.id, title="Idempotent credit", description="Desc", quantity=10,
+                          price_per_unit=5, status=CreditStatus.APPROVED)
+    db.session.add(credit)
+    db.session.commit()
+    return seller, buyer, credit
+
+def _login(client, user):
+    with client.session_transaction() as sess:
+        sess["user_id"] = user.id
+        sess["username"] = user.username
+        sess["role"] = user.role.value
+
+def _flashes(client):
+    with client.session_transaction() as sess:
+        return sess.pop("_flashes", [])
+
+def test_retried_order_creation_is_replayed(client, db, listing):
+    _, buyer, credit = listing
+    _login(client, buyer)
+    first = client.post(f"/buyer/order/create/{credit.id}", data={"quantity": "2"}, headers={"Idempotency-Key": "order-1"})
+    first_flashes = _flashes(client)
+    retry = client.post(f"/buyer/order/create/{credit.id}", data={"quantity": "2"}, headers={"Idempotency-Key": "order-1"})
+
+    assert Order.query.filter_by(credit_id=credit.id).count() == 1
+    assert (retry.status_code, retry.location) == (first.status_code, first.location)
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert _flashes(client) == first_flashes # The buyer still sees the confirmation message
+    db.session.expire_all()
+    assert credit.reserved_quantity == 2
+
+    # A new key is a new order; a key reused for a different request is refused
+    client.post(f"/buyer/order/create/{credit.id}", data={"quantity": "2"}, headers={"Idempotency-Key": "order-2"})
+    assert Order.query.filter_by(credit_id=credit.id).count() == 2
+    assert client.post(f"/buyer/order/create/{credit.id}", data={"quantity": "3"},
+                       headers={"Idempotency-Key": "order-1"}).status_code == 422
+
+def test_form_field_key_and_in_flight_requests(client, db, listing):
+    _, buyer, credit = listing
+    _login(client, buyer)
+    now = datetime.utcnow()
+    db.session.add(IdempotencyKey(user_id=buyer.id, key="busy", request_hash="x", created_at=now, expires_at=now + timedelta(hours=1)))
+    db.session.commit()
+    response = client.post(f"/buyer/order/create/{credit.id}", data={"quantity": "1", "idempotency_key": "busy"})
+    assert response.status_code == 409
+    assert Order.query.count() == 0
+
+    # However old, an unfinished claim may still be running (or have committed its order), so it blocks the
+    # key until it expires
+    db.session.get(IdempotencyKey, (buyer.id, "busy")).created_at = now - timedelta(hours=2)
+    db.session.commit()
+    assert client.post(f"/buyer/order/create/{credit.id}", data={"quantity": "1", "idempotency_key": "busy"}).status_code == 409
+    db.session.get(IdempotencyKey, (buyer.id, "busy")).expires_at = now - timedelta(seconds=1)
+    db.session.commit()
+    assert client.post(f"/buyer/order/create/{credit.id}", data={"quantity": "1", "idempotency_key": "busy"}).status_code == 302
+    assert Order.query.count() == 1
+
+def test_a_request_dying_after_its_commit_is_never_run_again(client, db, listing):
+    _, buyer, credit = listing
+    _login(client, buyer)
+    # The view's commit goes through, then the request dies before its outcome is recorded
+    with patch("src.services.idempotency_service.make_response", side_effect=RuntimeError("worker killed")):
+        with pytest.raises(RuntimeError):
+            client.post(f"/buyer/order/create/{credit.id}", data={"quantity": "2"}, headers={"Idempotency-Key": "dies"})
+    db.session.expire_all()
+    record = db.session.get(IdempotencyKey, (buyer.id, "dies"))
+    assert (record.status_code, record.committed_at is not None) == (None, True)
+
+    retry = client.post(f"/buyer/order/create/{credit.id}", data={"quantity": "2"}, headers={"Idempotency-Key": "dies"})
+    assert retry.status_code == 409
+    assert Order.query.count() == 1
+
+def test_a_view_that_lost_its_claim_cannot_commit(client, db, listing):
+    _, buyer, credit = listing
+    _login(client, buyer)
+
+    def claim_taken_over():
+        # As if the key expired and a retry took it over while this request was running
+        db.session.execute(delete(IdempotencyKey).where(IdempotencyKey.key == "slow"))
+        return datetime.utcnow() + timedelta(hours=1)
+
+    with patch("src.routes.buyer.reservation_expiry", side_effect=claim_taken_over):
+        response = client.post(f"/buyer/order/create/{credit.id}", data={"quantity": "2"}, headers={"Idempotency-Key": "slow"})
+    assert response.status_code == 302
+    assert Order.query.count() == 0
+    db.session.expire_all()
+    assert credit.reserved_quantity == 0
+
+@patch("src.routes.seller.dispatch_jobs")
+def test_retried_confirmation_does_not_requeue_the_certificate(mock_dispatch, client, db, listing):
+    seller, buyer, credit = listing
+    order = Order(buyer_id=buyer.id, seller_id=seller.id, credit_id=credit.id, quantity_ordered=1,
+                  price_per_unit_at_order=5, total_price=5)
+    db.session.add(order)
+    db.session.commit()
+    _login(client, seller)
+
+    for _ in range(3):
+        response = client.post(f"/seller/orders/{order.id}/confirm", headers={"Idempotency-Key": "confirm-1"})
+        assert response.status_code == 302
+    assert response.headers["Idempotent-Replayed"] == "true"
+    assert mock_dispatch.call_count == 1
+    assert BackgroundJob.query.count() == 1
+    assert db.session.get(Order, order.id).status == OrderStatus.CONFIRMED_BY_SELLER
+
+def test_expired_keys_are_purged_and_reusable(client, db, listing):
+    _, buyer, credit = listing
+    _login(client, buyer)
+    client.post(f"/buyer/order/create/{credit.id}", data={"quantity": "1"}, headers={"Idempotency-Key": "old"})
+    assert purge_expired_idempotency_keys() == 0
+    assert purge_expired_idempotency_keys(now=datetime.utcnow() + timedelta(days=2)) == 1
+    client.post(f"/buyer/order/create/{credit.id}", data={"quantity": "1"}, headers={"Idempotency-Key": "old"})
+    assert Order.query.count() == 2
@@ -0,0 +1,83 @@
+import pytest
+
+from src.services import identity_service
+from src.services.identity_service import current_identity, invalidate_identity
+from src.models.models import User, UserRole, CarbonCredit, CreditStatus, db
+
+@pytest.fixture
+def buyer(db):
+    user = User(username="identitybuyer", email="identitybuyer@example.com", role=UserRole.BUYER, password_hash="unused")
+    db.session.add(user)
+    db.session.commit()
+    identity_service._identity_cache.clear()
+    yield user
+    identity_service._identity_cache.clear()
+
+def _login(client, user):
+    with client.session_transaction() as sess:
+        sess["user_id"] = user.id
+        sess["username"] = user.username
+        sess["role"] = user.role.value
+
+def _fresh_session():
+    # Requests in the tests share one app context; start each with an empty identity map like production
+    db.session.expunge_all()
+
+def _user_lookups(statements):
+    return [statement for statement in statements if statement.lstrip().startswith("SELECT") and "FROM users" in statement]
+
+def test_authenticated_page_looks_up_user_once(client, query_budget, buyer):
+    _login(client, buyer)
+    _fresh_session()
+    with query_budget(10) as statements:
+        response = client.get("/buyer/dashboard")
+    assert response.status_code == 200
+    assert "identitybuyer" in response.get_data(as_text=True) # Rendered from the shared identity
+    assert len(_user_lookups(statements)) == 1
+
+def test_ttl_cache_skips_user_lookup(app, client, query_budget, buyer):
+    app.config["USER_CACHE_TTL_SECONDS"] = 30
+    try:
+        _login(client, buyer)
+        client.get("/buyer/dashboard") # Warms the cache
+        _fresh_session()
+        with query_budget(10) as statements:
+            assert client.get("/buyer/dashboard").status_code == 200
+        assert _user_lookups(statements) == []
+    finally:
+        app.config["USER_CACHE_TTL_SECONDS"] = 0
+
+def test_deactivation_invalidates_cached_identity(app, client, buyer):
+    app.config["USER_CACHE_TTL_SECONDS"] = 30
+    try:
+        _login(client, buyer)
+        client.get("/buyer/dashboard")
+        buyer.is_active = False
+        db.session.commit()
+        invalidate_identity(buyer.id)
+        response = client.get("/buyer/dashboard")
+        assert response.status_code == 302
+        assert "/auth/login" in response.headers["Location"]
+    finally:
+        app.config["USER_CACHE_TTL_SECONDS"] = 0
+
+def test_anonymous_request_has_no_identity(app):
+    with app.test_request_context("/"):
+        assert current_identity() is None
+
+def test_credit_detail_uses_request_identity(client, query_budget, db):
+    seller = User(username="identityseller", email="identityseller@example.com", role=UserRole.SELLER, password_hash="unused")
+    db.session.add(seller)
+    db.session.commit()
+    credit = CarbonCredit(seller_id=seller.id, title="Unlisted", description="Desc", quantity=1, price_per_unit=1,
+                          status=CreditStatus.PENDING_APPROVAL)
+    db.session.add(credit)
+    db.session.commit()
+    credit_id = credit.id
+    identity_service._identity_cache.clear()
+    _login(client, seller)
+    _fresh_session()
+    with query_budget(10) as statements:
+        response = client.get(f"/credit/{credit_id}")
+    assert response.status_code == 200 # The owner may view their own pending credit
+    assert len(_user_lookups(statements)) <= 1 # credit_detail and the template share one lookup
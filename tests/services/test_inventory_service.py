@@ -0,0 +1,249 @@
+import threading
+import pytest
+from datetime import datetime, timedelta
+
+from src.models.models import User, UserRole, CarbonCredit, CreditStatus, Order, OrderStatus
+from src.services.counter_service import get_counters, credit_counter
+from src.services.inventory_service import (decrement_stock, confirm_order_stock, close_pending_order, reserve_stock, release_reservation,
+                                            release_expired_reservations, OrderAlreadyProcessed, InsufficientStock,
+                                            CreditUnavailable)
+
+@pytest.fixture
+def seller_and_buyer(db):
+    seller = User(username="stockseller", email="stockseller@example.com", role=UserRole.SELLER, password_hash="unused")
+    buyer = User(username="stockbuyer", email="stockbuyer@example.com", role=UserRole.BUYER, password_hash="unused")
+    db.session.add_all([seller, buyer])
+    db.session.commit()
+    return seller, buyer
+
+def _credit(db, seller, quantity, status=CreditStatus.APPROVED):
+    credit = CarbonCredit(seller_id=seller.id, title="Stock credit", description="Desc", quantity=quantity,
+                          price_per_unit=5, status=status)
+    db.session.add(credit)
+    db.session.commit()
+    return credit
+
+def _orders(db, seller, buyer, credit, quantities):
+    orders = [Order(buyer_id=buyer.id, seller_id=seller.id, credit_id=credit.id, quantity_ordered=quantity,
+                    price_per_unit_at_order=5, total_price=5 * quantity) for quantity in quantities]
+    db.session.add_all(orders)
+    db.session.commit()
+    return [order.id for order in orders]
+
+def test_decrement_stock_marks_the_credit_sold_in_the_same_statement(db, seller_and_buyer):
+    seller, _ = seller_and_buyer
+    credit = _credit(db, seller, 10)
+    get_counters() # Build the counters so the SOLD transition has to adjust them
+    assert decrement_stock(credit.id, 4) == 6
+    assert decrement_stock(credit.id, 7) is None
+    assert decrement_stock(credit.id, 6) == 0
+    db.session.commit()
+    assert (credit.quantity, credit.status) == (0, CreditStatus.SOLD)
+    counters = get_counters()
+    assert counters[credit_counter(CreditStatus.SOLD)] == 1
+    assert counters[credit_counter(CreditStatus.APPROVED)] == 0
+
+def test_confirm_order_stock_failures_leave_nothing_changed(db, seller_and_buyer):
+    seller, buyer = seller_and_buyer
+    credit = _credit(db, seller, 5)
+    big, small = _orders(db, seller, buyer, credit, [8, 2])
+
+    with pytest.raises(InsufficientStock):
+        confirm_order_stock(db.session.get(Order, big))
+    assert db.session.get(Order, big).status == OrderStatus.PENDING_SELLER_ACTION
+    assert db.session.get(CarbonCredit, credit.id).quantity == 5
+
+    confirm_order_stock(db.session.get(Order, small))
+    db.session.commit()
+    with pytest.raises(OrderAlreadyProcessed):
+        confirm_order_stock(db.session.get(Order, small))
+    assert db.session.get(CarbonCredit, credit.id).quantity == 3
+
+    credit.status = CreditStatus.DELISTED
+    db.session.commit()
+    with pytest.raises(CreditUnavailable):
+        confirm_order_stock(db.session.get(Order, big))
+
+def test_concurrent_confirmations_never_oversell(app, db, seller_and_buyer):
+    seller, buyer = seller_and_buyer
+    stock = 25
+    credit = _credit(db, seller, stock)
+    # 60 orders of 1-3 units (120 units demanded) plus every order submitted twice
+    order_ids = _orders(db, seller, buyer, credit, [1 + i % 3 for i in range(60)])
+    work = order_ids * 2
+    lock = threading.Lock()
+    outcomes = {"confirmed": [], "processed": 0, "insufficient": 0, "unavailable": 0}
+    start = threading.Barrier(16)
+
+    def confirm_worker(worker_index):
+        start.wait()
+        for order_id in work[worker_index::16]:
+            with app.app_context():
+                order = db.session.get(Order, order_id)
+                try:
+                    confirm_order_stock(order)
+                    db.session.commit()
+                    outcome = "confirmed"
+                except OrderAlreadyProcessed:
+                    outcome = "processed"
+                except InsufficientStock:
+                    outcome = "insufficient"
+                except CreditUnavailable:
+                    outcome = "unavailable"
+                finally:
+                    db.session.remove()
+            with lock:
+                if outcome == "confirmed":
+                    outcomes["confirmed"].append(order_id)
+                else:
+                    outcomes[outcome] += 1
+
+    threads = [threading.Thread(target=confirm_worker, args=(n,)) for n in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    db.session.expire_all()
+    confirmed = outcomes["confirmed"]
+    assert len(confirmed) == len(set(confirmed)) # No order was confirmed twice
+    sold = sum(db.session.get(Order, order_id).quantity_ordered for order_id in confirmed)
+    credit = db.session.get(CarbonCredit, credit.id)
+    assert sold <= stock
+    assert credit.quantity == stock - sold >= 0
+    assert (credit.status == CreditStatus.SOLD) == (credit.quantity == 0)
+    assert Order.query.filter_by(status=OrderStatus.CONFIRMED_BY_SELLER).count() == len(confirmed)
+    assert len(confirmed) + sum(outcomes[key] for key in ("processed", "insufficient", "unavailable")) == len(work)
+
+
+def test_rejections_racing_confirmations_never_undo_them(app, db, seller_and_buyer):
+    seller, buyer = seller_and_buyer
+    credit = _credit(db, seller, 40)
+    order_ids = _orders(db, seller, buyer, credit, [2] * 20)
+    for order_id in order_ids: # Every order holds its quantity, as placed through the buyer view
+        assert reserve_stock(credit.id, 2)
+        order = db.session.get(Order, order_id)
+        order.reserved_quantity = 2
+        order.reservation_expires_at = datetime.utcnow() + timedelta(hours=1)
+    db.session.commit()
+    start = threading.Barrier(8)
+
+    def worker(worker_index):
+        start.wait()
+        for order_id in order_ids[worker_index % 4::4]:
+            with app.app_context():
+                order = db.session.get(Order, order_id) # Read as pending by every worker
+                try:
+                    if worker_index < 4:
+                        confirm_order_stock(order)
+                    else:
+                        close_pending_order(order, OrderStatus.REJECTED_BY_SELLER, seller_remarks="Race")
+                    db.session.commit()
+                except OrderAlreadyProcessed:
+                    pass
+                finally:
+                    db.session.remove()
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    db.session.expire_all()
+    statuses = [db.session.get(Order, order_id).status for order_id in order_ids]
+    assert set(statuses) <= {OrderStatus.CONFIRMED_BY_SELLER, OrderStatus.REJECTED_BY_SELLER}
+    confirmed = statuses.count(OrderStatus.CONFIRMED_BY_SELLER)
+    credit = db.session.get(CarbonCredit, credit.id)
+    # Each order either sold its units or gave its hold back, never both or neither
+    assert (credit.quantity, credit.reserved_quantity) == (40 - 2 * confirmed, 0)
+
+def test_closing_a_stale_pending_order_keeps_the_confirmation(app, db, seller_and_buyer):
+    seller, buyer = seller_and_buyer
+    credit = _credit(db, seller, 10)
+    order_id, = _orders(db, seller, buyer, credit, [4])
+    stale = db.session.get(Order, order_id)
+    assert stale.status == OrderStatus.PENDING_SELLER_ACTION
+    with app.app_context(): # A concurrent request confirms it
+        confirm_order_stock(db.session.get(Order, order_id))
+        db.session.commit()
+        db.session.remove()
+
+    with pytest.raises(OrderAlreadyProcessed):
+        close_pending_order(stale, OrderStatus.CANCELLED_BY_BUYER)
+    assert db.session.get(Order, order_id).status == OrderStatus.CONFIRMED_BY_SELLER
+    assert db.session.get(CarbonCredit, credit.id).quantity == 6
+
+
+def _login(client, user):
+    with client.session_transaction() as sess:
+        sess["user_id"] = user.id
+        sess["username"] = user.username
+        sess["role"] = user.role.value
+
+def test_placing_an_order_holds_stock_until_cancelled(client, db, seller_and_buyer):
+    seller, buyer = seller_and_buyer
+    credit = _credit(db, seller, 10)
+    _login(client, buyer)
+
+    client.post(f"/buyer/order/create/{credit.id}", data={"quantity": "6"})
+    db.session.expire_all()
+    order = Order.query.filter_by(credit_id=credit.id).one()
+    assert (order.reserved_quantity, credit.reserved_quantity, credit.available_quantity) == (6, 6, 4)
+    assert order.reservation_expires_at > datetime.utcnow()
+    assert b"6.0 of 10.0 reserved" in client.get(f"/credit/{credit.id}").data
+
+    # Only the unreserved 4 units can be ordered
+    response = client.post(f"/buyer/order/create/{credit.id}", data={"quantity": "5"}, follow_redirects=True)
+    assert b"exceeds available stock (4.0)" in response.data
+    assert Order.query.filter_by(credit_id=credit.id).count() == 1
+
+    client.post(f"/buyer/order/{order.id}/cancel")
+    db.session.expire_all()
+    assert (order.status, order.reserved_quantity, order.reservation_expires_at) == (OrderStatus.CANCELLED_BY_BUYER, 0, None)
+    assert (credit.quantity, credit.reserved_quantity) == (10, 0)
+
+def test_confirming_converts_the_hold_into_a_sale(db, seller_and_buyer):
+    seller, buyer = seller_and_buyer
+    credit = _credit(db, seller, 10)
+    held, unreserved = _orders(db, seller, buyer, credit, [6, 4])
+    assert reserve_stock(credit.id, 6)
+    db.session.get(Order, held).reserved_quantity = 6
+    db.session.get(Order, held).reservation_expires_at = datetime.utcnow() + timedelta(hours=1)
+    db.session.commit()
+
+    confirm_order_stock(db.session.get(Order, held))
+    db.session.commit()
+    assert (credit.quantity, credit.reserved_quantity) == (4, 0)
+    assert db.session.get(Order, held).reservation_expires_at is None
+    assert release_reservation(db.session.get(Order, held)) == 0 # Nothing left to give back
+
+    # An order without a hold can only take unreserved stock
+    assert reserve_stock(credit.id, 1)
+    db.session.commit()
+    with pytest.raises(InsufficientStock):
+        confirm_order_stock(db.session.get(Order, unreserved))
+
+def test_sweeper_releases_expired_reservations(db, seller_and_buyer):
+    seller, buyer = seller_and_buyer
+    credit = _credit(db, seller, 10)
+    expired, live = _orders(db, seller, buyer, credit, [3, 2])
+    now = datetime.utcnow()
+    for order_id, quantity, expires_at in ((expired, 3, now - timedelta(minutes=1)), (live, 2, now + timedelta(hours=1))):
+        assert reserve_stock(credit.id, quantity)
+        order = db.session.get(Order, order_id)
+        order.reserved_quantity, order.reservation_expires_at = quantity, expires_at
+    db.session.commit()
+
+    assert release_expired_reservations(now=now, batch_size=1) == 1
+    assert release_expired_reservations(now=now) == 0
+    db.session.expire_all()
+    assert credit.reserved_quantity == 2
+    expired_order = db.session.get(Order, expired)
+    assert (expired_order.status, expired_order.reservation_expires_at) == (OrderStatus.PENDING_SELLER_ACTION, None)
+    assert db.session.get(Order, live).reservation_expires_at is not None
+
+    # The expired order can still be confirmed from unreserved stock
+    confirm_order_stock(expired_order)
+    db.session.commit()
+    assert (credit.quantity, credit.reserved_quantity) == (7, 2)
@@ -0,0 +1,114 @@
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from src.services.job_service import (register_job_handler, enqueue_job, claim_next_job, run_job, run_pending_jobs,
+                                      requeue_stale_jobs, register_periodic_task, run_periodic_tasks)
+from src.services.certificate_service import request_certificate, CERTIFICATE_JOB
+from src.models.models import User, UserRole, CarbonCredit, CreditStatus, Order, OrderStatus, CertificateStatus, BackgroundJob, JobStatus, db
+
+@pytest.fixture
+def confirmed_order(db):
+    seller = User(username="jobseller", email="jobseller@example.com", role=UserRole.SELLER, password_hash="unused")
+    buyer = User(username="jobbuyer", email="jobbuyer@example.com", role=UserRole.BUYER, password_hash="unused")
+    db.session.add_all([seller, buyer])
+    db.session.commit()
+    credit = CarbonCredit(seller_id=seller.id, title="Job Credit", description="Desc", quantity=90,
+                          price_per_unit=10, status=CreditStatus.APPROVED)
+    db.session.add(credit)
+    db.session.commit()
+    order = Order(buyer_id=buyer.id, seller_id=seller.id, credit_id=credit.id, quantity_ordered=10,
+                  price_per_unit_at_order=10, total_price=100, status=OrderStatus.CONFIRMED_BY_SELLER)
+    db.session.add(order)
+    db.session.commit()
+    return order
+
+def test_claim_is_exclusive_and_ordered(app, db):
+    first = enqueue_job("noop", 1)
+    second = enqueue_job("noop", 2)
+    db.session.commit()
+
+    claimed = claim_next_job()
+    assert claimed.id == first.id
+    assert claimed.status == JobStatus.RUNNING
+    assert claimed.attempts == 1
+    assert claim_next_job().id == second.id
+    assert claim_next_job() is None
+
+def test_failed_job_is_retried_then_marked_failed(app, db):
+    failures = []
+    def always_fails(entity_id):
+        raise RuntimeError("boom")
+    register_job_handler("flaky", always_fails, on_failure=lambda entity_id, error: failures.append(entity_id))
+
+    job = enqueue_job("flaky", 7, max_attempts=2)
+    db.session.commit()
+
+    assert run_job(claim_next_job()) is False
+    job = db.session.get(BackgroundJob, job.id)
+    assert job.status == JobStatus.QUEUED
+    assert job.run_after > datetime.utcnow() # Backoff before the retry
+    assert "boom" in job.last_error
+
+    job.run_after = datetime.utcnow()
+    db.session.commit()
+    assert run_job(claim_next_job()) is False
+    job = db.session.get(BackgroundJob, job.id)
+    assert job.status == JobStatus.FAILED
+    assert job.attempts == 2
+    assert failures == [7]
+
+def test_stale_running_jobs_are_requeued(app, db):
+    job = enqueue_job("noop", 1)
+    db.session.commit()
+    claim_next_job()
+    job = db.session.get(BackgroundJob, job.id)
+    job.started_at = datetime.utcnow() - timedelta(hours=1)
+    db.session.commit()
+
+    assert requeue_stale_jobs(stale_after_seconds=60) == 1
+    assert db.session.get(BackgroundJob, job.id).status == JobStatus.QUEUED
+
+@patch("src.services.certificate_service.sign_pdf_document", return_value="cert.pdf.p7m")
+@patch("src.services.certificate_service.generate_certificate_pdf", return_value="cert.pdf")
+def test_certificate_job_completes_order(mock_generate, mock_sign, app, confirmed_order):
+    request_certificate(confirmed_order)
+    db.session.commit()
+    assert confirmed_order.certificate_status == CertificateStatus.PENDING
+
+    assert run_pending_jobs() == 1
+    order = db.session.get(Order, confirmed_order.id)
+    assert order.status == OrderStatus.COMPLETED
+    assert order.certificate_status == CertificateStatus.READY
+    assert order.signed_pdf_certificate_filename == "cert.pdf.p7m"
+    assert order.completion_date is not None
+    job = BackgroundJob.query.filter_by(job_type=CERTIFICATE_JOB, related_entity_id=order.id).one()
+    assert job.status == JobStatus.SUCCEEDED
+
+@patch("src.services.certificate_service.sign_pdf_document", return_value=None)
+@patch("src.services.certificate_service.generate_certificate_pdf", return_value="cert.pdf")
+def test_certificate_job_failure_marks_order(mock_generate, mock_sign, app, confirmed_order):
+    app.config["CERTIFICATE_JOB_MAX_ATTEMPTS"] = 1
+    try:
+        request_certificate(confirmed_order)
+        db.session.commit()
+        run_pending_jobs()
+    finally:
+        app.config["CERTIFICATE_JOB_MAX_ATTEMPTS"] = 3
+    order = db.session.get(Order, confirmed_order.id)
+    assert order.status == OrderStatus.CONFIRMED_BY_SELLER
+    assert order.certificate_status == CertificateStatus.FAILED
+
+def test_periodic_tasks_run_on_their_interval(app):
+    calls = []
+    with patch.dict("src.services.job_service._periodic_tasks", clear=True), \
+         patch.dict(app.config, {"TEST_SWEEP_INTERVAL_SECONDS": 60}):
+        register_periodic_task("sweep", lambda: calls.append(1), "TEST_SWEEP_INTERVAL_SECONDS")
+        last_runs = {}
+        start = datetime(2024, 1, 1)
+        assert run_periodic_tasks(last_runs, now=start) == ["sweep"]
+        assert run_periodic_tasks(last_runs, now=start + timedelta(seconds=30)) == []
+        assert run_periodic_tasks(last_runs, now=start + timedelta(seconds=61)) == ["sweep"]
+        app.config["TEST_SWEEP_INTERVAL_SECONDS"] = 0 # Disabled
+        assert run_periodic_tasks(last_runs, now=start + timedelta(hours=1)) == []
+    assert len(calls) == 2
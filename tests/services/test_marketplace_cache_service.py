@@ -0,0 +1,91 @@
+import pytest
+
+from src.models.models import db, User, UserRole, CarbonCredit, CreditStatus
+from src.services.counter_service import get_marketplace_generation
+from src.services.inventory_service import decrement_stock
+from src.services.moderation_service import moderate_credits
+from src.services.marketplace_cache_service import MarketplaceCache, marketplace_cache_stats, CACHE_EXTENSION_KEY
+
+@pytest.fixture
+def listed(app, db):
+    app.extensions.pop(CACHE_EXTENSION_KEY, None) # Fresh statistics
+    seller = User(username="cacheseller", email="cacheseller@example.com", role=UserRole.SELLER, password_hash="unused")
+    db.session.add(seller)
+    db.session.commit()
+    credits = [CarbonCredit(seller_id=seller.id, title=f"Cached credit {i}", description="Desc", quantity=5,
+                            price_per_unit=10 + i, status=CreditStatus.APPROVED, source_project_type="Solar")
+               for i in range(3)]
+    pending = CarbonCredit(seller_id=seller.id, title="Awaiting review", description="Desc", quantity=5,
+                           price_per_unit=1, status=CreditStatus.PENDING_APPROVAL)
+    db.session.add_all(credits + [pending])
+    db.session.commit()
+    return seller, credits, pending
+
+def _get(client, url="/marketplace"):
+    db.session.expire_all() # A fresh request would not see objects loaded by an earlier one
+    response = client.get(url)
+    return response.headers["X-Marketplace-Cache"], response.get_data(as_text=True)
+
+def test_repeated_pages_are_served_from_the_cache(client, listed):
+    assert _get(client)[0] == "miss"
+    status, page = _get(client)
+    assert status == "hit"
+    assert all(f"Cached credit {i}" in page for i in range(3))
+
+    # Equivalent URLs share the entry; other filters, sorts and pages get their own
+    assert _get(client, "/marketplace?sort_by=latest&project_type=")[0] == "hit"
+    assert _get(client, "/marketplace?sort_by=price_asc")[0] == "miss"
+    assert _get(client, "/marketplace?page=1")[0] == "miss"
+    assert _get(client, "/marketplace?page=1")[0] == "hit"
+
+    stats = marketplace_cache_stats()
+    assert (stats["hits"], stats["misses"]) == (3, 3)
+    assert stats["hit_rate"] == 0.5
+
+def test_listing_changes_invalidate_cached_pages(client, listed):
+    seller, credits, pending = listed
+    _get(client)
+    generation = get_marketplace_generation()
+
+    pending.title = "Still awaiting review" # Not listed, so cached pages stay valid
+    db.session.commit()
+    assert get_marketplace_generation() == generation
+    assert _get(client)[0] == "hit"
+
+    pending.status = CreditStatus.APPROVED
+    db.session.commit()
+    status, page = _get(client)
+    assert status == "miss"
+    assert "Still awaiting review" in page
+
+    decrement_stock(credits[0].id, 5) # Sold out
+    db.session.commit()
+    status, page = _get(client)
+    assert status == "miss"
+    assert "Cached credit 0" not in page
+
+def test_bulk_moderation_invalidates_cached_pages(client, listed):
+    seller, _, pending = listed
+    _get(client)
+    moderate_credits([pending.id], CreditStatus.APPROVED, seller.id, None)
+    db.session.commit()
+    status, page = _get(client)
+    assert status == "miss"
+    assert "Awaiting review" in page
+
+def test_lru_eviction_and_size_cap():
+    cache = MarketplaceCache(max_entries=2)
+    assert cache.get(1, "a") is None
+    cache.put(1, "a", "page a")
+    cache.put(1, "b", "page b")
+    assert cache.get(1, "a") == "page a" # a is now the most recently used
+    cache.put(1, "c", "page c")
+    assert cache.get(1, "b") is None
+    assert cache.get(1, "c") == "page c"
+    assert cache.stats()["evictions"] == 1
+
+    # A new generation empties the cache, and results computed under the old one are dropped
+    assert cache.get(2, "a") is None
+    cache.put(1, "a", "stale page")
+    assert cache.get(2, "a") is None
+    assert cache.stats()["invalidations"] == 1
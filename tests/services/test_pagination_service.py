@@ -0,0 +1,94 @@
+import base64
+import json
+import pytest
+from datetime import datetime, timedelta
+from werkzeug.security import generate_password_hash
+
+from src.services.pagination_service import keyset_paginate, encode_cursor, decode_cursor
+from src.models.models import User, UserRole, CarbonCredit, CreditStatus, db
+
+@pytest.fixture
+def many_credits(db):
+    seller = User(username="pageseller", email="pageseller@example.com", role=UserRole.SELLER,
+                  password_hash=generate_password_hash("pass", method="pbkdf2:sha256"))
+    db.session.add(seller)
+    db.session.commit()
+    base_time = datetime(2024, 1, 1)
+    credits = []
+    for i in range(25):
+        credits.append(CarbonCredit(
+            seller_id=seller.id, title=f"Credit {i:02d}", description="Desc",
+            quantity=10, price_per_unit=float(i % 5), # Repeated prices exercise the id tiebreaker
+            submitted_at=base_time + timedelta(minutes=i), status=CreditStatus.APPROVED
+        ))
+    db.session.add_all(credits)
+    db.session.commit()
+    return credits
+
+def test_cursor_round_trip():
+    submitted = datetime(2024, 5, 1, 12, 30, 15, 123456)
+    cursor = encode_cursor("latest", submitted, 42, "next")
+    assert decode_cursor(cursor, "latest") == {"value": submitted, "id": 42, "direction": "next"}
+    assert decode_cursor(cursor, "price_asc") is None # Cursor from another sort order
+    assert decode_cursor("not-a-cursor", "latest") is None
+
+def test_keyset_pages_forward_and_back(app, many_credits):
+    seen = []
+    cursor = None
+    pages = []
+    while True:
+        page = keyset_paginate(CarbonCredit.query, CarbonCredit.price_per_unit, CarbonCredit.id,
+                               sort_key="price_asc", descending=False, cursor=cursor, per_page=7)
+        pages.append(page)
+        seen.extend(credit.id for credit in page.items)
+        if not page.has_next:
+            break
+        cursor = page.next_cursor
+
+    expected = [c.id for c in sorted(many_credits, key=lambda c: (c.price_per_unit, c.id))]
+    assert seen == expected
+    assert [len(p.items) for p in pages] == [7, 7, 7, 4]
+    assert not pages[0].has_prev
+
+    # Walking back from the last page returns the previous page unchanged
+    back = keyset_paginate(CarbonCredit.query, CarbonCredit.price_per_unit, CarbonCredit.id,
+                           sort_key="price_asc", descending=False, cursor=pages[-1].prev_cursor, per_page=7)
+    assert [c.id for c in back.items] == [c.id for c in pages[-2].items]
+    assert back.has_next and back.has_prev
+
+def test_keyset_total_is_optional(app, many_credits):
+    page = keyset_paginate(CarbonCredit.query, CarbonCredit.submitted_at, CarbonCredit.id, sort_key="latest", per_page=5)
+    assert page.total is None
+    page = keyset_paginate(CarbonCredit.query, CarbonCredit.submitted_at, CarbonCredit.id, sort_key="latest", per_page=5, with_total=True)
+    assert page.total == 25
+    assert page.items[0].title == "Credit 24"
+
+def test_marketplace_cursor_navigation(client, many_credits):
+    response = client.get("/marketplace")
+    assert response.status_code == 200
+    assert b"Credit 24" in response.data
+    assert b"cursor=" in response.data
+
+    legacy = client.get("/marketplace?page=3")
+    assert legacy.status_code == 200
+    assert b"Credit 06" in legacy.data
+
+def _crafted_cursor(sort_key, value, row_id=3):
+    payload = json.dumps({"s": sort_key, "v": value, "i": row_id, "d": "next"})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+@pytest.mark.parametrize("value, row_id", [
+    ([1, 2], 3), ({"a": 1}, 3), ({"dt": "not a date"}, 3), ({"dt": 5}, 3),
+    (10 ** 400, 3), ("cheap", 3), (float("nan"), 3), (True, 3), (2.5, 10 ** 30), (2.5, [3]),
+])
+def test_crafted_cursors_restart_from_the_first_page(client, many_credits, value, row_id):
+    for sort_by in ("price_asc", "price_desc"):
+        cursor = _crafted_cursor(sort_by, value, row_id)
+        assert decode_cursor(cursor, sort_by, float) is None
+        response = client.get(f"/marketplace?sort_by={sort_by}&cursor={cursor}")
+        assert response.status_code == 200
+
+def test_cursor_values_are_converted_to_the_column_type():
+    assert decode_cursor(_crafted_cursor("price_asc", 3), "price_asc", float)["value"] == 3.0
+    assert decode_cursor(_crafted_cursor("latest", 3.5), "latest", datetime) is None
+    assert decode_cursor(_crafted_cursor("id", 4.0), "id", int)["value"] == 4
@@ -0,0 +1,80 @@
+import threading
+import pytest
+from unittest.mock import patch
+from werkzeug.security import generate_password_hash, check_password_hash
+
+from src.services.password_service import PasswordHasher, PasswordHasherBusy, needs_rehash, hash_password, verify_password
+from src.models.models import User, UserRole, db
+
+@pytest.fixture
+def hash_method(app):
+    def _set(method):
+        app.config["PASSWORD_HASH_METHOD"] = method
+    yield _set
+    app.config["PASSWORD_HASH_METHOD"] = "pbkdf2:sha256"
+
+def test_hasher_rejects_work_beyond_its_queue():
+    hasher = PasswordHasher(max_workers=1, max_pending=1)
+    release = threading.Event()
+    started = threading.Event()
+    def slow_hash():
+        started.set()
+        release.wait(5)
+        return "done"
+
+    results = []
+    running = threading.Thread(target=lambda: results.append(hasher.run(slow_hash)))
+    running.start()
+    started.wait(5)
+    queued = threading.Thread(target=lambda: results.append(hasher.run(lambda: "queued")))
+    queued.start()
+
+    with pytest.raises(PasswordHasherBusy): # One running + one queued fills it
+        hasher.run(lambda: "rejected")
+    assert hasher.rejected == 1
+
+    release.set()
+    running.join(5)
+    queued.join(5)
+    assert sorted(results) == ["done", "queued"]
+    assert hasher.run(lambda: "free again") == "free again" # Slots are returned once work finishes
+    hasher.shutdown()
+
+def test_needs_rehash_compares_work_factor(app, hash_method):
+    default_hash = generate_password_hash("secret", method="pbkdf2:sha256")
+    assert not needs_rehash(default_hash) # "pbkdf2:sha256" means werkzeug's default iterations
+    hash_method("pbkdf2:sha256:1000")
+    assert needs_rehash(default_hash)
+    assert not needs_rehash(generate_password_hash("secret", method="pbkdf2:sha256:1000"))
+    hash_method("scrypt")
+    assert not needs_rehash(generate_password_hash("secret", method="scrypt"))
+
+def test_hash_and_verify_run_on_pool(app, hash_method):
+    hash_method("pbkdf2:sha256:1000")
+    password_hash = hash_password("secret")
+    assert password_hash.startswith("pbkdf2:sha256:1000$")
+    assert verify_password(password_hash, "secret")
+    assert not verify_password(password_hash, "wrong")
+
+def test_login_rehashes_outdated_password(client, db, hash_method):
+    user = User(username="rehashuser", email="rehash@example.com", role=UserRole.BUYER,
+                password_hash=generate_password_hash("secret", method="pbkdf2:sha256:1000"))
+    db.session.add(user)
+    db.session.commit()
+    hash_method("pbkdf2:sha256:2000")
+
+    response = client.post("/auth/login", data={"username": "rehashuser", "password": "secret"})
+
+    assert response.status_code == 302
+    user = db.session.get(User, user.id)
+    assert user.password_hash.startswith("pbkdf2:sha256:2000$")
+    assert check_password_hash(user.password_hash, "secret")
+
+@patch("src.routes.auth.verify_password", side_effect=PasswordHasherBusy)
+def test_login_returns_503_when_hashing_is_saturated(mock_verify, client, db):
+    db.session.add(User(username="busyuser", email="busy@example.com", role=UserRole.BUYER, password_hash="unused"))
+    db.session.commit()
+    response = client.post("/auth/login", data={"username": "busyuser", "password": "secret"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert "busy" in response.get_data(as_text=True)
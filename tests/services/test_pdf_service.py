@@ -2,7 +2,7 @@ import pytest
 import os
 from unittest.mock import patch, MagicMock
 
-from src.services.pdf_service import generate_certificate_pdf
+from src.services.pdf_service import generate_certificate_pdf, CertificateRenderer, get_certificate_renderer
 from src.models.models import Order, User, CarbonCredit, OrderStatus, CreditStatus, UserRole, db
 
 # Fixture for a sample order, buyer, seller, and credit
@@ -109,3 +109,54 @@ def test_generate_certificate_pdf_makedirs_exception(mock_render_template, mock_
     # render_template might still be called before makedirs, depending on implementation order
     # In the current pdf_service, render_template is called before path creation for the file itself.
     mock_render_template.assert_called_once()
+
+@patch("src.services.pdf_service.FontConfiguration")
+@patch("src.services.pdf_service.CSS")
+@patch("src.services.pdf_service.HTML")
+def test_certificate_renderer_parses_stylesheet_once(mock_html, mock_css, mock_font_config, tmp_path):
+    """The shared stylesheet and font configuration are reused across renders."""
+    stylesheet_path = tmp_path / "certificate_pdf.css"
+    stylesheet_path.write_text("body { color: #333; }")
+    renderer = CertificateRenderer(base_url=str(tmp_path), stylesheet_path=str(stylesheet_path))
+
+    for i in range(3):
+        renderer.render(f"<html><body>Certificate {i}</body></html>", str(tmp_path / f"cert_{i}.pdf"))
+
+    mock_css.assert_called_once_with(filename=str(stylesheet_path), font_config=mock_font_config.return_value)
+    mock_font_config.assert_called_once()
+    assert mock_html.call_count == 3
+    mock_html.return_value.write_pdf.assert_called_with(str(tmp_path / "cert_2.pdf"),
+                                                        stylesheets=[mock_css.return_value],
+                                                        font_config=mock_font_config.return_value)
+    metrics = renderer.metrics()
+    assert metrics["renders"] == 3
+    assert metrics["failures"] == 0
+    assert metrics["stylesheet_loads"] == 1
+    assert metrics["avg_render_ms"] is not None
+
+    # Editing the stylesheet invalidates the parsed copy
+    os.utime(stylesheet_path, (0, 0))
+    renderer.render("<html></html>", str(tmp_path / "cert_3.pdf"))
+    assert mock_css.call_count == 2
+    assert renderer.metrics()["stylesheet_loads"] == 2
+
+@patch("src.services.pdf_service.FontConfiguration")
+@patch("src.services.pdf_service.CSS")
+@patch("src.services.pdf_service.HTML")
+def test_certificate_renderer_counts_failures(mock_html, mock_css, mock_font_config, tmp_path):
+    stylesheet_path = tmp_path / "certificate_pdf.css"
+    stylesheet_path.write_text("body { color: #333; }")
+    renderer = CertificateRenderer(base_url=str(tmp_path), stylesheet_path=str(stylesheet_path))
+    mock_html.return_value.write_pdf.side_effect = Exception("layout failed")
+
+    with pytest.raises(Exception, match="layout failed"):
+        renderer.render("<html></html>", str(tmp_path / "cert.pdf"))
+    assert renderer.metrics()["failures"] == 1
+    assert renderer.metrics()["renders"] == 0
+
+def test_certificate_renderer_is_shared_per_app(app):
+    with app.app_context():
+        renderer = get_certificate_renderer()
+        assert get_certificate_renderer() is renderer
+        assert renderer.stylesheet_path == os.path.join(app.root_path, "static", "css", "certificate_pdf.css")
+        assert os.path.exists(renderer.stylesheet_path)
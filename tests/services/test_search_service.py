@@ -0,0 +1,65 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+from src.services.search_service import build_match_expression, apply_keyword_search, rebuild_search_index, search_index_available, FTS_TABLE
+from src.models.models import User, UserRole, CarbonCredit, CreditStatus, db
+
+@pytest.fixture
+def search_seller(db):
+    seller = User(username="searchseller", email="searchseller@example.com", role=UserRole.SELLER,
+                  password_hash=generate_password_hash("pass", method="pbkdf2:sha256"))
+    db.session.add(seller)
+    db.session.commit()
+    return seller
+
+@pytest.fixture
+def searchable_credits(db, search_seller):
+    credits = [
+        CarbonCredit(seller_id=search_seller.id, title="Solar Farm Nevada", description="Photovoltaic plant",
+                     quantity=100, price_per_unit=10, source_project_type="Solar", source_project_location="Nevada, USA",
+                     status=CreditStatus.APPROVED),
+        CarbonCredit(seller_id=search_seller.id, title="Mangrove Restoration", description="Coastal project with solar pumps",
+                     quantity=50, price_per_unit=20, source_project_type="Forestry Carbon Sink", source_project_location="Kenya",
+                     status=CreditStatus.APPROVED),
+        CarbonCredit(seller_id=search_seller.id, title="Wind Park", description="Onshore wind",
+                     quantity=70, price_per_unit=15, source_project_type="Wind Power", source_project_location="Denmark",
+                     status=CreditStatus.APPROVED),
+    ]
+    db.session.add_all(credits)
+    db.session.commit()
+    return credits
+
+def test_build_match_expression_quotes_and_prefixes():
+    assert build_match_expression("sol farm") == '"sol"* "farm"*'
+    assert build_match_expression('solar" OR x') == '"solar"* "OR"* "x"*'
+    assert build_match_expression("  !! ") is None
+
+def test_index_created_with_tables(app, db):
+    assert search_index_available()
+
+def test_prefix_search_ranks_title_matches_first(app, searchable_credits):
+    query = apply_keyword_search(CarbonCredit.query, "sol", rank_results=True)
+    titles = [credit.title for credit in query.all()]
+    assert titles == ["Solar Farm Nevada", "Mangrove Restoration"]
+
+def test_index_follows_updates_and_deletes(app, searchable_credits):
+    wind = searchable_credits[2]
+    wind.description = "Onshore wind with battery storage"
+    db.session.commit()
+    assert [c.id for c in apply_keyword_search(CarbonCredit.query, "battery").all()] == [wind.id]
+
+    db.session.delete(wind)
+    db.session.commit()
+    assert apply_keyword_search(CarbonCredit.query, "battery").all() == []
+
+def test_rebuild_search_index(app, searchable_credits):
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('delete-all')")
+    assert rebuild_search_index() == 3
+    assert len(apply_keyword_search(CarbonCredit.query, "denmark").all()) == 1
+
+def test_marketplace_keyword_search(client, searchable_credits):
+    response = client.get("/marketplace?keyword=nevad")
+    assert response.status_code == 200
+    assert b"Solar Farm Nevada" in response.data
+    assert b"Wind Park" not in response.data
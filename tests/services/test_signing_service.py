@@ -3,12 +3,22 @@ import os
 import subprocess
 from unittest.mock import patch, MagicMock
 
-from src.services.signing_service import sign_pdf_document
+import shutil
+from src.services.signing_service import (sign_pdf_document, load_signer, sign_data_in_process, sign_pdf_batch,
+                                          verify_certificate_proof, build_merkle_tree, merkle_proof,
+                                          merkle_root_from_proof, merkle_leaf_hash)
 from src.models.models import db # Required for app context, though not directly used here
 
 # Dummy PDF filename for testing
 DUMMY_UNSIGNED_PDF = "test_certificate_to_sign.pdf"
 
+@pytest.fixture
+def openssl_backend(app):
+    """Forces the OpenSSL CLI signing path (the default backend signs in-process)."""
+    app.config["SIGNING_BACKEND"] = "openssl"
+    yield
+    app.config["SIGNING_BACKEND"] = "inprocess"
+
 @pytest.fixture
 def create_dummy_unsigned_pdf(app):
     """Creates a dummy unsigned PDF file in the test upload/certificates directory."""
@@ -24,7 +34,7 @@ def create_dummy_unsigned_pdf(app):
         os.remove(dummy_pdf_path)
 
 @patch("src.services.signing_service.subprocess.Popen")
-def test_sign_pdf_document_success(mock_subproc_popen, app, create_dummy_unsigned_pdf):
+def test_sign_pdf_document_success(mock_subproc_popen, app, openssl_backend, create_dummy_unsigned_pdf):
     """Test successful PDF signing."""
     unsigned_pdf_filename = create_dummy_unsigned_pdf
     
@@ -84,7 +94,7 @@ def test_sign_pdf_document_certs_not_found(mock_os_path_exists, app, create_dumm
     assert mock_os_path_exists.call_count >= 2 
 
 @patch("src.services.signing_service.subprocess.Popen")
-def test_sign_pdf_document_openssl_failure(mock_subproc_popen, app, create_dummy_unsigned_pdf):
+def test_sign_pdf_document_openssl_failure(mock_subproc_popen, app, openssl_backend, create_dummy_unsigned_pdf):
     """Test signing when OpenSSL command fails (returns non-zero exit code)."""
     unsigned_pdf_filename = create_dummy_unsigned_pdf
 
@@ -108,7 +118,7 @@ def test_sign_pdf_document_openssl_failure(mock_subproc_popen, app, create_dummy
     assert not os.path.exists(dummy_signed_path) # Check if dummy signed file was removed
 
 @patch("src.services.signing_service.subprocess.Popen")
-def test_sign_pdf_document_subprocess_exception(mock_subproc_popen, app, create_dummy_unsigned_pdf):
+def test_sign_pdf_document_subprocess_exception(mock_subproc_popen, app, openssl_backend, create_dummy_unsigned_pdf):
     """Test signing when subprocess.Popen raises an exception."""
     unsigned_pdf_filename = create_dummy_unsigned_pdf
     mock_subproc_popen.side_effect = OSError("Failed to start OpenSSL")
@@ -121,3 +131,99 @@ def test_sign_pdf_document_subprocess_exception(mock_subproc_popen, app, create_
     assert signed_filename is None
     mock_subproc_popen.assert_called_once()
 
+
+
+# --- In-process signing ---
+def test_sign_pdf_document_in_process(app, create_dummy_unsigned_pdf):
+    """The default backend signs without spawning openssl and produces a verifiable attached CMS signature."""
+    with patch("src.services.signing_service.subprocess.Popen") as mock_popen:
+        with app.app_context():
+            signed_filename = sign_pdf_document(create_dummy_unsigned_pdf)
+    assert signed_filename == "test_certificate_to_sign.pdf.p7m"
+    mock_popen.assert_not_called()
+
+    signed_path = os.path.join(app.config["UPLOAD_FOLDER"], "certificates", "signed", signed_filename)
+    with open(signed_path, "rb") as f:
+        signed_data = f.read()
+    assert signed_data[:1] == b"\x30" # DER SEQUENCE
+    assert b"%PDF-1.4\n%test content" in signed_data # Content attached (-nodetach)
+
+    if shutil.which("openssl"):
+        # -noverify skips chain validation of the self-signed platform certificate; the signature itself is checked
+        result = subprocess.run(["openssl", "cms", "-verify", "-noverify", "-binary", "-inform", "DER", "-in", signed_path],
+                                capture_output=True)
+        assert result.returncode == 0, result.stderr
+        assert result.stdout == b"%PDF-1.4\n%test content"
+    os.remove(signed_path)
+
+def test_signer_is_cached(app):
+    certs_dir = os.path.join(app.root_path, "certs")
+    cert_path = os.path.join(certs_dir, "platform_certificate.pem")
+    key_path = os.path.join(certs_dir, "platform_private_key.pem")
+    first = load_signer(cert_path, key_path)
+    with patch("builtins.open") as mock_open:
+        second = load_signer(cert_path, key_path)
+    mock_open.assert_not_called()
+    assert first[0] is second[0] and first[1] is second[1]
+
+@patch("src.services.signing_service.sign_data_in_process", side_effect=RuntimeError("unsupported key"))
+@patch("src.services.signing_service.subprocess.Popen")
+def test_in_process_failure_falls_back_to_openssl(mock_subproc_popen, mock_sign_in_process, app, create_dummy_unsigned_pdf):
+    mock_process = MagicMock()
+    mock_process.communicate.return_value = (b"", b"")
+    mock_process.returncode = 0
+    mock_subproc_popen.return_value = mock_process
+
+    with app.app_context():
+        signed_filename = sign_pdf_document(create_dummy_unsigned_pdf)
+    assert signed_filename == "test_certificate_to_sign.pdf.p7m"
+    mock_sign_in_process.assert_called_once()
+    mock_subproc_popen.assert_called_once()
+
+# --- Batch (Merkle root) signing ---
+@pytest.mark.parametrize("leaf_count", [1, 2, 3, 5, 8, 9])
+def test_merkle_proofs_lead_to_root(leaf_count):
+    leaves = [merkle_leaf_hash(bytes([i]) * 32) for i in range(leaf_count)]
+    levels = build_merkle_tree(leaves)
+    root = levels[-1][0]
+    for index, leaf in enumerate(leaves):
+        assert merkle_root_from_proof(leaf, merkle_proof(levels, index)) == root
+    if leaf_count > 1:
+        assert merkle_root_from_proof(leaves[0], merkle_proof(levels, 1)) != root
+
+@pytest.fixture
+def batch_pdfs(app):
+    folder = os.path.join(app.config["UPLOAD_FOLDER"], "certificates")
+    filenames = []
+    for i in range(5):
+        filename = f"batch_test_{i}.pdf"
+        with open(os.path.join(folder, filename), "wb") as f:
+            f.write(b"%PDF-1.4\n%batch certificate " + bytes(str(i), "utf-8"))
+        filenames.append(filename)
+    yield filenames
+    for filename in filenames:
+        os.remove(os.path.join(folder, filename))
+
+def test_sign_pdf_batch_signs_root_once(app, batch_pdfs):
+    with patch("src.services.signing_service.sign_data_in_process", wraps=sign_data_in_process) as mock_sign:
+        with app.app_context():
+            result = sign_pdf_batch(batch_pdfs)
+    assert mock_sign.call_count == 1
+    assert set(result["proofs"]) == set(batch_pdfs)
+
+    signed_folder = os.path.join(app.config["UPLOAD_FOLDER"], "certificates", "signed")
+    signature_path = os.path.join(signed_folder, "batches", result["signature_filename"])
+    assert os.path.exists(signature_path)
+    if not shutil.which("openssl"):
+        pytest.skip("OpenSSL CLI required to verify the root signature")
+
+    cert_path = os.path.join(app.root_path, "certs", "platform_certificate.pem")
+    for filename, proof_filename in result["proofs"].items():
+        pdf_path = os.path.join(app.config["UPLOAD_FOLDER"], "certificates", filename)
+        assert verify_certificate_proof(pdf_path, os.path.join(signed_folder, proof_filename), signature_path, cert_path)
+
+    # A modified certificate no longer matches its proof
+    tampered_path = os.path.join(app.config["UPLOAD_FOLDER"], "certificates", batch_pdfs[2])
+    with open(tampered_path, "ab") as f:
+        f.write(b"tampered")
+    assert not verify_certificate_proof(tampered_path, os.path.join(signed_folder, result["proofs"][batch_pdfs[2]]), signature_path, cert_path)
@@ -0,0 +1,184 @@
+import hashlib
+import io
+import os
+import threading
+import time
+import pytest
+from werkzeug.datastructures import FileStorage
+
+from src.models.models import User, UserRole, CarbonCredit, CreditStatus, StoredFile, UploadedFile
+from src.services.upload_store_service import (store_upload, release_upload, sweep_unreferenced_uploads,
+                                               storage_path, INCOMING_FOLDER)
+
+PDF = b"%PDF-1.4 verification report" * 100
+DIGEST = hashlib.sha256(PDF).hexdigest()
+
+@pytest.fixture
+def seller(db):
+    user = User(username="storeseller", email="storeseller@example.com", role=UserRole.SELLER, password_hash="unused")
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+def _upload(content, filename="report.PDF"):
+    return FileStorage(stream=io.BytesIO(content), filename=filename)
+
+def _login(client, user):
+    with client.session_transaction() as sess:
+        sess["user_id"] = user.id
+        sess["username"] = user.username
+        sess["role"] = user.role.value
+
+def _credit(db, seller, upload):
+    credit = CarbonCredit(seller_id=seller.id, title="Stored", description="Desc", quantity=1, price_per_unit=1,
+                          status=CreditStatus.PENDING_APPROVAL, verification_details_filename=upload.saved_filename)
+    db.session.add(credit)
+    db.session.flush()
+    upload.related_entity_id = credit.id
+    return credit
+
+def test_identical_uploads_are_stored_once(app, db, seller):
+    first = store_upload(_upload(PDF), "verifications", "verification_doc", seller.id)
+    second = store_upload(_upload(PDF, "copy.pdf"), "verifications", "verification_doc", seller.id)
+    db.session.commit()
+    assert first.saved_filename == second.saved_filename == f"{DIGEST}.pdf"
+
+    relative_path = storage_path("verifications", first.saved_filename)
+    assert relative_path == f"verifications/{DIGEST[:2]}/{DIGEST[2:4]}/{DIGEST}.pdf"
+    with open(os.path.join(app.config["UPLOAD_FOLDER"], relative_path), "rb") as stored_file:
+        assert stored_file.read() == PDF
+    assert os.listdir(os.path.join(app.config["UPLOAD_FOLDER"], INCOMING_FOLDER)) == []
+
+    stored = StoredFile.query.filter_by(storage_path=relative_path).one()
+    assert (stored.ref_count, stored.size_bytes, stored.content_hash) == (2, len(PDF), DIGEST)
+    # Every upload keeps its own record
+    assert [(upload.original_filename, upload.uploader_id, upload.stored_file_id) for upload in UploadedFile.query.order_by(UploadedFile.id)] \
+        == [("report.PDF", seller.id, stored.id), ("copy.pdf", seller.id, stored.id)]
+
+def test_last_release_leaves_the_file_to_the_sweep(app, db, seller):
+    first = _credit(db, seller, store_upload(_upload(PDF), "verifications", "verification_doc", seller.id))
+    second = _credit(db, seller, store_upload(_upload(PDF), "verifications", "verification_doc", seller.id))
+    db.session.commit()
+    filename = first.verification_details_filename
+    path = os.path.join(app.config["UPLOAD_FOLDER"], storage_path("verifications", filename))
+    later = time.time() + app.config["UPLOAD_SWEEP_GRACE_SECONDS"] + 1
+
+    assert not release_upload(db.session.connection(), "verifications", filename, first.id)
+    db.session.commit()
+    assert [upload.related_entity_id for upload in UploadedFile.query] == [second.id]
+    sweep_unreferenced_uploads(now=later)
+    assert os.path.exists(path) # Still used once
+    assert not release_upload(db.session.connection(), "verifications", filename, first.id) # Already released
+    assert release_upload(db.session.connection(), "verifications", filename, second.id)
+    db.session.commit()
+    assert UploadedFile.query.count() == StoredFile.query.count() == 0
+    sweep_unreferenced_uploads()
+    assert os.path.exists(path) # Within the grace period
+    sweep_unreferenced_uploads(now=later)
+    assert not os.path.exists(path)
+
+def test_deleting_or_changing_a_credit_releases_its_upload(app, db, seller):
+    image = b"\x89PNG replaced"
+    deleted = _credit(db, seller, store_upload(_upload(PDF), "verifications", "verification_doc", seller.id))
+    changed = _credit(db, seller, store_upload(_upload(PDF), "verifications", "verification_doc", seller.id))
+    changed.image_filename = store_upload(_upload(image, "photo.png"), "credits", "credit_image", seller.id).saved_filename
+    db.session.flush()
+    UploadedFile.query.filter_by(file_type="credit_image").one().related_entity_id = changed.id
+    db.session.commit()
+    db.session.expire_all() # As in a later request
+
+    db.session.delete(db.session.get(CarbonCredit, deleted.id))
+    db.session.commit()
+    assert StoredFile.query.filter_by(storage_path=storage_path("verifications", f"{DIGEST}.pdf")).one().ref_count == 1
+
+    credit = db.session.get(CarbonCredit, changed.id)
+    credit.verification_details_filename = "credit_img_legacy.pdf"
+    credit.image_filename = None
+    credit.title = "Renamed"
+    db.session.commit()
+    assert UploadedFile.query.count() == StoredFile.query.count() == 0
+
+def test_rolled_back_reference_leaves_no_record(app, db, seller):
+    store_upload(_upload(PDF), "verifications", "verification_doc", seller.id)
+    db.session.rollback()
+    assert UploadedFile.query.count() == StoredFile.query.count() == 0
+    path = os.path.join(app.config["UPLOAD_FOLDER"], storage_path("verifications", f"{DIGEST}.pdf"))
+    sweep_unreferenced_uploads(now=time.time() + app.config["UPLOAD_SWEEP_GRACE_SECONDS"] + 1)
+    assert not os.path.exists(path)
+
+def test_reusing_a_stored_file_restarts_its_grace_period(app, db, seller):
+    store_upload(_upload(PDF), "verifications", "verification_doc", seller.id)
+    db.session.rollback() # Left unreferenced, as by a failed listing
+    path = os.path.join(app.config["UPLOAD_FOLDER"], storage_path("verifications", f"{DIGEST}.pdf"))
+    long_ago = time.time() - app.config["UPLOAD_SWEEP_GRACE_SECONDS"] - 60
+    os.utime(path, (long_ago, long_ago))
+
+    # Reused by a listing whose reference a concurrent sweep cannot see yet (here: never commits)
+    store_upload(_upload(PDF), "verifications", "verification_doc", seller.id)
+    db.session.rollback()
+    sweep_unreferenced_uploads()
+    assert os.path.exists(path)
+
+def test_listings_share_uploads_and_serve_them_sharded(client, db, seller):
+    _login(client, seller)
+    image = b"\x89PNG" + bytes(range(256))
+    for title in ("First listing", "Second listing"):
+        response = client.post("/seller/credits/list", content_type="multipart/form-data", data={
+            "title": title, "description": "Desc", "quantity": "10", "price_per_unit": "5",
+            "image_filename": _upload(image, "photo.png"),
+            "verification_details_filename": _upload(PDF),
+        })
+        assert response.status_code == 302
+    credits = CarbonCredit.query.order_by(CarbonCredit.id).all()
+    assert {credit.verification_details_filename for credit in credits} == {f"{DIGEST}.pdf"}
+    assert [stored.ref_count for stored in StoredFile.query] == [2, 2]
+    uploads = UploadedFile.query.order_by(UploadedFile.id).all()
+    assert [(upload.related_entity_id, upload.original_filename) for upload in uploads] == [
+        (credits[0].id, "photo.png"), (credits[0].id, "report.PDF"), (credits[1].id, "photo.png"), (credits[1].id, "report.PDF")]
+
+    image_digest = hashlib.sha256(image).hexdigest()
+    served = client.get(f"/uploads/credits/{credits[0].image_filename}")
+    assert served.status_code == 200
+    assert served.data == image
+    assert served.headers["ETag"] == f'"{image_digest}"'
+    assert served.headers["Cache-Control"] == "public, max-age=31536000, immutable"
+
+@pytest.mark.parametrize("field, value", [
+    ("validity_start_date", "01/02/2024"),
+    ("verification_details_filename", "script.exe"),
+])
+def test_rejected_listings_store_no_files(app, client, db, seller, field, value):
+    _login(client, seller)
+    data = {"title": "Invalid listing", "description": "Desc", "quantity": "10", "price_per_unit": "5",
+            "image_filename": _upload(b"\x89PNG rejected", "photo.png")}
+    data[field] = _upload(b"MZ", value) if field.endswith("filename") else value
+    response = client.post("/seller/credits/list", content_type="multipart/form-data", data=data)
+    assert response.status_code == 302
+    assert CarbonCredit.query.count() == UploadedFile.query.count() == StoredFile.query.count() == 0
+    digest = hashlib.sha256(b"\x89PNG rejected").hexdigest()
+    assert not os.path.exists(os.path.join(app.config["UPLOAD_FOLDER"], storage_path("credits", f"{digest}.png")))
+
+def test_sweep_waits_for_an_uncommitted_reference(app, db, seller):
+    store_upload(_upload(PDF), "verifications", "verification_doc", seller.id)
+    db.session.rollback()
+    path = os.path.join(app.config["UPLOAD_FOLDER"], storage_path("verifications", f"{DIGEST}.pdf"))
+    later = time.time() + app.config["UPLOAD_SWEEP_GRACE_SECONDS"] + 1
+    stored = threading.Event()
+
+    def listing():
+        with app.app_context():
+            store_upload(_upload(PDF), "verifications", "verification_doc", seller.id)
+            stored.set()
+            time.sleep(0.3) # The rest of the listing, before its commit
+            db.session.commit()
+            db.session.remove()
+
+    thread = threading.Thread(target=listing)
+    thread.start()
+    stored.wait()
+    with app.app_context():
+        sweep_unreferenced_uploads(now=later) # Blocks on the listing's write lock, then sees its reference
+        db.session.remove()
+    thread.join()
+    assert os.path.exists(path)
+    assert StoredFile.query.one().ref_count == 1